@@ -0,0 +1,36 @@
+#! /usr/bin/env python3
+
+import json
+from argparse import ArgumentParser
+
+from messenger.benchmark import ENGINES
+from messenger.benchmark import run_benchmark
+
+def main():
+	parser = ArgumentParser()
+	parser.add_argument("--engine", choices = list(ENGINES) + ["none"],
+		default = "thread", help = "server to spawn, \"none\" to use a running one")
+	parser.add_argument("--address", default = "127.0.0.1")
+	parser.add_argument("--port", type = int, default = 3849)
+	parser.add_argument("--pairs", type = int, default = 10)
+	parser.add_argument("--rate", type = float, default = 10,
+		help = "messages per second sent by each client")
+	parser.add_argument("--duration", type = float, default = 10)
+	parser.add_argument("--size", type = int, default = 64)
+	parser.add_argument("--version", type = int, default = 1)
+	parser.add_argument("--echo-ratio", type = float, default = 0.1)
+	parser.add_argument("--output", help = "append the result as a JSON line")
+	args = parser.parse_args()
+
+	result = run_benchmark(
+		None if args.engine == "none" else args.engine,
+		args.address, args.port, args.pairs, args.rate, args.duration,
+		args.size, args.version, args.echo_ratio
+	)
+	print(json.dumps(result, indent = 4))
+	if args.output:
+		with open(args.output, "a") as output:
+			output.write(json.dumps(result) + "\n")
+
+if __name__ == "__main__":
+	main()
\ No newline at end of file
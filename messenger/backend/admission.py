@@ -0,0 +1,138 @@
+from time import monotonic
+from threading import Lock
+
+from messenger.protocol import Command
+from messenger.protocol import Response
+from messenger.backend.metrics import metrics
+
+class TokenBucket:
+	def __init__(self, rate, burst, now):
+		self._rate = rate
+		self._burst = burst
+		self._tokens = burst
+		self._updated = now
+
+	def take(self, now, cost = 1):
+		self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+		self._updated = now
+		if self._tokens < cost:
+			return False
+		self._tokens -= cost
+		return True
+
+class Admission:
+	HANDSHAKE = "handshake"
+	QUERY = "query"
+	MESSAGE = "message"
+	TRANSFER = "transfer"
+
+	MAX_CONNECTIONS = 16
+	LIMITS = {
+		HANDSHAKE: (0.5, 4),
+		QUERY: (10, 20),
+		MESSAGE: (50, 100),
+		TRANSFER: (2000, 4000)
+	}
+	CLASSES = {
+		Command.AESK: HANDSHAKE,
+		Command.AESC: HANDSHAKE,
+		Command.PUBK: HANDSHAKE,
+		Command.SKEY: HANDSHAKE,
+		Command.RSUM: HANDSHAKE,
+		Command.ECHO: QUERY,
+		Command.STAT: QUERY,
+		Command.HIST: QUERY,
+		Command.PING: QUERY,
+		Command.SEND: MESSAGE,
+		Command.RELY: MESSAGE,
+		Command.TYBE: MESSAGE,
+		Command.TYEN: MESSAGE,
+		Command.JOIN: MESSAGE,
+		Command.COMP: MESSAGE,
+		Command.FILE: TRANSFER,
+		Command.CHNK: TRANSFER,
+		Command.FEND: TRANSFER
+	}
+
+	def __init__(self, max_connections = MAX_CONNECTIONS, limits = LIMITS,
+		exempt_local = True):
+		self._lock = Lock()
+		self._max_connections = max_connections
+		self._limits = limits
+		self._exempt_local = exempt_local
+		self._connections = {}
+		self._buckets = {}
+
+	@property
+	def max_connections(self):
+		return self._max_connections
+
+	@max_connections.setter
+	def max_connections(self, value):
+		self._max_connections = value
+
+	@property
+	def exempt_local(self):
+		return self._exempt_local
+
+	@exempt_local.setter
+	def exempt_local(self, value):
+		self._exempt_local = value
+
+	def connections(self, address):
+		return len(self._connections.get(address, ()))
+
+	def admit(self, companion):
+		address = companion.address
+		if not address or not self._max_connections or self._is_exempt(companion):
+			return True
+		with self._lock:
+			admitted = self._connections.setdefault(address, set())
+			if len(admitted) >= self._max_connections:
+				metrics.incr("rejected_connections")
+				return False
+			admitted.add(companion)
+		return True
+
+	def release(self, companion):
+		with self._lock:
+			self._buckets.pop(companion, None)
+			admitted = self._connections.get(companion.address)
+			if admitted is not None:
+				admitted.discard(companion)
+				if not admitted:
+					del self._connections[companion.address]
+
+	def allow(self, companion, kind, now):
+		with self._lock:
+			if companion not in self._buckets:
+				self._buckets[companion] = None if self._is_exempt(companion) else {}
+			buckets = self._buckets[companion]
+			if buckets is None:
+				return True
+			bucket = buckets.get(kind)
+			if not bucket:
+				rate, burst = self._limits[kind]
+				bucket = buckets[kind] = TokenBucket(rate, burst, now)
+			if bucket.take(now):
+				return True
+		metrics.incr("rejected_" + kind)
+		return False
+
+	def middleware(self, iden, handler):
+		kind = Admission.CLASSES.get(iden)
+		if kind not in self._limits:
+			return handler
+		def admitted_handler(companion, command):
+			if self.allow(companion, kind, monotonic()):
+				handler(companion, command)
+			else:
+				response_message = b"RATE_LIMITED"
+				response = Response(iden, Response.FAIL, response_message)
+				companion.send_response(response)
+		return admitted_handler
+
+	def _is_exempt(self, companion):
+		return self._exempt_local and companion.is_local
+
+admission = Admission()
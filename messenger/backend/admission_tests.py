@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from admission import Admission
+from admission import TokenBucket
+from messenger.protocol import Command
+from messenger.protocol import Response
+
+class FakeCompanion:
+	def __init__(self, address = "192.0.2.1", is_local = False):
+		self.address = address
+		self.is_local = is_local
+		self.responses = []
+
+	def send_response(self, response):
+		self.responses.append(response)
+
+class TokenBucketTests(unittest.TestCase):
+	def test_burst_then_refill(self):
+		bucket = TokenBucket(rate = 2, burst = 3, now = 0)
+		self.assertTrue(all(bucket.take(0) for _ in range(3)))
+		self.assertFalse(bucket.take(0))
+		self.assertFalse(bucket.take(0.4))
+		self.assertTrue(bucket.take(0.5))
+		self.assertTrue(bucket.take(100))
+		self.assertTrue(all(bucket.take(100) for _ in range(2)))
+		self.assertFalse(bucket.take(100))
+
+class AdmissionTests(unittest.TestCase):
+	def setUp(self):
+		self.admission = Admission(max_connections = 2,
+			limits = {Admission.HANDSHAKE: (1, 2)})
+
+	def test_connection_cap(self):
+		first, second, third = FakeCompanion(), FakeCompanion(), FakeCompanion()
+		self.assertTrue(self.admission.admit(first))
+		self.assertTrue(self.admission.admit(second))
+		self.assertFalse(self.admission.admit(third))
+		self.assertTrue(self.admission.admit(FakeCompanion("192.0.2.2")))
+		self.admission.release(first)
+		self.admission.release(first)
+		self.assertEqual(self.admission.connections("192.0.2.1"), 1)
+		self.assertTrue(self.admission.admit(third))
+
+	def test_local_exempt(self):
+		companions = [FakeCompanion("127.0.0.1", True) for _ in range(3)]
+		self.assertTrue(all(self.admission.admit(companion) for companion in companions))
+		self.assertTrue(all(self.admission.allow(companions[0], Admission.HANDSHAKE, 0)
+			for _ in range(10)))
+
+	def test_rejected_before_handler(self):
+		calls = []
+		handler = self.admission.middleware(Command.AESK,
+			lambda companion, command: calls.append(command))
+		companion = FakeCompanion()
+		for _ in range(3):
+			handler(companion, Command(Command.AESK))
+		self.assertEqual(len(calls), 2)
+		self.assertEqual(companion.responses[0].resl, Response.FAIL)
+		self.assertEqual(companion.responses[0].mesg, b"RATE_LIMITED")
+
+	def test_unlimited_class_untouched(self):
+		handler = lambda companion, command: None
+		self.assertIs(self.admission.middleware(Command.ECHO, handler), handler)
+		self.assertIs(self.admission.middleware(Command.DSCN, handler), handler)
+
+	def test_buckets_per_connection(self):
+		first, second = FakeCompanion(), FakeCompanion()
+		for companion in (first, second):
+			self.assertTrue(self.admission.allow(companion, Admission.HANDSHAKE, 0))
+			self.assertTrue(self.admission.allow(companion, Admission.HANDSHAKE, 0))
+			self.assertFalse(self.admission.allow(companion, Admission.HANDSHAKE, 0))
+		self.admission.release(first)
+		self.assertTrue(self.admission.allow(first, Admission.HANDSHAKE, 0))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,66 @@
+from time import monotonic
+
+from messenger.backend.companion import Companion
+from messenger.backend.companion import unknown_on_error
+from messenger.backend.admission import admission
+from messenger.backend.exceptions import *
+
+class AsyncCompanion(Companion):
+	def __init__(self, reader, writer, room = None, aes = None):
+		self._stream = reader
+		self._writer = writer
+		super().__init__(writer.get_extra_info("socket"), room, aes)
+
+	def abort(self):
+		self._writer.transport.abort()
+
+	async def _recv(self):
+		try:
+			data = await self._stream.read(self._reader.free)
+		except ConnectionError:
+			raise CompanionDisconnected
+		if not data:
+			raise CompanionDisconnected
+		self._reader.feed(data)
+		self._last_seen = monotonic()
+		return self._reader.frames()
+
+	def close(self):
+		try:
+			self.flush()
+		except CompanionDisconnected:
+			pass
+		if not self._writer.is_closing():
+			self._writer.close()
+		admission.release(self)
+
+	def flush(self):
+		if self._outbound:
+			if self._writer.is_closing():
+				raise CompanionDisconnected
+			self._writer.writelines(self._outbound)
+			self._outbound.clear()
+			self._outbound_size = 0
+		if self._congested and self.pending <= self.LOW_WATERMARK:
+			self._congested = False
+
+	@property
+	def pending(self):
+		return self._outbound_size + self._writer.transport.get_write_buffer_size()
+
+	async def drain(self):
+		try:
+			await self._writer.drain()
+		except ConnectionError:
+			raise CompanionDisconnected
+
+	async def drain_outbound(self):
+		try:
+			self.flush()
+			self._writer.transport.set_write_buffer_limits(0)
+			await self.drain()
+		except CompanionDisconnected:
+			pass
+
+	async def receive_commands(self):
+		return unknown_on_error(await self._recv())
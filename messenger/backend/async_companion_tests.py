@@ -0,0 +1,59 @@
+#! /usr/bin/env python3
+
+import asyncio
+import unittest
+from socket import socketpair
+
+from async_companion import AsyncCompanion
+from messenger.protocol import Command
+
+class AsyncCompanionTests(unittest.TestCase):
+	def test_drain_outbound(self):
+		asyncio.run(self.drain_outbound())
+
+	def test_drain_outbound_after_disconnect(self):
+		asyncio.run(self.drain_outbound_after_disconnect())
+
+	def test_receive_commands(self):
+		asyncio.run(self.receive_commands())
+
+	async def receive_commands(self):
+		companion = await self.connect()
+		self.assertEqual(companion.take_deferred(), [])
+		self.peer_sock.send(Command(Command.ECHO, b"one").in_raw() + Command(Command.TYBE).in_raw())
+		commands = await companion.receive_commands()
+		self.assertEqual([(command.iden, command.mesg) for command in commands],
+			[(Command.ECHO, b"one"), (Command.TYBE, b"")])
+		self.peer_sock.send(b"G" * Command.SIGN_SIZE)
+		command, = await companion.receive_commands()
+		self.assertEqual(command.iden, Command.UNKN)
+		companion.close()
+		self.peer_sock.close()
+
+	async def connect(self):
+		sock, self.peer_sock = socketpair()
+		self.peer_sock.setblocking(False)
+		reader, writer = await asyncio.open_connection(sock = sock)
+		return AsyncCompanion(reader, writer)
+
+	async def drain_outbound(self):
+		companion = await self.connect()
+		companion.send_frame(b"", b"A" * 0x20000)
+		drain = asyncio.ensure_future(companion.drain_outbound())
+		loop, received = asyncio.get_running_loop(), 0
+		while received < 0x20000:
+			received += len(await loop.sock_recv(self.peer_sock, 0x10000))
+		await asyncio.wait_for(drain, 5)
+		self.assertEqual(companion.pending, 0)
+		companion.close()
+		self.peer_sock.close()
+
+	async def drain_outbound_after_disconnect(self):
+		companion = await self.connect()
+		self.peer_sock.close()
+		companion.send_frame(b"", b"A" * 0x20000)
+		await asyncio.wait_for(companion.drain_outbound(), 5)
+		companion.close()
+
+if __name__ == "__main__":
+	unittest.main()
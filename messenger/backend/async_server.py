@@ -0,0 +1,247 @@
+import asyncio
+from time import monotonic
+from threading import Thread
+
+from messenger.protocol import Command
+from messenger.backend.room import Room
+from messenger.backend.room import Rooms
+from messenger.backend.lobby import Lobby
+from messenger.backend.timer_wheel import TimerWheel
+from messenger.backend.typing_state import TypingTracker
+from messenger.backend.heartbeat import Heartbeat
+from messenger.backend.server import Server
+from messenger.backend.server import dispatch_command
+from messenger.backend.server import flush_outbound
+from messenger.backend.server import expire_companion
+from messenger.backend.server import expire_typing
+from messenger.backend.server import check_heartbeat
+from messenger.backend.server import process_conn_command
+from messenger.backend.server import leave_room
+from messenger.backend.server import room_name
+from messenger.backend.server import suspend_session
+from messenger.backend.server import dismiss_companion
+from messenger.backend.server import report_shutdown
+from messenger.backend.server import reject_companion
+from messenger.backend.admission import admission
+from messenger.backend.async_companion import AsyncCompanion
+from messenger.backend.metrics import metrics
+from messenger.backend.exceptions import *
+
+class AsyncServer:
+	DEFAULT_PORT = Server.DEFAULT_PORT
+	DEFAULT_ADDRESS = Server.DEFAULT_ADDRESS
+	ACCEPT_TIMEOUT = Server.ACCEPT_TIMEOUT
+	DRAIN_TIMEOUT = Server.DRAIN_TIMEOUT
+	FIRST_FLIGHT_TIMEOUT = 0.1
+	MAX_CLIENTS = 1024
+
+	def __init__(self, history = None, idle_timeout = Heartbeat.IDLE_TIMEOUT,
+		dead_timeout = Heartbeat.DEAD_TIMEOUT, drain_timeout = DRAIN_TIMEOUT):
+		self._loop = None
+		self._idle_timeout = idle_timeout
+		self._dead_timeout = dead_timeout
+		self._drain_timeout = drain_timeout
+		self._server = None
+		self._rooms = Rooms(history)
+		self._sessions = set()
+		self._companions = set()
+		self._thread = None
+		self._thread_running = False
+		self._wheel = None
+		self._lobby = None
+		self._heartbeat = None
+		self._housekeeping = None
+
+	def run(self, addr = DEFAULT_ADDRESS, port = DEFAULT_PORT):
+		if self._thread_running:
+			raise ServerAlreadyRunning
+
+		self._configure(addr, port)
+		self._thread_running = True
+		self._thread = Thread(target = self._loop.run_forever)
+		self._thread.start()
+
+	def stop(self):
+		if not self._server:
+			raise ServerInvalidConfiguration
+
+		if not self._thread_running:
+			raise ServerAlreadyStopped
+
+		started = monotonic()
+		self._thread_running = False
+		overruns = asyncio.run_coroutine_threadsafe(
+			self._shutdown(started + self._drain_timeout), self._loop).result()
+		self._loop.call_soon_threadsafe(self._loop.stop)
+		self._thread.join()
+		self._loop.close()
+		return report_shutdown(started, overruns)
+
+	def is_running(self):
+		return self._thread_running
+
+	def lobby_stats(self):
+		return asyncio.run_coroutine_threadsafe(
+			self._lobby_stats(), self._loop).result()
+
+	def _configure(self, addr, port):
+		self._loop = asyncio.new_event_loop()
+		self._wheel = TimerWheel(monotonic())
+		self._lobby = Lobby(self._wheel, AsyncServer.ACCEPT_TIMEOUT)
+		self._heartbeat = Heartbeat(self._wheel, self._idle_timeout, self._dead_timeout)
+		metrics.gauge("lobby", lambda: len(self._lobby))
+		metrics.gauge("connections", lambda: len(self._sessions))
+		self._housekeeping = self._loop.create_task(self._housekeeping_loop())
+		try:
+			self._server = self._loop.run_until_complete(asyncio.start_server(
+				self._accept, addr, port,
+				backlog = AsyncServer.MAX_CLIENTS
+			))
+		except OSError as e:
+			self._loop.close()
+			raise ServerException(str(e))
+
+	async def _shutdown(self, deadline):
+		self._server.close()
+		self._housekeeping.cancel()
+		self._lobby.clear()
+		companions = list(self._companions)
+		for companion in companions:
+			dismiss_companion(companion)
+		drains = [self._loop.create_task(companion.drain_outbound())
+			for companion in companions]
+		overruns = 0
+		if drains:
+			done, pending = await asyncio.wait(drains,
+				timeout = max(deadline - monotonic(), 0))
+			for drain in pending:
+				drain.cancel()
+			overruns = len(pending)
+		for session in self._sessions:
+			session.cancel()
+		await asyncio.gather(*self._sessions, return_exceptions = True)
+		await self._server.wait_closed()
+		return overruns
+
+	def _accept(self, reader, writer):
+		metrics.incr("accepted")
+		companion = AsyncCompanion(reader, writer)
+		companion.rooms = self._rooms
+		if not admission.admit(companion):
+			reject_companion(companion)
+			return
+		self._companions.add(companion)
+
+		session = self._loop.create_task(self._session_loop(companion))
+		self._sessions.add(session)
+		session.add_done_callback(self._sessions.discard)
+		self._heartbeat.watch(companion)
+
+	def _pair(self, companion):
+		partner = self._lobby.pair(companion, monotonic())
+		if partner:
+			self._begin_session(partner, companion)
+
+	def _unpair(self, companion):
+		self._lobby.remove(companion)
+		room = companion.room
+		if room and not room.name:
+			for peer in companion.peers:
+				room.leave(peer)
+				self._pair(peer)
+			room.leave(companion)
+
+	async def _lobby_stats(self):
+		return self._lobby.stats(monotonic())
+
+	async def _housekeeping_loop(self):
+		while True:
+			await asyncio.sleep(self._wheel.timeout(monotonic()))
+			self._expire_timers(monotonic())
+
+	def _expire_timers(self, now):
+		for kind, companion in self._wheel.advance(now):
+			if kind == Lobby.TIMER and self._lobby.expire(companion, now):
+				expire_companion(companion)
+			elif kind == TypingTracker.TIMER and companion.room:
+				expire_typing(companion.room, now)
+			elif kind == Heartbeat.TIMER:
+				check_heartbeat(self._heartbeat, companion, now)
+
+	def _begin_session(self, companion_a, companion_b):
+		metrics.incr("sessions_started")
+		room = Room()
+		room.join(companion_a)
+		room.join(companion_b)
+		process_conn_command(companion_a)
+		process_conn_command(companion_b)
+		for companion in (companion_a, companion_b):
+			try:
+				companion.flush()
+			except CompanionDisconnected:
+				pass
+
+	async def _session_loop(self, companion):
+		try:
+			try:
+				received = await asyncio.wait_for(receive_commands(companion),
+					AsyncServer.FIRST_FLIGHT_TIMEOUT)
+			except asyncio.TimeoutError:
+				received = ()
+			for command in received:
+				await self._process_command(companion, command)
+			if not companion.room and companion not in self._lobby:
+				self._pair(companion)
+			while True:
+				for command in await receive_commands(companion):
+					await self._process_command(companion, command)
+		except (SuspendSession, CompanionDisconnected):
+			pass
+		finally:
+			self._end_session(companion)
+
+	async def _process_command(self, companion, command):
+		joining = command.iden == Command.JOIN and room_name(command)
+		if joining:
+			self._unpair(companion)
+		await process_command(companion, command)
+		if joining and not companion.room:
+			self._pair(companion)
+		self._schedule_typing(companion)
+
+	def _schedule_typing(self, companion):
+		key = (TypingTracker.TIMER, companion)
+		deadline = companion.room.typing.deadline(companion) if companion.room else None
+		if deadline is None:
+			self._wheel.cancel(key)
+		else:
+			self._wheel.schedule(key, deadline)
+
+	def _end_session(self, companion):
+		self._companions.discard(companion)
+		self._lobby.remove(companion)
+		self._wheel.cancel((TypingTracker.TIMER, companion))
+		self._heartbeat.forget(companion)
+		if companion.room:
+			leave_room(companion)
+		companion.close()
+
+async def receive_commands(companion):
+	try:
+		return await companion.receive_commands()
+	except CompanionDisconnected:
+		raise SuspendSession
+
+async def process_command(companion, command):
+	dispatch_command(companion, command)
+	flush_outbound(companion)
+	await companion.drain()
+	if companion.room and not companion.room.name:
+		await drain_peers(companion)
+
+async def drain_peers(companion):
+	for peer in companion.peers:
+		try:
+			await peer.drain()
+		except CompanionDisconnected:
+			pass
\ No newline at end of file
@@ -1,69 +1,248 @@
+from time import monotonic
 from select import select
+from ipaddress import ip_address
+from itertools import islice
+from collections import deque
+from socket import MSG_DONTWAIT
+from socket import SHUT_RDWR
 
 from messenger.secure import * 
+from messenger.framing import FrameReader
 from messenger.protocol import Command
 from messenger.protocol import Response
+from messenger.protocol import PROTOCOLS
+from messenger.backend.metrics import metrics
+from messenger.backend.admission import admission
 from messenger.backend.exceptions import *
 
 class Companion:
+	DROP = "DROP"
+	DISCONNECT = "DISCONNECT"
+
+	HIGH_WATERMARK = 0x40000
+	LOW_WATERMARK = 0x10000
+	OVERFLOW_POLICY = DISCONNECT
+	DROPPABLE = frozenset((Command.MESG, Command.TYBE))
+	MAX_IOV = 64
+
 	@staticmethod
-	def select_recv(*companions, timeout):
-		sock_r = [comp._sock for comp in companions]
-		sock_r, sock_e, sock_w = select(
+	def select_io(*companions, timeout, wakeup = None):
+		sock_r = [comp._sock for comp in companions
+			if not any(peer.backlogged for peer in comp.peers)]
+		if wakeup:
+			sock_r.append(wakeup)
+		sock_w = [comp._sock for comp in companions if comp.pending]
+		sock_r, sock_w, sock_e = select(
 			sock_r,
-			[],
+			sock_w,
 			[],
 			timeout
 		)
-		return (comp for comp in companions if comp._sock in sock_r)
+		return (
+			[comp for comp in companions if comp._sock in sock_r],
+			[comp for comp in companions if comp._sock in sock_w]
+		)
 
-	def __init__(self, sock, companion = None, aes = None):
+	def __init__(self, sock, room = None, aes = None):
 		self._aes = aes
 		self._sock = sock
-		self._companion = companion
+		self._reader = FrameReader(sock, Command)
+		self._room = room
+		self._rooms = None
+		self._compression = None
+		self._last_seen = monotonic()
+		self._address = peer_address(sock.getpeername)
+		self._deferred = []
+		self._init_outbound()
+		self.version = 1
+
+	def _init_outbound(self):
+		self._outbound = deque()
+		self._outbound_size = 0
+		self._congested = False
+		self._overflowed = False
+		self._dropped = 0
 
 	def __del__(self):
-		self._sock.close()
+		self.close()
+
+	def fileno(self):
+		return self._sock.fileno()
 
-	def _recv(self, recv_len):
+	def _recv(self):
 		try:
-			buf = self._sock.recv(recv_len)
-			if buf:
-				return buf
-			raise CompanionDisconnected
-		except BrokenPipeError:
+			frames = self._reader.read_frames()
+		except (EOFError, ConnectionError):
 			raise CompanionDisconnected
+		self._last_seen = monotonic()
+		return frames
 
-	def _send(self, buf):
+	def _send(self, bufs):
 		try:
-			return self._sock.send(buf)
-		except BrokenPipeError:
+			return self._sock.sendmsg(bufs, [], MSG_DONTWAIT)
+		except BlockingIOError:
+			return 0
+		except OSError:
 			raise CompanionDisconnected
 
+	def _consume(self, sent):
+		self._outbound_size -= sent
+		while sent:
+			buf = self._outbound[0]
+			if len(buf) > sent:
+				self._outbound[0] = memoryview(buf)[sent:]
+				break
+			self._outbound.popleft()
+			sent -= len(buf)
+
+	def _overflow(self):
+		self._overflowed = True
+		self._outbound.clear()
+		self._outbound_size = 0
+		self.abort()
+
+	def abort(self):
+		try:
+			self._sock.shutdown(SHUT_RDWR)
+		except OSError:
+			pass
+
 	def close(self):
+		try:
+			self.flush()
+		except CompanionDisconnected:
+			pass
 		self._sock.close()
+		admission.release(self)
+
+	def flush(self):
+		while self._outbound:
+			sent = self._send(list(islice(self._outbound, Companion.MAX_IOV)))
+			if not sent:
+				break
+			self._consume(sent)
+		if self._congested and self.pending <= self.LOW_WATERMARK:
+			self._congested = False
+
+	def send_frame(self, sign, mesg, iden = None):
+		if self._overflowed:
+			raise CompanionDisconnected
+		droppable = iden in Companion.DROPPABLE
+		if self._congested and droppable and self.OVERFLOW_POLICY == Companion.DROP:
+			self._dropped += 1
+			metrics.incr("frames_dropped")
+			return
+
+		self._outbound.append(sign)
+		self._outbound_size += len(sign)
+		if mesg:
+			self._outbound.append(mesg)
+			self._outbound_size += len(mesg)
+		metrics.incr("bytes_out", len(sign) + len(mesg))
+
+		if self.pending > self.HIGH_WATERMARK:
+			self._congested = True
+			if self.OVERFLOW_POLICY == Companion.DISCONNECT:
+				metrics.incr("overflows")
+				self._overflow()
+
+	def defer(self, command):
+		self._deferred.append(command)
+
+	def take_deferred(self):
+		deferred, self._deferred = self._deferred, []
+		return deferred
 
 	def send_response(self, response):
-		self._send(response.in_raw())
+		self.send_frame(self._response_type.pack_sign(response), response.mesg, response.iden)
 
-	def receive_command(self):
-		sign, command = self._recv(Command.SIGN_SIZE), None
-		try:
-			command = Command.unpack_sign(sign)
-			if command.mesg_len:
-				command.mesg = self._recv(command.mesg_len)
-		except ValueError:
-			command = Command(Command.UNKN)
+	def receive_commands(self):
+		yield from unknown_on_error(self._recv())
 
-		return command
+	@property
+	def version(self):
+		return self._version
+
+	@version.setter
+	def version(self, value):
+		self._version = value
+		self._command_type, self._response_type = PROTOCOLS[value]
+		self._reader.frame_type = self._command_type
+
+	@property
+	def deferred(self):
+		return bool(self._deferred)
+
+	@property
+	def pending(self):
+		return self._outbound_size
+
+	@property
+	def last_seen(self):
+		return self._last_seen
+
+	@property
+	def backlogged(self):
+		return self.pending > self.LOW_WATERMARK
+
+	@property
+	def congested(self):
+		return self._congested
+
+	@property
+	def dropped(self):
+		return self._dropped
+
+	@property
+	def response_type(self):
+		return self._response_type
 
 	@property
 	def companion(self):
-		return self._companion
+		return next(iter(self.peers), None)
+
+	@property
+	def address(self):
+		return self._address
 
-	@companion.setter
-	def companion(self, value):
-		self._companion = value
+	@property
+	def is_local(self):
+		return bool(self._address) and ip_address(self._address).is_loopback
+
+	@property
+	def peers(self):
+		return self._room.peers(self) if self._room else []
+
+	@property
+	def room(self):
+		return self._room
+
+	@room.setter
+	def room(self, value):
+		self._room = value
+
+	@property
+	def rooms(self):
+		return self._rooms
+
+	@rooms.setter
+	def rooms(self, value):
+		self._rooms = value
+
+	@property
+	def capacity(self):
+		overhead = self._aes.OVERHEAD if self._aes else 0
+		if self._compression:
+			overhead += self._compression.OVERHEAD
+		return Response.MESG_SIZE - overhead
+
+	@property
+	def compression(self):
+		return self._compression
+
+	@compression.setter
+	def compression(self, value):
+		self._compression = value
 
 	@property
 	def has_rsa_key(self):
@@ -87,4 +266,17 @@ class Companion:
 
 	@aes.setter
 	def aes(self, value):
-		self._aes = value
\ No newline at end of file
+		self._aes = value
+
+def unknown_on_error(frames):
+	try:
+		yield from frames
+	except ValueError:
+		yield Command(Command.UNKN)
+
+def peer_address(getpeername):
+	try:
+		peername = getpeername()
+	except OSError:
+		return None
+	return peername[0] if peername else None
@@ -0,0 +1,98 @@
+#! /usr/bin/env python3
+
+import unittest
+from socket import socketpair
+
+from companion import Companion
+from messenger.backend.room import Room
+from messenger.backend.exceptions import *
+from messenger.compression import Deflate
+from messenger.secure import Aes
+from messenger.secure import AesCtr
+from messenger.protocol import Command
+from messenger.protocol import Response
+
+class CompanionTests(unittest.TestCase):
+	def setUp(self):
+		self.sock, self.peer_sock = socketpair()
+		self.companion = Companion(self.sock)
+		self.companion.HIGH_WATERMARK = 64
+		self.companion.LOW_WATERMARK = 16
+
+	def tearDown(self):
+		self.companion.close()
+		self.peer_sock.close()
+
+	def congest(self):
+		self.companion.send_response(Response(Command.MESG, mesg = b"A" * 64))
+		self.assertTrue(self.companion.congested)
+
+	def test_consume_partial_write(self):
+		self.companion.send_frame(b"abc", b"defg")
+		self.companion._consume(5)
+		self.assertEqual(self.companion.pending, 2)
+		self.assertEqual(bytes(self.companion._outbound[0]), b"fg")
+		self.companion._consume(2)
+		self.assertEqual(self.companion.pending, 0)
+		self.assertFalse(self.companion._outbound)
+
+	def test_watermarks(self):
+		self.companion.OVERFLOW_POLICY = Companion.DROP
+		self.congest()
+		self.assertTrue(self.companion.backlogged)
+		self.companion.flush()
+		self.assertEqual(self.companion.pending, 0)
+		self.assertFalse(self.companion.congested)
+		self.assertFalse(self.companion.backlogged)
+
+	def test_disconnect_policy(self):
+		self.companion.OVERFLOW_POLICY = Companion.DISCONNECT
+		self.congest()
+		self.assertEqual(self.companion.pending, 0)
+		self.assertRaises(CompanionDisconnected,
+			self.companion.send_response, Response(Command.DSCN))
+
+	def test_drop_policy(self):
+		self.companion.OVERFLOW_POLICY = Companion.DROP
+		self.congest()
+		pending = self.companion.pending
+		self.companion.send_response(Response(Command.MESG, mesg = b"late"))
+		self.companion.send_response(Response(Command.TYBE))
+		self.assertEqual(self.companion.dropped, 2)
+		self.assertEqual(self.companion.pending, pending)
+		self.companion.send_response(Response(Command.DSCN))
+		self.assertEqual(self.companion.dropped, 2)
+		self.assertGreater(self.companion.pending, pending)
+
+	def test_capacity(self):
+		self.assertEqual(self.companion.capacity, Response.MESG_SIZE)
+		self.companion.aes = AesCtr()
+		self.assertEqual(self.companion.capacity, Response.MESG_SIZE - AesCtr.OVERHEAD)
+		self.companion.aes, self.companion.compression = Aes(), Deflate()
+		self.assertEqual(self.companion.capacity,
+			Response.MESG_SIZE - Aes.OVERHEAD - Deflate.OVERHEAD)
+
+class SelectTests(unittest.TestCase):
+	def setUp(self):
+		self.socks = [socketpair() for _ in range(2)]
+		self.a, self.b = [Companion(sock) for sock, _ in self.socks]
+		room = Room()
+		room.join(self.a)
+		room.join(self.b)
+
+	def tearDown(self):
+		for companion in (self.a, self.b):
+			companion.close()
+		for _, peer_sock in self.socks:
+			peer_sock.close()
+
+	def test_backpressure(self):
+		self.socks[0][1].sendall(Command(Command.ECHO).in_raw())
+		readable, writable = Companion.select_io(self.a, self.b, timeout = 0)
+		self.assertEqual((readable, writable), ([self.a], []))
+		self.b.send_frame(b"", b"A" * (Companion.LOW_WATERMARK + 1))
+		readable, writable = Companion.select_io(self.a, self.b, timeout = 0)
+		self.assertEqual((readable, writable), ([], [self.b]))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,37 @@
+class Heartbeat:
+	TIMER = "heartbeat"
+	IDLE_TIMEOUT = 30
+	DEAD_TIMEOUT = 90
+
+	IDLE = "idle"
+	DEAD = "dead"
+
+	def __init__(self, wheel = None, idle_timeout = IDLE_TIMEOUT, dead_timeout = DEAD_TIMEOUT):
+		self._wheel = wheel
+		self._idle_timeout = idle_timeout
+		self._dead_timeout = dead_timeout
+
+	@property
+	def dead_timeout(self):
+		return self._dead_timeout
+
+	def watch(self, companion):
+		self._wheel.schedule((Heartbeat.TIMER, companion),
+			companion.last_seen + self._idle_timeout)
+
+	def forget(self, companion):
+		self._wheel.cancel((Heartbeat.TIMER, companion))
+
+	def poll(self, companion, now):
+		silent = now - companion.last_seen
+		if silent >= self._dead_timeout:
+			return Heartbeat.DEAD, None
+		if silent >= self._idle_timeout:
+			return Heartbeat.IDLE, companion.last_seen + self._dead_timeout
+		return None, companion.last_seen + self._idle_timeout
+
+	def check(self, companion, now):
+		state, deadline = self.poll(companion, now)
+		if deadline is not None:
+			self._wheel.schedule((Heartbeat.TIMER, companion), deadline)
+		return state
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from heartbeat import Heartbeat
+from timer_wheel import TimerWheel
+
+class FakeCompanion:
+	def __init__(self, last_seen):
+		self.last_seen = last_seen
+
+class HeartbeatTests(unittest.TestCase):
+	def setUp(self):
+		self.wheel = TimerWheel(0, tick = 1)
+		self.heartbeat = Heartbeat(self.wheel, idle_timeout = 10, dead_timeout = 30)
+		self.companion = FakeCompanion(0)
+		self.heartbeat.watch(self.companion)
+
+	def advance(self, now):
+		return [(companion, self.heartbeat.check(companion, now))
+			for _, companion in self.wheel.advance(now)]
+
+	def test_idle_then_dead(self):
+		self.assertEqual(self.advance(9), [])
+		self.assertEqual(self.advance(10), [(self.companion, Heartbeat.IDLE)])
+		self.assertEqual(self.advance(29), [])
+		self.assertEqual(self.advance(30), [(self.companion, Heartbeat.DEAD)])
+		self.assertNotIn((Heartbeat.TIMER, self.companion), self.wheel)
+
+	def test_activity_postpones(self):
+		self.companion.last_seen = 8
+		self.assertEqual(self.advance(10), [(self.companion, None)])
+		self.assertEqual(self.advance(17), [])
+		self.assertEqual(self.advance(18), [(self.companion, Heartbeat.IDLE)])
+
+	def test_pong_keeps_alive(self):
+		self.advance(10)
+		self.companion.last_seen = 10
+		self.assertEqual(self.advance(30), [(self.companion, Heartbeat.IDLE)])
+		self.companion.last_seen = 30
+		self.assertEqual(self.advance(40), [(self.companion, Heartbeat.IDLE)])
+
+	def test_poll_without_wheel(self):
+		heartbeat = Heartbeat(idle_timeout = 10, dead_timeout = 30)
+		self.assertEqual(heartbeat.poll(self.companion, 5), (None, 10))
+		self.assertEqual(heartbeat.poll(self.companion, 10), (Heartbeat.IDLE, 30))
+		self.assertEqual(heartbeat.poll(self.companion, 30), (Heartbeat.DEAD, None))
+
+	def test_forget(self):
+		self.heartbeat.forget(self.companion)
+		self.assertEqual(self.advance(100), [])
+		self.assertEqual(len(self.wheel), 0)
+
+if __name__ == "__main__":
+	unittest.main()
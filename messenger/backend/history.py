@@ -0,0 +1,200 @@
+import os
+import struct
+from zlib import crc32
+from mmap import mmap
+from mmap import ACCESS_READ
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from time import time
+from threading import Lock
+from threading import Event
+from threading import Thread
+
+class Segment:
+	SUFFIX = ".log"
+
+	def __init__(self, directory, base):
+		self._base = base
+		self._path = os.path.join(directory, "{0:020d}{1}".format(base, Segment.SUFFIX))
+		self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+		self._size = self._capacity = os.fstat(self._fd).st_size
+		self._map = None
+
+	@property
+	def base(self):
+		return self._base
+
+	@property
+	def fd(self):
+		return self._fd
+
+	@property
+	def size(self):
+		return self._size
+
+	@size.setter
+	def size(self, value):
+		self._size = value
+
+	def view(self):
+		if not self._map:
+			self._map = mmap(self._fd, self._capacity, access = ACCESS_READ)
+		return self._map
+
+	def reserve(self, capacity):
+		if self._map:
+			self._map.close()
+			self._map = None
+		os.ftruncate(self._fd, self._size)
+		os.ftruncate(self._fd, capacity)
+		self._capacity = capacity
+
+	def fits(self, length):
+		return self._size + length <= self._capacity
+
+	def write(self, data):
+		os.pwrite(self._fd, data, self._size)
+		self._size += len(data)
+
+	def seal(self):
+		if self._map:
+			self._map.close()
+			self._map = None
+		os.ftruncate(self._fd, self._size)
+		self._capacity = self._size
+
+	def close(self):
+		if self._map:
+			self._map.close()
+			self._map = None
+		os.close(self._fd)
+
+class HistoryStore:
+	SEGMENT_SIZE = 0x1000000
+	COMMIT_INTERVAL = 0.05
+	PAGE_SIZE = 32
+
+	checksum = struct.Struct("!I")
+	record = struct.Struct("!IdH")
+
+	def __init__(self, path, segment_size = SEGMENT_SIZE,
+		commit_interval = COMMIT_INTERVAL):
+		os.makedirs(path, exist_ok = True)
+		self._path = path
+		self._segment_size = segment_size
+		self._commit_interval = commit_interval
+		self._lock = Lock()
+		self._segments = []
+		self._bases = []
+		self._index = {}
+		self._dirty = set()
+		self._load()
+		self._stopped = Event()
+		self._committer = Thread(target = self._commit_loop, daemon = True)
+		self._committer.start()
+
+	def __len__(self):
+		return sum(len(offsets) for offsets in self._index.values())
+
+	def conversations(self):
+		return list(self._index)
+
+	def append(self, conversation, message, moment = None):
+		name = conversation.encode()
+		header = HistoryStore.record.pack(len(message),
+			time() if moment is None else moment, len(name))
+		body = b"".join((header, name, message))
+		data = HistoryStore.checksum.pack(crc32(body)) + body
+		if not name or len(data) > self._segment_size:
+			raise ValueError("Invalid history record.")
+		with self._lock:
+			segment = self._segments[-1]
+			if not segment.fits(len(data)):
+				segment = self._roll()
+			offset = segment.base + segment.size
+			segment.write(data)
+			self._index.setdefault(conversation, array("Q")).append(offset)
+			self._dirty.add(segment)
+		return offset
+
+	def read(self, conversation, before = None, limit = PAGE_SIZE):
+		with self._lock:
+			offsets = self._index.get(conversation)
+			if not offsets:
+				return []
+			end = len(offsets) if before is None else bisect_left(offsets, before)
+			return [self._read_record(offset)
+				for offset in offsets[max(end - limit, 0):end]]
+
+	def commit(self):
+		with self._lock:
+			dirty, self._dirty = self._dirty, set()
+		for segment in dirty:
+			os.fsync(segment.fd)
+
+	def close(self):
+		self._stopped.set()
+		self._committer.join()
+		self.commit()
+		with self._lock:
+			self._segments[-1].seal()
+			for segment in self._segments:
+				segment.close()
+			self._segments.clear()
+
+	def _commit_loop(self):
+		while not self._stopped.wait(self._commit_interval):
+			self.commit()
+
+	def _read_record(self, offset):
+		segment = self._segments[bisect_right(self._bases, offset) - 1]
+		view = segment.view()
+		position = offset - segment.base + HistoryStore.checksum.size
+		length, moment, name_length = HistoryStore.record.unpack_from(view, position)
+		position += HistoryStore.record.size + name_length
+		return offset, moment, view[position:position + length]
+
+	def _roll(self):
+		segment = self._segments[-1]
+		segment.seal()
+		self._dirty.add(segment)
+		return self._open_segment(segment.base + segment.size)
+
+	def _open_segment(self, base):
+		segment = Segment(self._path, base)
+		segment.reserve(self._segment_size)
+		self._segments.append(segment)
+		self._bases.append(base)
+		return segment
+
+	def _load(self):
+		bases = sorted(int(name[:-len(Segment.SUFFIX)]) for name in os.listdir(self._path)
+			if name.endswith(Segment.SUFFIX))
+		for base in bases:
+			segment = Segment(self._path, base)
+			self._segments.append(segment)
+			self._bases.append(base)
+			if segment.size:
+				segment.size = self._scan(segment)
+		if not self._segments:
+			self._open_segment(0)
+		else:
+			segment = self._segments[-1]
+			segment.reserve(max(self._segment_size, segment.size))
+
+	def _scan(self, segment):
+		view, position = segment.view(), 0
+		header_size = HistoryStore.checksum.size + HistoryStore.record.size
+		while position + header_size <= len(view):
+			checksum, = HistoryStore.checksum.unpack_from(view, position)
+			body = position + HistoryStore.checksum.size
+			length, moment, name_length = HistoryStore.record.unpack_from(view, body)
+			end = body + HistoryStore.record.size + name_length + length
+			if not name_length or end > len(view) or crc32(view[body:end]) != checksum:
+				break
+			name_head = body + HistoryStore.record.size
+			conversation = view[name_head:name_head + name_length].decode()
+			self._index.setdefault(conversation, array("Q")).append(segment.base + position)
+			position = end
+		return position
@@ -0,0 +1,99 @@
+#! /usr/bin/env python3
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from history import HistoryStore
+
+class HistoryStoreTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = TemporaryDirectory()
+		self.store = self.open_store()
+
+	def tearDown(self):
+		if self.store:
+			self.store.close()
+		self.directory.cleanup()
+
+	def open_store(self):
+		return HistoryStore(self.directory.name, segment_size = 0x100)
+
+	def reopen_store(self):
+		self.store.close()
+		self.store = self.open_store()
+
+	def test_read_empty(self):
+		self.assertEqual(self.store.read("lobby"), [])
+
+	def test_read_by_conversation(self):
+		self.store.append("a", b"first", 1)
+		self.store.append("b", b"other", 2)
+		self.store.append("a", b"second", 3)
+		records = self.store.read("a")
+		self.assertEqual([(moment, message) for _, moment, message in records],
+			[(1, b"first"), (3, b"second")])
+
+	def test_paging(self):
+		offsets = [self.store.append("a", str(i).encode()) for i in range(10)]
+		page = self.store.read("a", limit = 3)
+		self.assertEqual([message for _, _, message in page], [b"7", b"8", b"9"])
+		page = self.store.read("a", before = page[0][0], limit = 3)
+		self.assertEqual([offset for offset, _, _ in page], offsets[4:7])
+
+	def test_segments_roll(self):
+		for i in range(20):
+			self.store.append("a", b"x" * 32)
+		segments = [name for name in os.listdir(self.directory.name) if name.endswith(".log")]
+		self.assertGreater(len(segments), 1)
+		self.assertEqual(len(self.store.read("a", limit = 20)), 20)
+
+	def test_reopen(self):
+		for i in range(20):
+			self.store.append("a", str(i).encode())
+		self.reopen_store()
+		self.assertEqual(len(self.store), 20)
+		self.store.append("a", b"after")
+		messages = [message for _, _, message in self.store.read("a", limit = 2)]
+		self.assertEqual(messages, [b"19", b"after"])
+
+	def test_recover_unsealed(self):
+		self.store.append("a", b"kept")
+		self.store.commit()
+		recovered = self.open_store()
+		recovered.append("a", b"next")
+		messages = [message for _, _, message in recovered.read("a")]
+		recovered.close()
+		self.assertEqual(messages, [b"kept", b"next"])
+
+	def test_recover_torn_record(self):
+		self.store.append("a", b"first", 1)
+		offset = self.store.append("a", b"second", 2)
+		self.store.close()
+		segment, = [name for name in os.listdir(self.directory.name) if name.endswith(".log")]
+		with open(os.path.join(self.directory.name, segment), "r+b") as segment_file:
+			segment_file.seek(offset + HistoryStore.checksum.size + HistoryStore.record.size + 1)
+			segment_file.write(b"\x00" * len(b"second"))
+		self.store = self.open_store()
+		self.assertEqual([message for _, _, message in self.store.read("a")], [b"first"])
+		self.assertEqual(self.store.append("a", b"third", 3), offset)
+
+	def test_commit_syncs_rolled_segments(self):
+		self.store.close()
+		self.store = HistoryStore(self.directory.name, segment_size = 0x100, commit_interval = 60)
+		synced, fsync = [], os.fsync
+		os.fsync = synced.append
+		try:
+			for i in range(8):
+				self.store.append("a", b"x" * 32)
+			self.assertEqual(synced, [])
+			self.store.commit()
+		finally:
+			os.fsync = fsync
+		self.assertEqual(sorted(synced), sorted(segment.fd for segment in self.store._segments))
+
+	def test_reject_empty_conversation(self):
+		self.assertRaises(ValueError, self.store.append, "", b"message")
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+class Lobby:
+	TIMER = "lobby"
+	WAIT_TIMEOUT = 8
+
+	def __init__(self, wheel, wait_timeout = WAIT_TIMEOUT):
+		self._wheel = wheel
+		self._wait_timeout = wait_timeout
+		self._queue = OrderedDict()
+		self._paired = 0
+		self._expired = 0
+		self._wait_total = 0.0
+		self._wait_max = 0.0
+
+	def __len__(self):
+		return len(self._queue)
+
+	def __iter__(self):
+		return iter([companion for companion, _ in self._queue.values()])
+
+	def __contains__(self, companion):
+		return id(companion) in self._queue
+
+	def push(self, companion, now):
+		self._queue[id(companion)] = (companion, now)
+		self._wheel.schedule((Lobby.TIMER, companion), now + self._wait_timeout)
+
+	def pop(self, now):
+		while self._queue:
+			_, (companion, since) = self._queue.popitem(last = False)
+			self._wheel.cancel((Lobby.TIMER, companion))
+			if not companion.room:
+				self._record_wait(now - since)
+				return companion
+		return None
+
+	def pair(self, companion, now):
+		partner = self.pop(now)
+		if partner:
+			self._paired += 1
+		else:
+			self.push(companion, now)
+		return partner
+
+	def remove(self, companion):
+		if self._queue.pop(id(companion), None):
+			self._wheel.cancel((Lobby.TIMER, companion))
+			return True
+		return False
+
+	def clear(self):
+		companions = [companion for companion, _ in self._queue.values()]
+		for companion in companions:
+			self._wheel.cancel((Lobby.TIMER, companion))
+		self._queue.clear()
+		return [companion for companion in companions if not companion.room]
+
+	def expire(self, companion, now):
+		entry = self._queue.pop(id(companion), None)
+		if entry:
+			self._expired += 1
+			self._record_wait(now - entry[1])
+		return bool(entry) and not companion.room
+
+	def stats(self, now):
+		oldest = next(iter(self._queue.values()), None)
+		waits = self._paired + self._expired
+		return {
+			"depth": len(self._queue),
+			"paired": self._paired,
+			"expired": self._expired,
+			"wait_avg": self._wait_total / waits if waits else 0.0,
+			"wait_max": self._wait_max,
+			"wait_oldest": now - oldest[1] if oldest else 0.0
+		}
+
+	def _record_wait(self, wait):
+		self._wait_total += wait
+		self._wait_max = max(self._wait_max, wait)
\ No newline at end of file
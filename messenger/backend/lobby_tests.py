@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from lobby import Lobby
+from messenger.backend.timer_wheel import TimerWheel
+
+class FakeCompanion:
+	def __init__(self):
+		self.room = None
+
+class LobbyTests(unittest.TestCase):
+	def setUp(self):
+		self.wheel = TimerWheel(0, tick = 1, slots = 8)
+		self.lobby = Lobby(self.wheel, wait_timeout = 4)
+		self.a, self.b, self.c = FakeCompanion(), FakeCompanion(), FakeCompanion()
+
+	def test_pair_in_arrival_order(self):
+		self.assertIsNone(self.lobby.pair(self.a, 0))
+		self.assertIn(self.a, self.lobby)
+		self.assertIs(self.lobby.pair(self.b, 1), self.a)
+		self.assertNotIn(self.a, self.lobby)
+		self.assertNotIn((Lobby.TIMER, self.a), self.wheel)
+		self.assertEqual(len(self.lobby), 0)
+
+	def test_pop_skips_companions_in_rooms(self):
+		self.lobby.push(self.a, 0)
+		self.lobby.push(self.b, 0)
+		self.a.room = object()
+		self.assertIs(self.lobby.pop(1), self.b)
+		self.assertIsNone(self.lobby.pop(1))
+
+	def test_remove(self):
+		self.lobby.push(self.a, 0)
+		self.assertTrue(self.lobby.remove(self.a))
+		self.assertFalse(self.lobby.remove(self.a))
+		self.assertEqual(len(self.wheel), 0)
+
+	def test_expire(self):
+		self.lobby.push(self.a, 0)
+		self.assertEqual(self.wheel.advance(4), [(Lobby.TIMER, self.a)])
+		self.assertTrue(self.lobby.expire(self.a, 4))
+		self.assertFalse(self.lobby.expire(self.a, 4))
+		self.assertEqual(self.lobby.stats(4)["expired"], 1)
+
+	def test_clear(self):
+		self.lobby.push(self.a, 0)
+		self.lobby.push(self.b, 0)
+		self.b.room = object()
+		self.assertEqual(self.lobby.clear(), [self.a])
+		self.assertEqual(len(self.lobby), 0)
+		self.assertEqual(len(self.wheel), 0)
+
+	def test_stats(self):
+		self.lobby.pair(self.a, 0)
+		self.lobby.pair(self.b, 2)
+		self.lobby.pair(self.c, 3)
+		stats = self.lobby.stats(5)
+		self.assertEqual(stats["depth"], 1)
+		self.assertEqual(stats["paired"], 1)
+		self.assertEqual(stats["wait_avg"], 2.0)
+		self.assertEqual(stats["wait_max"], 2.0)
+		self.assertEqual(stats["wait_oldest"], 2.0)
+
+if __name__ == "__main__":
+	unittest.main()
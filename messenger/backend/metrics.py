@@ -0,0 +1,178 @@
+import os
+import json
+from time import time
+from time import monotonic
+from threading import Lock
+from threading import Event
+from threading import Thread
+from threading import local
+from threading import current_thread
+from collections import Counter
+
+class Histogram:
+	SUB_BUCKET_BITS = 5
+	UNIT = 1e6
+
+	def __init__(self, sub_bucket_bits = SUB_BUCKET_BITS):
+		self._sub_bucket_bits = sub_bucket_bits
+		self._counts = [0] * (1 << sub_bucket_bits)
+		self._total = 0
+		self._max = 0
+
+	def __len__(self):
+		return self._total
+
+	def record(self, value):
+		value = int(value * Histogram.UNIT)
+		shift = max(value.bit_length() - self._sub_bucket_bits, 0)
+		index = (shift << self._sub_bucket_bits) + (value >> shift)
+		if index >= len(self._counts):
+			self._counts.extend([0] * (index + 1 - len(self._counts)))
+		self._counts[index] += 1
+		self._total += 1
+		if value > self._max:
+			self._max = value
+
+	def merge(self, other):
+		counts = list(other._counts)
+		if len(counts) > len(self._counts):
+			self._counts.extend([0] * (len(counts) - len(self._counts)))
+		for index, count in enumerate(counts):
+			self._counts[index] += count
+		self._total += other._total
+		self._max = max(self._max, other._max)
+
+	def percentile(self, fraction):
+		if not self._total:
+			return 0.0
+		rank, seen = max(int(self._total * fraction + 0.5), 1), 0
+		for index, count in enumerate(self._counts):
+			seen += count
+			if seen >= rank:
+				return min(self._bucket_high(index), self._max) / Histogram.UNIT
+		return self._max / Histogram.UNIT
+
+	def _bucket_high(self, index):
+		shift = index >> self._sub_bucket_bits
+		mantissa = index & ((1 << self._sub_bucket_bits) - 1)
+		return ((mantissa + 1) << shift) - 1
+
+	def summary(self):
+		return {
+			"count": self._total,
+			"p50": self.percentile(0.5),
+			"p90": self.percentile(0.9),
+			"p99": self.percentile(0.99),
+			"max": self._max / Histogram.UNIT
+		}
+
+class MetricsShard:
+	def __init__(self):
+		self.counters = Counter()
+		self.frames = Counter()
+		self.latency = {}
+
+	def merge(self, other):
+		self.counters.update(dict(other.counters))
+		self.frames.update(dict(other.frames))
+		for iden, histogram in list(other.latency.items()):
+			self.latency.setdefault(iden, Histogram()).merge(histogram)
+
+class Metrics:
+	def __init__(self):
+		self._lock = Lock()
+		self._gauges = {}
+		self.reset()
+
+	def reset(self):
+		with self._lock:
+			self._started = time()
+			self._local = local()
+			self._shards = []
+			self._retired = MetricsShard()
+
+	def _shard(self):
+		shard = getattr(self._local, "shard", None)
+		if shard is None:
+			shard = self._local.shard = MetricsShard()
+			with self._lock:
+				self._retire_shards()
+				self._shards.append((current_thread(), shard))
+		return shard
+
+	def _retire_shards(self):
+		alive = []
+		for thread, shard in self._shards:
+			if thread.is_alive():
+				alive.append((thread, shard))
+			else:
+				self._retired.merge(shard)
+		self._shards = alive
+
+	def incr(self, name, value = 1):
+		self._shard().counters[name] += value
+
+	def gauge(self, name, callback):
+		self._gauges[name] = callback
+
+	def frame(self, command, elapsed):
+		shard = self._shard()
+		shard.frames[command.iden] += 1
+		shard.counters["bytes_in"] += command.SIGN_SIZE + command.mesg_len
+		histogram = shard.latency.get(command.iden)
+		if not histogram:
+			histogram = shard.latency[command.iden] = Histogram()
+		histogram.record(elapsed)
+
+	def snapshot(self):
+		gauges = {name: callback() for name, callback in list(self._gauges.items())}
+		with self._lock:
+			self._retire_shards()
+			total = MetricsShard()
+			total.merge(self._retired)
+			for _, shard in self._shards:
+				total.merge(shard)
+			now = time()
+			return {
+				"time": now,
+				"uptime": now - self._started,
+				"pid": os.getpid(),
+				"gauges": gauges,
+				"counters": dict(total.counters),
+				"frames": dict(total.frames),
+				"latency": {iden: histogram.summary()
+					for iden, histogram in total.latency.items()}
+			}
+
+class MetricsWriter(Thread):
+	INTERVAL = 10
+
+	def __init__(self, path, interval = INTERVAL, source = None):
+		super().__init__(daemon = True)
+		self._path = path
+		self._interval = interval
+		self._source = source or metrics
+		self._stopped = Event()
+
+	def run(self):
+		while not self._stopped.wait(self._interval):
+			self.dump()
+
+	def stop(self):
+		self._stopped.set()
+		self.join()
+		self.dump()
+
+	def dump(self):
+		line = json.dumps(self._source.snapshot(), sort_keys = True)
+		with open(self._path, "a") as stats_file:
+			stats_file.write(line + "\n")
+
+def timed(iden, handler):
+	def timed_handler(companion, command):
+		started = monotonic()
+		handler(companion, command)
+		metrics.frame(command, monotonic() - started)
+	return timed_handler
+
+metrics = Metrics()
@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+
+import unittest
+from threading import Thread
+
+from metrics import Metrics
+from metrics import Histogram
+from messenger.protocol import Command
+
+class HistogramTests(unittest.TestCase):
+	def setUp(self):
+		self.histogram = Histogram()
+
+	def test_empty(self):
+		self.assertEqual(self.histogram.percentile(0.5), 0.0)
+		self.assertEqual(self.histogram.summary()["count"], 0)
+
+	def test_exact_small_values(self):
+		for value in range(1, 11):
+			self.histogram.record(value / Histogram.UNIT)
+		self.assertEqual(self.histogram.percentile(0.5), 5 / Histogram.UNIT)
+		self.assertEqual(self.histogram.percentile(1), 10 / Histogram.UNIT)
+
+	def test_relative_error(self):
+		for value in (0.001, 0.0123, 0.25, 3.5):
+			histogram = Histogram()
+			histogram.record(value)
+			histogram.record(value * 2)
+			self.assertLessEqual(abs(histogram.percentile(0.5) - value), value / 16)
+
+	def test_max(self):
+		self.histogram.record(0.002)
+		self.histogram.record(1.5)
+		self.assertEqual(self.histogram.percentile(0.99), 1.5)
+		self.assertEqual(self.histogram.summary()["max"], 1.5)
+		self.assertEqual(len(self.histogram), 2)
+
+	def test_merge(self):
+		other = Histogram()
+		self.histogram.record(0.001)
+		other.record(0.5)
+		other.record(2.0)
+		self.histogram.merge(other)
+		self.assertEqual(len(self.histogram), 3)
+		self.assertEqual(self.histogram.percentile(0.5), other.percentile(0))
+		self.assertEqual(self.histogram.summary()["max"], 2.0)
+
+class MetricsTests(unittest.TestCase):
+	def setUp(self):
+		self.metrics = Metrics()
+
+	def run_thread(self, target):
+		thread = Thread(target = target)
+		thread.start()
+		thread.join()
+
+	def test_counters_across_threads(self):
+		self.metrics.incr("accepted")
+		for _ in range(3):
+			self.run_thread(lambda: self.metrics.incr("accepted", 2))
+		self.assertEqual(self.metrics.snapshot()["counters"], {"accepted": 7})
+
+	def test_dead_threads_retired(self):
+		for _ in range(3):
+			self.run_thread(lambda: self.metrics.incr("accepted"))
+		self.metrics.incr("accepted")
+		self.assertEqual(len(self.metrics._shards), 1)
+		self.assertEqual(self.metrics.snapshot()["counters"]["accepted"], 4)
+
+	def test_frames(self):
+		command = Command(Command.ECHO, b"PING")
+		self.metrics.frame(command, 0.001)
+		self.run_thread(lambda: self.metrics.frame(command, 0.002))
+		snapshot = self.metrics.snapshot()
+		self.assertEqual(snapshot["frames"], {Command.ECHO: 2})
+		self.assertEqual(snapshot["counters"]["bytes_in"], 2 * (Command.SIGN_SIZE + 4))
+		self.assertEqual(snapshot["latency"][Command.ECHO]["count"], 2)
+
+	def test_reset(self):
+		self.metrics.incr("accepted")
+		self.metrics.gauge("lobby", lambda: 3)
+		self.metrics.reset()
+		self.metrics.incr("rejected")
+		snapshot = self.metrics.snapshot()
+		self.assertEqual(snapshot["counters"], {"rejected": 1})
+		self.assertEqual(snapshot["gauges"], {"lobby": 3})
+
+if __name__ == "__main__":
+	unittest.main()
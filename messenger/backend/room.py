@@ -0,0 +1,106 @@
+from messenger.protocol import Response
+from messenger.backend.typing_state import TypingTracker
+from messenger.backend.exceptions import *
+
+class Room:
+	def __init__(self, name = None):
+		self._name = name
+		self._members = {}
+		self._typing = TypingTracker()
+
+	def __len__(self):
+		return len(self._members)
+
+	def __iter__(self):
+		return iter(list(self._members.values()))
+
+	def __contains__(self, companion):
+		return id(companion) in self._members
+
+	@property
+	def name(self):
+		return self._name
+
+	@property
+	def typing(self):
+		return self._typing
+
+	def join(self, companion):
+		if companion.room:
+			companion.room.leave(companion)
+		self._members[id(companion)] = companion
+		companion.room = self
+
+	def leave(self, companion):
+		if self._members.pop(id(companion), None):
+			self._typing.forget(companion)
+			companion.room = None
+
+	def peers(self, companion):
+		return [member for member in self._members.values() if member is not companion]
+
+	def capacity(self, sender):
+		return min((member.capacity for member in self._members.values()
+			if member is not sender and member.aes), default = Response.MESG_SIZE)
+
+	def broadcast(self, sender, response):
+		signs = {}
+		for member in self._members.values():
+			if member is sender:
+				continue
+			response_type = member.response_type
+			sign = signs.get(response_type)
+			if not sign:
+				sign = signs[response_type] = response_type.pack_sign(response)
+			try:
+				member.send_frame(sign, response.mesg, response.iden)
+			except CompanionDisconnected:
+				pass
+
+	def broadcast_encoded(self, sender, iden, message, packable = False):
+		signs, packed = {}, None
+		for member in self._members.values():
+			if member is sender or not member.aes:
+				continue
+			payload = message
+			if packable and member.compression:
+				packed = packed or member.compression.pack(message)
+				payload = packed
+			response = Response(iden, mesg = member.aes.encode(payload))
+			response_type = member.response_type
+			sign = signs.get((response_type, response.mesg_len))
+			if not sign:
+				sign = response_type.pack_sign(response)
+				signs[(response_type, response.mesg_len)] = sign
+			try:
+				member.send_frame(sign, response.mesg, response.iden)
+			except CompanionDisconnected:
+				pass
+
+class Rooms:
+	def __init__(self, history = None):
+		self._rooms = {}
+		self._history = history
+
+	def __len__(self):
+		return len(self._rooms)
+
+	@property
+	def history(self):
+		return self._history
+
+	def get(self, name):
+		return self._rooms.get(name)
+
+	def join(self, name, companion):
+		room = self._rooms.get(name)
+		if not room:
+			room = self._rooms[name] = Room(name)
+		room.join(companion)
+		return room
+
+	def leave(self, companion):
+		room = companion.room
+		room.leave(companion)
+		if not len(room) and self._rooms.get(room.name) is room:
+			del self._rooms[room.name]
\ No newline at end of file
@@ -0,0 +1,136 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from room import Room
+from room import Rooms
+from messenger.protocol import Command
+from messenger.protocol import Response
+from messenger.protocol import ResponseV2
+
+class FakeCipher:
+	def __init__(self, name):
+		self.name = name
+
+	def encode(self, buf):
+		return self.name + b":" + buf
+
+class FakeCodec:
+	def __init__(self):
+		self.packed = 0
+
+	def pack(self, buf):
+		self.packed += 1
+		return b"packed:" + buf
+
+class FakeCompanion:
+	def __init__(self, response_type = Response, aes = None, compression = None):
+		self.room = None
+		self.aes = aes
+		self.compression = compression
+		self.response_type = response_type
+		self.capacity = Response.MESG_SIZE
+		self.frames = []
+
+	def send_frame(self, sign, mesg, iden = None):
+		self.frames.append((sign, mesg))
+
+class RoomTests(unittest.TestCase):
+	def setUp(self):
+		self.room = Room()
+		self.a, self.b, self.c = FakeCompanion(), FakeCompanion(), FakeCompanion(ResponseV2)
+		for companion in (self.a, self.b, self.c):
+			self.room.join(companion)
+
+	def test_join_and_leave(self):
+		self.assertEqual(len(self.room), 3)
+		self.assertIs(self.b.room, self.room)
+		self.assertEqual(self.room.peers(self.a), [self.b, self.c])
+		self.room.leave(self.a)
+		self.room.leave(self.a)
+		self.assertIsNone(self.a.room)
+		self.assertNotIn(self.a, self.room)
+		self.assertEqual(list(self.room), [self.b, self.c])
+
+	def test_join_moves_companion(self):
+		other = Room("other")
+		other.join(self.a)
+		self.assertIs(self.a.room, other)
+		self.assertNotIn(self.a, self.room)
+		self.assertEqual(len(self.room), 2)
+
+	def test_leave_forgets_typing(self):
+		self.room.typing.begin(self.a, 0)
+		self.room.leave(self.a)
+		self.assertNotIn(self.a, self.room.typing)
+
+	def test_broadcast(self):
+		response = Response(Command.TYBE)
+		self.room.broadcast(self.a, response)
+		self.assertEqual(self.a.frames, [])
+		self.assertEqual(self.b.frames, [(Response.pack_sign(response), b"")])
+		self.assertEqual(self.c.frames, [(ResponseV2.pack_sign(response), b"")])
+
+	def test_broadcast_shares_signs(self):
+		d = FakeCompanion()
+		self.room.join(d)
+		self.room.broadcast(self.a, Response(Command.PUBK, mesg = b"key"))
+		self.assertIs(self.b.frames[0][0], d.frames[0][0])
+
+	def test_broadcast_encoded(self):
+		self.b.aes, self.c.aes = FakeCipher(b"b"), FakeCipher(b"c")
+		self.a.aes = FakeCipher(b"a")
+		self.room.broadcast_encoded(self.a, Command.MESG, b"hello")
+		self.assertEqual(self.a.frames, [])
+		self.assertEqual([mesg for _, mesg in self.b.frames], [b"b:hello"])
+		self.assertEqual([mesg for _, mesg in self.c.frames], [b"c:hello"])
+		sign = Response.pack_sign(Response(Command.MESG, mesg = b"b:hello"))
+		self.assertEqual(self.b.frames[0][0], sign)
+
+	def test_broadcast_encoded_skips_insecure(self):
+		self.b.aes = FakeCipher(b"b")
+		self.room.broadcast_encoded(self.a, Command.MESG, b"hello")
+		self.assertEqual(len(self.b.frames), 1)
+		self.assertEqual(self.c.frames, [])
+
+	def test_broadcast_encoded_packs_once(self):
+		codec = FakeCodec()
+		for companion in (self.b, self.c):
+			companion.aes, companion.compression = FakeCipher(b"x"), codec
+		self.room.broadcast_encoded(self.a, Command.MESG, b"hello", packable = True)
+		self.assertEqual(codec.packed, 1)
+		self.assertEqual(self.c.frames[0][1], b"x:packed:hello")
+		self.room.broadcast_encoded(self.a, Command.CHNK, b"chunk")
+		self.assertEqual(self.c.frames[1][1], b"x:chunk")
+
+	def test_capacity(self):
+		self.assertEqual(self.room.capacity(self.a), Response.MESG_SIZE)
+		self.b.aes, self.b.capacity = FakeCipher(b"b"), 100
+		self.c.capacity = 10
+		self.assertEqual(self.room.capacity(self.a), 100)
+		self.assertEqual(self.room.capacity(self.b), Response.MESG_SIZE)
+
+class RoomsTests(unittest.TestCase):
+	def setUp(self):
+		self.rooms = Rooms()
+
+	def test_join_creates_room(self):
+		a, b = FakeCompanion(), FakeCompanion()
+		room = self.rooms.join("general", a)
+		self.assertIs(self.rooms.join("general", b), room)
+		self.assertEqual(room.name, "general")
+		self.assertIs(self.rooms.get("general"), room)
+		self.assertEqual(len(self.rooms), 1)
+
+	def test_leave_drops_empty_room(self):
+		a, b = FakeCompanion(), FakeCompanion()
+		self.rooms.join("general", a)
+		self.rooms.join("general", b)
+		self.rooms.leave(a)
+		self.assertEqual(len(self.rooms), 1)
+		self.rooms.leave(b)
+		self.assertIsNone(self.rooms.get("general"))
+		self.assertEqual(len(self.rooms), 0)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -1,24 +1,62 @@
+import json
+from time import monotonic
 from socket import socket
+from socket import socketpair
 from select import select
 from threading import Thread
 
 from messenger.secure import *
 from messenger.protocol import Command
 from messenger.protocol import Response
+from messenger.protocol import PROTOCOLS
+from messenger.protocol import Registry
+from messenger.compression import CODECS
+from messenger.compression import PayloadTooLarge
+from messenger.backend.room import Room
+from messenger.backend.lobby import Lobby
+from messenger.backend.timer_wheel import TimerWheel
+from messenger.backend.heartbeat import Heartbeat
 from messenger.backend.companion import Companion
+from messenger.backend.metrics import metrics
+from messenger.backend.metrics import timed
+from messenger.backend.admission import admission
+from messenger.backend.tickets import tickets
 from messenger.backend.exceptions import *
 
+HIST_HEAD_SIZE = 36
+
 class Server:
 	DEFAULT_PORT = 3848
 	DEFAULT_ADDRESS = "127.0.0.1"
 	ACCEPT_TIMEOUT = 8
+	DRAIN_TIMEOUT = 5
 	MAX_CLIENTS = 32
+	LOBBY_COMMANDS = frozenset((
+		Command.DSCN,
+		Command.ECHO,
+		Command.VERS,
+		Command.COMP,
+		Command.RSUM,
+		Command.JOIN,
+		Command.STAT,
+		Command.PING,
+		Command.PONG
+	))
 
-	def __init__(self):
+	def __init__(self, idle_timeout = Heartbeat.IDLE_TIMEOUT,
+		dead_timeout = Heartbeat.DEAD_TIMEOUT, drain_timeout = DRAIN_TIMEOUT):
 		self._sock = None
+		self._wakeup_r = None
+		self._wakeup_w = None
+		self._drain_deadline = None
+		self._idle_timeout = idle_timeout
+		self._dead_timeout = dead_timeout
+		self._drain_timeout = drain_timeout
 		self._sessions = set()
 		self._thread = None
 		self._thread_running = False
+		self._wheel = None
+		self._lobby = None
 
 	def run(self, addr = DEFAULT_ADDRESS, port = DEFAULT_PORT):
 		if self._thread_running:
@@ -36,17 +74,27 @@ class Server:
 		if not self._thread_running:
 			raise ServerAlreadyStopped
 
+		started = monotonic()
+		self._drain_deadline = started + self._drain_timeout
 		self._thread_running = False
-		for session in self._sessions:
-			session.join()
-		self._sessions.clear()
+		self._wakeup_w.send(b"\x00")
 
 		self._thread.join()
 		self._sock.close()
+		for session in self._sessions:
+			session.join(max(self._drain_deadline - monotonic(), 0))
+		overruns = sum(session.is_alive() for session in self._sessions)
+		self._sessions.clear()
+		self._wakeup_r.close()
+		self._wakeup_w.close()
+		return report_shutdown(started, overruns)
 
 	def is_running(self):
 		return self._thread_running
 
+	def lobby_stats(self):
+		return self._lobby.stats(monotonic())
+
 	def _configure(self, addr, port):
 		try:
 			self._sock = socket()
@@ -55,66 +103,139 @@ class Server:
 		except OSError as e:
 			self._sock.close()
 			raise ServerException(str(e))
+		self._wakeup_r, self._wakeup_w = socketpair()
+		self._wheel = TimerWheel(monotonic())
+		self._lobby = Lobby(self._wheel, Server.ACCEPT_TIMEOUT)
+		metrics.gauge("lobby", lambda: len(self._lobby))
+		metrics.gauge("connections", self._connections)
+
+	def _connections(self):
+		sessions = sum(session.is_alive() for session in list(self._sessions))
+		return len(self._lobby) + 2 * sessions
 
 	def _loop(self):
-		companion_a = companion_b = None
 		while self._thread_running:
-			if select_recv(self._sock, timeout = Server.ACCEPT_TIMEOUT):
-				sock, addr = self._sock.accept()
-				if companion_a:
-					companion_b = Companion(sock)
+			waiting = [companion for companion in self._lobby if not companion.deferred]
+			for sock in select_recv(self._sock, self._wakeup_r, *waiting,
+				timeout = self._wheel.timeout(monotonic())):
+				if sock is self._sock:
+					sock, addr = self._sock.accept()
+					self._admit(Companion(sock))
+				elif sock in self._lobby:
+					self._serve_waiting(sock)
+			self._expire_timers(monotonic())
+		drain_companions(self._lobby.clear(), self._drain_deadline)
+
+	def _serve_waiting(self, companion):
+		try:
+			for command in companion.receive_commands():
+				if companion.deferred or command.iden not in Server.LOBBY_COMMANDS:
+					companion.defer(command)
 				else:
-					companion_a = Companion(sock)
-				if (companion_a and companion_b):
-					self._begin_session(companion_a, companion_b)
-					companion_a = companion_b = None
-			elif companion_a:
-				process_conn_command(companion_a)
-				companion_a.close()
-				companion_a = None
+					dispatch_command(companion, command)
+			companion.flush()
+		except (CompanionDisconnected, SuspendSession):
+			self._lobby.remove(companion)
+			companion.close()
+
+	def _admit(self, companion):
+		metrics.incr("accepted")
+		if not admission.admit(companion):
+			reject_companion(companion)
+			return
+		partner = self._lobby.pair(companion, monotonic())
+		if partner:
+			self._begin_session(partner, companion)
+
+	def _expire_timers(self, now):
+		for kind, companion in self._wheel.advance(now):
+			if kind == Lobby.TIMER and self._lobby.expire(companion, now):
+				expire_companion(companion)
 
 	def _begin_session(self, companion_a, companion_b):
-		companion_a.companion = companion_b
-		companion_b.companion = companion_a
+		metrics.incr("sessions_started")
+		room = Room()
+		room.join(companion_a)
+		room.join(companion_b)
 		process_conn_command(companion_a)
 		process_conn_command(companion_b)
+		for companion in (companion_a, companion_b):
+			try:
+				companion.flush()
+			except CompanionDisconnected:
+				pass
 		
 		session = Thread(target = self._session_loop, 
 			args = (companion_a, companion_b))
-		self._sessions.add(session)
 		session.start()
+		self._sessions.add(session)
 
 	def _session_loop(self, companion_a, companion_b):
+		heartbeat = Heartbeat(idle_timeout = self._idle_timeout, dead_timeout = self._dead_timeout)
+		deadlines = {companion: companion.last_seen + self._idle_timeout
+			for companion in (companion_a, companion_b)}
 		try:
+			for companion in (companion_a, companion_b):
+				process_commands(companion, companion.take_deferred())
 			while self._thread_running:
-				for companion in Companion.select_recv(
-					companion_a, companion_b, timeout = Server.ACCEPT_TIMEOUT):
+				room, now = companion_a.room, monotonic()
+				timeout = max(min(deadlines.values(), default = now + self._idle_timeout) - now, 0)
+				typing_timeout = room.typing.timeout(now) if room else None
+				if typing_timeout is not None and typing_timeout < timeout:
+					timeout = typing_timeout
+				readable, writable = Companion.select_io(
+					companion_a, companion_b, timeout = timeout, wakeup = self._wakeup_r)
+				for companion in writable:
+					flush_companion(companion)
+				for companion in readable:
 					process_command(companion)
+				if room:
+					expire_typing(room, monotonic())
+				now = monotonic()
+				for companion, deadline in list(deadlines.items()):
+					if deadline <= now:
+						poll_heartbeat(heartbeat, companion, now, deadlines)
+			drain_companions((companion_a, companion_b), self._drain_deadline)
 		except SuspendSession:
 			pass
 		companion_a.close()
 		companion_b.close()
 
 def process_command(companion):
+	process_commands(companion, companion.receive_commands())
+
+def process_commands(companion, received):
+	try:
+		for command in received:
+			dispatch_command(companion, command)
+		flush_outbound(companion)
+	except CompanionDisconnected:
+		if companion.room:
+			leave_room(companion)
+		raise SuspendSession
+
+def flush_outbound(companion):
+	for peer in companion.peers:
+		try:
+			peer.flush()
+		except CompanionDisconnected:
+			pass
+	companion.flush()
+
+def flush_companion(companion):
 	try:
-		command = companion.receive_command()
+		companion.flush()
 	except CompanionDisconnected:
-		suspend_session(companion.companion)
-	command_processor = {
-		Command.CONN: process_conn_command,
-		Command.DSCN: process_dscn_command,
-		Command.SEND: process_send_command,
-		Command.ECHO: process_echo_command,
-		Command.TYBE: process_tybe_command,
-		Command.TYEN: process_tyen_command,
-		Command.AESK: process_aesk_command,
-		Command.UNKN: process_unkn_command
-	}.get(command.iden, process_unkn_command)
-	command_processor(companion, command)
-
-def process_conn_command(companion):
+		if companion.room:
+			leave_room(companion)
+		raise SuspendSession
+
+def dispatch_command(companion, command):
+	commands.lookup(command.iden)(companion, command)
+
+def process_conn_command(companion, command = None):
 	response = None
-	if companion.companion:
+	if companion.peers or companion.room and companion.room.name:
 		response_message = b"CHAT_SUCCESSFULLY_STARTED" 
 		response = Response(Command.CONN, mesg = response_message)
 	else:
@@ -124,46 +245,340 @@ def process_conn_command(companion):
 
 def process_dscn_command(companion, command):
 	suspend_session(companion)
-	suspend_session(companion.companion)
+	if companion.room:
+		leave_room(companion)
 	raise SuspendSession
 
 def process_send_command(companion, command):
-	message = companion.aes.decode(command.mesg)
-	message = companion.companion.aes.encode(message)
-	response = Response(Command.SEND)
-	companion.send_response(response)
-	response = Response(Command.MESG, mesg = message)
-	companion.companion.send_response(response)
+	if not session_ready(companion, command):
+		return
+	reserve = HIST_HEAD_SIZE if companion.room.name else 0
+	max_size = companion.room.capacity(companion) - reserve
+	message = unpack_message(companion, command, max_size)
+	if message is None:
+		return
+	message = message.rstrip(b"\x00")
+	if not fits_room(companion, command, len(message) + reserve):
+		return
+	offset = record_history(companion, message)
+	offset = b"" if offset is None else str(offset).encode()
+	companion.send_response(Response(Command.SEND, mesg = offset))
+	if companion.room.name:
+		message = offset + b":" + message
+	companion.room.broadcast_encoded(companion, Command.MESG, message, packable = True)
 
 def process_echo_command(companion, command):
 	response = Response(Command.ECHO, mesg = command.mesg)
 	companion.send_response(response)
 
 def process_tybe_command(companion, command):
-	response = Response(Command.TYBE)
-	companion.companion.send_response(response)
+	if companion.room and companion.room.typing.begin(companion, monotonic()):
+		response = Response(Command.TYBE)
+		relay(companion, response)
 
 def process_tyen_command(companion, command):
-	response = Response(Command.TYEN)
-	companion.companion.send_response(response)
+	if companion.room and companion.room.typing.end(companion):
+		response = Response(Command.TYEN)
+		relay(companion, response)
 
 def process_aesk_command(companion, command):
+	enable_aes(companion, command, Aes)
+
+def process_aesc_command(companion, command):
+	enable_aes(companion, command, AesCtr)
+
+def enable_aes(companion, command, cipher):
 	response = None
 	if companion.aes:
 		response_message = b"AES_SECURE_ALREADY_ENABLED"
-		response = Response(Command.AESK, Response.FAIL, response_message)
+		response = Response(command.iden, Response.FAIL, response_message)
 	else:
-		aes_handler = Aes()
-		companion.aes = aes_handler
+		aes_handler = companion.aes = cipher()
 		response_message = Rsa.quick_encode(command.mesg, aes_handler.export_key())
-		response = Response(Command.AESK, mesg = response_message)
+		response = Response(command.iden, mesg = response_message)
 	companion.send_response(response)
 
+def process_rsum_command(companion, command):
+	if not companion.aes and command.mesg:
+		companion.aes = tickets.redeem(command.mesg)
+	if companion.aes:
+		response = Response(Command.RSUM, mesg = tickets.issue(companion.aes))
+	else:
+		response_message = b"TICKET_REJECTED"
+		response = Response(Command.RSUM, Response.FAIL, response_message)
+	companion.send_response(response)
+
+def process_comp_command(companion, command):
+	codec = CODECS.get(bytes(command.mesg))
+	if codec:
+		companion.compression = codec()
+		response = Response(Command.COMP, mesg = codec.NAME)
+	else:
+		response_message = b"COMPRESSION_NOT_SUPPORTED"
+		response = Response(Command.COMP, Response.FAIL, response_message)
+	companion.send_response(response)
+
+def process_ping_command(companion, command):
+	response = Response(Command.PONG, mesg = command.mesg)
+	companion.send_response(response)
+
+def process_pong_command(companion, command):
+	pass
+
+def process_pubk_command(companion, command):
+	response = Response(Command.PUBK, mesg = command.mesg)
+	relay(companion, response)
+
+def process_skey_command(companion, command):
+	response = Response(Command.SKEY, mesg = command.mesg)
+	relay(companion, response)
+
+def process_rely_command(companion, command):
+	if not session_ready(companion, command, secure = False):
+		return
+	response = Response(Command.RELY)
+	companion.send_response(response)
+	response = Response(Command.RELY, mesg = command.mesg)
+	relay(companion, response)
+
+def process_vers_command(companion, command):
+	try:
+		version = int(command.mesg)
+	except ValueError:
+		version = companion.version
+	version = max(
+		(supported for supported in PROTOCOLS if supported <= version),
+		default = 1
+	)
+	response = Response(Command.VERS, mesg = str(version).encode())
+	companion.send_response(response)
+	companion.version = version
+
+def process_file_command(companion, command):
+	relay_encoded(companion, command, Command.FILE)
+
+def process_chnk_command(companion, command):
+	relay_encoded(companion, command, Command.CHNK)
+
+def process_fend_command(companion, command):
+	response = Response(Command.FEND)
+	relay(companion, response)
+
+def process_join_command(companion, command):
+	name = room_name(command)
+	if companion.rooms is None or not command.mesg:
+		response_message = b"ROOMS_NOT_SUPPORTED"
+		response = Response(Command.JOIN, Response.FAIL, response_message)
+		companion.send_response(response)
+	elif name is None:
+		response_message = b"INVALID_ROOM_NAME"
+		response = Response(Command.JOIN, Response.FAIL, response_message)
+		companion.send_response(response)
+	else:
+		if companion.room:
+			leave_room(companion)
+		companion.rooms.join(name, companion)
+		response = Response(Command.JOIN, mesg = command.mesg)
+		companion.send_response(response)
+		process_conn_command(companion)
+
+def process_stat_command(companion, command):
+	if not companion.is_local:
+		response_message = b"STAT_NOT_PERMITTED"
+		response = Response(Command.STAT, Response.FAIL, response_message)
+		companion.send_response(response)
+		return
+	message = json.dumps(metrics.snapshot(), sort_keys = True).encode()
+	for offset in range(0, len(message), Response.MESG_SIZE):
+		response = Response(Command.STAT, mesg = message[offset:offset + Response.MESG_SIZE])
+		companion.send_response(response)
+	companion.send_response(Response(Command.STAT))
+
+def process_hist_command(companion, command):
+	history = room_history(companion)
+	if history is None:
+		response_message = b"HISTORY_NOT_AVAILABLE"
+		response = Response(Command.HIST, Response.FAIL, response_message)
+		companion.send_response(response)
+		return
+	try:
+		before = int(command.mesg) if command.mesg else None
+	except ValueError:
+		before = None
+	capacity = Response.MESG_SIZE - companion.aes.OVERHEAD
+	for offset, moment, message in history.read(companion.room.name, before):
+		head = "{0}:{1:.3f}:".format(offset, moment).encode()
+		message = head + message[:capacity - len(head)]
+		response = Response(Command.HIST, mesg = companion.aes.encode(message))
+		companion.send_response(response)
+	companion.send_response(Response(Command.HIST))
+
 def process_unkn_command(companion, command):
 	response_message = b"ERROR_UNKNOWN_COMMAND"
 	response = Response(Command.UNKN, Response.FAIL, response_message)
 	companion.send_response(response)
 
+commands = Registry(process_unkn_command)
+commands.register(Command.CONN, process_conn_command)
+commands.register(Command.DSCN, process_dscn_command)
+commands.register(Command.SEND, process_send_command)
+commands.register(Command.ECHO, process_echo_command)
+commands.register(Command.TYBE, process_tybe_command)
+commands.register(Command.TYEN, process_tyen_command)
+commands.register(Command.AESK, process_aesk_command)
+commands.register(Command.AESC, process_aesc_command)
+commands.register(Command.PUBK, process_pubk_command)
+commands.register(Command.SKEY, process_skey_command)
+commands.register(Command.RELY, process_rely_command)
+commands.register(Command.VERS, process_vers_command)
+commands.register(Command.FILE, process_file_command)
+commands.register(Command.CHNK, process_chnk_command)
+commands.register(Command.FEND, process_fend_command)
+commands.register(Command.JOIN, process_join_command)
+commands.register(Command.STAT, process_stat_command)
+commands.register(Command.HIST, process_hist_command)
+commands.register(Command.RSUM, process_rsum_command)
+commands.register(Command.COMP, process_comp_command)
+commands.register(Command.PING, process_ping_command)
+commands.register(Command.PONG, process_pong_command)
+commands.register(Command.UNKN, process_unkn_command)
+commands.use(admission.middleware)
+commands.use(timed)
+commands.compile()
+
+def relay(companion, response):
+	if companion.room:
+		companion.room.broadcast(companion, response)
+
+def expire_typing(room, now):
+	expired = room.typing.expire(now)
+	for companion in expired:
+		response = Response(Command.TYEN)
+		room.broadcast(companion, response)
+	if expired:
+		for member in room:
+			try:
+				member.flush()
+			except CompanionDisconnected:
+				pass
+
+def room_name(command):
+	try:
+		return command.mesg.decode() or None
+	except UnicodeDecodeError:
+		return None
+
+def room_history(companion):
+	if companion.rooms is None or not companion.room or not companion.aes:
+		return None
+	return companion.rooms.history if companion.room.name else None
+
+def record_history(companion, message):
+	history = room_history(companion)
+	if history is not None:
+		return history.append(companion.room.name, message)
+	return None
+
+def relay_encoded(companion, command, iden):
+	message = decode_message(companion, command)
+	if message is not None and fits_room(companion, command, len(message)):
+		companion.room.broadcast_encoded(companion, iden, message)
+
+def session_ready(companion, command, secure = True):
+	if not companion.room:
+		response_message = b"NO_COMPANION"
+	elif secure and not companion.aes:
+		response_message = b"AES_SECURE_NOT_ENABLED"
+	else:
+		return True
+	response = Response(command.iden, Response.FAIL, response_message)
+	companion.send_response(response)
+	return False
+
+def decode_message(companion, command):
+	if not session_ready(companion, command):
+		return None
+	try:
+		return companion.aes.decode(command.mesg)
+	except ValueError:
+		response_message = b"MESSAGE_AUTHENTICATION_FAILED"
+		response = Response(command.iden, Response.FAIL, response_message)
+		companion.send_response(response)
+		return None
+
+def unpack_message(companion, command, max_size):
+	message = decode_message(companion, command)
+	if message is None or not companion.compression:
+		return message
+	try:
+		return companion.compression.unpack(message, max_size)
+	except PayloadTooLarge:
+		response_message = b"MESSAGE_TOO_LARGE"
+	except ValueError:
+		response_message = b"MESSAGE_DECOMPRESSION_FAILED"
+	response = Response(command.iden, Response.FAIL, response_message)
+	companion.send_response(response)
+	return None
+
+def fits_room(companion, command, size):
+	if size <= companion.room.capacity(companion):
+		return True
+	response_message = b"MESSAGE_TOO_LARGE"
+	response = Response(command.iden, Response.FAIL, response_message)
+	companion.send_response(response)
+	return False
+
+def leave_room(companion):
+	room = companion.room
+	if room.name:
+		companion.rooms.leave(companion)
+	else:
+		for peer in companion.peers:
+			suspend_session(peer)
+			room.leave(peer)
+			peer.close()
+		room.leave(companion)
+
+def poll_heartbeat(heartbeat, companion, now, deadlines):
+	state, deadline = heartbeat.poll(companion, now)
+	if deadline is None:
+		del deadlines[companion]
+	else:
+		deadlines[companion] = deadline
+	answer_heartbeat(heartbeat, companion, state)
+
+def check_heartbeat(heartbeat, companion, now):
+	answer_heartbeat(heartbeat, companion, heartbeat.check(companion, now))
+
+def answer_heartbeat(heartbeat, companion, state):
+	if state == Heartbeat.DEAD:
+		metrics.incr("connections_reaped")
+		companion.abort()
+	elif state == Heartbeat.IDLE:
+		response_message = str(heartbeat.dead_timeout).encode()
+		response = Response(Command.PING, mesg = response_message)
+		try:
+			companion.send_response(response)
+			companion.flush()
+		except CompanionDisconnected:
+			pass
+
+def expire_companion(companion):
+	try:
+		process_conn_command(companion)
+	except CompanionDisconnected:
+		pass
+	companion.close()
+
+def reject_companion(companion):
+	try:
+		response_message = b"TOO_MANY_CONNECTIONS"
+		response = Response(Command.CONN, Response.FAIL, response_message)
+		companion.send_response(response)
+	except CompanionDisconnected:
+		pass
+	companion.close()
+
 def suspend_session(companion):
 	try:
 		response_mesg = b"CHAT_STOPPED_BY_COMPANION"
@@ -172,6 +587,33 @@ def suspend_session(companion):
 	except CompanionDisconnected:
 		pass
 
+def dismiss_companion(companion):
+	room = companion.room
+	if room and room.name:
+		companion.rooms.leave(companion)
+	elif room:
+		room.leave(companion)
+	suspend_session(companion)
+
+def drain_companions(companions, deadline):
+	for companion in companions:
+		dismiss_companion(companion)
+	pending = [companion for companion in companions if companion.pending]
+	while pending and monotonic() < deadline:
+		sock_r, sock_w, sock_e = select([], pending, [], max(deadline - monotonic(), 0))
+		for companion in sock_w:
+			try:
+				companion.flush()
+			except CompanionDisconnected:
+				pending.remove(companion)
+		pending = [companion for companion in pending if companion.pending]
+
+def report_shutdown(started, overruns):
+	elapsed = monotonic() - started
+	metrics.gauge("shutdown_seconds", lambda: elapsed)
+	metrics.incr("drain_overruns", overruns)
+	return elapsed
+
 def select_recv(*sock_list, timeout):
 	sock_r, sock_e, sock_w = select(
 		sock_list,
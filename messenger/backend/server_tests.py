@@ -0,0 +1,335 @@
+#! /usr/bin/env python3
+
+import json
+import socket
+import unittest
+from time import monotonic
+from socket import socketpair
+from socket import create_connection
+from socket import SOL_SOCKET
+from socket import SO_SNDBUF
+from socket import SO_RCVBUF
+
+from Crypto.PublicKey import RSA
+
+from server import Server
+from server import HIST_HEAD_SIZE
+from server import drain_companions
+from server import report_shutdown
+from server import process_join_command
+from server import process_send_command
+from server import process_rely_command
+from server import process_stat_command
+from server import enable_aes
+from messenger.backend.async_server import AsyncServer
+from messenger.backend.companion import Companion
+from messenger.backend.metrics import metrics
+from messenger.compression import Deflate
+from messenger.framing import FrameReader
+from messenger.protocol import Command
+from messenger.protocol import Response
+
+class FakeCompanion:
+	def __init__(self, rooms = None):
+		self.room = None
+		self.rooms = rooms
+		self.is_local = True
+		self.aes = None
+		self.compression = None
+		self.responses = []
+
+	def send_response(self, response):
+		self.responses.append(response)
+
+class FakeCipher:
+	def decode(self, buf):
+		return buf
+
+class FakeRoom:
+	def __init__(self, name = None, capacity = Response.MESG_SIZE):
+		self.name = name
+		self._capacity = capacity
+		self.broadcasts = []
+
+	def capacity(self, sender):
+		return self._capacity
+
+	def broadcast_encoded(self, sender, iden, message, packable = False):
+		self.broadcasts.append(message)
+
+class RawClient:
+	def __init__(self, port):
+		self.sock = create_connection(("localhost", port), timeout = 5)
+		self.reader = FrameReader(self.sock, Response)
+		self.responses = []
+		self.seen = []
+
+	def close(self):
+		self.sock.close()
+
+	def send(self, iden, mesg = b""):
+		self.sock.sendall(Command(iden, mesg).in_raw())
+
+	def expect(self, iden):
+		while True:
+			while self.responses:
+				response = self.responses.pop(0)
+				if response.iden == iden:
+					return response
+			responses = list(self.reader.read_frames())
+			self.responses.extend(responses)
+			self.seen.extend(response.iden for response in responses)
+
+def free_port():
+	with socket.socket() as sock:
+		sock.bind(("localhost", 0))
+		return sock.getsockname()[1]
+
+class JoinCommandTests(unittest.TestCase):
+	def test_without_rooms(self):
+		companion = FakeCompanion()
+		process_join_command(companion, Command(Command.JOIN, b"general"))
+		response, = companion.responses
+		self.assertEqual((response.resl, response.mesg), (Response.FAIL, b"ROOMS_NOT_SUPPORTED"))
+
+	def test_with_invalid_name(self):
+		companion = FakeCompanion(rooms = {})
+		process_join_command(companion, Command(Command.JOIN, b"\xff\xfe"))
+		response, = companion.responses
+		self.assertEqual((response.resl, response.mesg), (Response.FAIL, b"INVALID_ROOM_NAME"))
+		self.assertIsNone(companion.room)
+
+class SendCommandTests(unittest.TestCase):
+	def setUp(self):
+		self.companion = FakeCompanion()
+		self.companion.aes = FakeCipher()
+
+	def send(self, message):
+		process_send_command(self.companion, Command(Command.SEND, message))
+		return self.companion.responses[-1]
+
+	def test_relay_within_capacity(self):
+		self.companion.room = FakeRoom(capacity = 8)
+		self.assertEqual(self.send(b"A" * 8 + b"\x00" * 8).resl, Response.OKAY)
+		self.assertEqual(self.companion.room.broadcasts, [b"A" * 8])
+
+	def test_reject_over_capacity(self):
+		self.companion.room = FakeRoom(capacity = 8)
+		response = self.send(b"A" * 9)
+		self.assertEqual((response.resl, response.mesg), (Response.FAIL, b"MESSAGE_TOO_LARGE"))
+		self.assertEqual(self.companion.room.broadcasts, [])
+
+	def test_reject_inflated_over_capacity(self):
+		self.companion.room = FakeRoom(capacity = 64)
+		self.companion.compression = Deflate()
+		response = self.send(Deflate().pack(b"a" * 65))
+		self.assertEqual((response.resl, response.mesg), (Response.FAIL, b"MESSAGE_TOO_LARGE"))
+		self.assertEqual(self.send(Deflate().pack(b"a" * 64)).resl, Response.OKAY)
+		self.assertEqual(self.companion.room.broadcasts, [b"a" * 64])
+
+	def test_named_room_reserves_history_head(self):
+		self.companion.room = FakeRoom("general", capacity = HIST_HEAD_SIZE + 8)
+		self.assertEqual(self.send(b"A" * 8).resl, Response.OKAY)
+		self.assertEqual(self.send(b"A" * 9).mesg, b"MESSAGE_TOO_LARGE")
+
+	def test_reject_before_companion(self):
+		self.assertEqual(self.send(b"A").mesg, b"NO_COMPANION")
+		process_rely_command(self.companion, Command(Command.RELY, b"A"))
+		response = self.companion.responses[-1]
+		self.assertEqual((response.iden, response.resl), (Command.RELY, Response.FAIL))
+
+	def test_reject_before_aes(self):
+		self.companion.room = FakeRoom(capacity = 8)
+		self.companion.aes = None
+		response = self.send(b"A")
+		self.assertEqual((response.resl, response.mesg), (Response.FAIL, b"AES_SECURE_NOT_ENABLED"))
+		self.assertEqual(self.companion.room.broadcasts, [])
+
+class AeskCommandTests(unittest.TestCase):
+	def test_already_enabled_creates_no_key(self):
+		companion = FakeCompanion()
+		companion.aes = FakeCipher()
+		enable_aes(companion, Command(Command.AESK), lambda: self.fail("key generated"))
+		response = companion.responses[-1]
+		self.assertEqual((response.resl, response.mesg), (Response.FAIL, b"AES_SECURE_ALREADY_ENABLED"))
+
+class StatCommandTests(unittest.TestCase):
+	def tearDown(self):
+		metrics.reset()
+
+	def test_chunks_end_with_empty_response(self):
+		for index in range(400):
+			metrics.incr("padding_{0}".format(index))
+		companion = FakeCompanion()
+		process_stat_command(companion, Command(Command.STAT))
+		*chunks, last = companion.responses
+		self.assertGreater(len(chunks), 1)
+		self.assertTrue(all(len(chunk.mesg) <= Response.MESG_SIZE for chunk in chunks))
+		self.assertEqual(last.mesg, b"")
+		snapshot = json.loads(b"".join(chunk.mesg for chunk in chunks))
+		self.assertEqual(snapshot["counters"]["padding_399"], 1)
+
+	def test_not_local(self):
+		companion = FakeCompanion()
+		companion.is_local = False
+		process_stat_command(companion, Command(Command.STAT))
+		response, = companion.responses
+		self.assertEqual(response.mesg, b"STAT_NOT_PERMITTED")
+
+class ServerTests(unittest.TestCase):
+	def setUp(self):
+		self.port = free_port()
+		self.server = Server(drain_timeout = 1)
+		self.server.run(port = self.port)
+		self.clients = []
+
+	def tearDown(self):
+		for client in self.clients:
+			client.close()
+		self.server.stop()
+
+	def connect(self):
+		client = RawClient(self.port)
+		self.clients.append(client)
+		return client
+
+	def test_lobby_defers_session_commands(self):
+		waiting = self.connect()
+		waiting.send(Command.ECHO, b"lobby")
+		self.assertEqual(waiting.expect(Command.ECHO).mesg, b"lobby")
+		waiting.send(Command.AESK, RSA.generate(1024).publickey().exportKey("PEM"))
+		waiting.send(Command.ECHO, b"session")
+		waiting.sock.settimeout(0.3)
+		self.assertRaises(socket.timeout, waiting.expect, Command.AESK)
+		waiting.sock.settimeout(5)
+		self.connect()
+		self.assertEqual(waiting.expect(Command.CONN).resl, Response.OKAY)
+		self.assertEqual(waiting.expect(Command.AESK).resl, Response.OKAY)
+		self.assertEqual(waiting.expect(Command.ECHO).mesg, b"session")
+		self.assertEqual(waiting.seen[-3:], [Command.CONN, Command.AESK, Command.ECHO])
+
+class SessionHeartbeatTests(unittest.TestCase):
+	def setUp(self):
+		self.port = free_port()
+		self.server = Server(idle_timeout = 0.2, dead_timeout = 0.6, drain_timeout = 1)
+		self.server.run(port = self.port)
+		self.clients = [RawClient(self.port), RawClient(self.port)]
+
+	def tearDown(self):
+		for client in self.clients:
+			client.close()
+		self.server.stop()
+
+	def test_session_pings_idle_companions(self):
+		for client in self.clients:
+			self.assertEqual(client.expect(Command.CONN).resl, Response.OKAY)
+		for client in self.clients:
+			self.assertEqual(client.expect(Command.PING).mesg, b"0.6")
+			client.send(Command.PONG, b"0.6")
+		for client in self.clients:
+			self.assertEqual(client.expect(Command.PING).mesg, b"0.6")
+
+class DrainTests(unittest.TestCase):
+	def setUp(self):
+		self.sock, self.peer_sock = socketpair()
+		self.sock.setsockopt(SOL_SOCKET, SO_SNDBUF, 4096)
+		self.peer_sock.setsockopt(SOL_SOCKET, SO_RCVBUF, 4096)
+		self.companion = Companion(self.sock)
+
+	def tearDown(self):
+		self.peer_sock.close()
+		self.companion.close()
+		metrics.reset()
+
+	def test_drain_sends_dscn(self):
+		drain_companions([self.companion], monotonic() + 1)
+		self.assertEqual(self.companion.pending, 0)
+		response, = FrameReader(self.peer_sock, Response).read_frames()
+		self.assertEqual(response.iden, Command.DSCN)
+
+	def test_drain_stops_at_deadline(self):
+		self.companion.send_frame(b"", b"A" * 0x20000)
+		started = monotonic()
+		drain_companions([self.companion], started + 0.2)
+		self.assertGreaterEqual(monotonic() - started, 0.2)
+		self.assertLess(monotonic() - started, 1)
+		self.assertGreater(self.companion.pending, 0)
+
+	def test_report_shutdown(self):
+		elapsed = report_shutdown(monotonic() - 1, 2)
+		self.assertGreaterEqual(elapsed, 1)
+		snapshot = metrics.snapshot()
+		self.assertEqual(snapshot["gauges"]["shutdown_seconds"], elapsed)
+		self.assertEqual(snapshot["counters"]["drain_overruns"], 2)
+
+class ShutdownTests(unittest.TestCase):
+	def tearDown(self):
+		metrics.reset()
+
+	def check_shutdown(self, server):
+		port = free_port()
+		server.run(port = port)
+		clients = [RawClient(port) for _ in range(4)]
+		try:
+			for client in clients:
+				self.assertEqual(client.expect(Command.CONN).resl, Response.OKAY)
+			started = monotonic()
+			elapsed = server.stop()
+			self.assertLess(monotonic() - started, 1)
+			self.assertLessEqual(elapsed, monotonic() - started)
+			for client in clients:
+				self.assertEqual(client.expect(Command.DSCN).resl, Response.OKAY)
+		finally:
+			for client in clients:
+				client.close()
+
+	def test_server(self):
+		self.check_shutdown(Server(drain_timeout = 1))
+
+	def test_async_server(self):
+		self.check_shutdown(AsyncServer(drain_timeout = 1))
+
+class AsyncServerTests(unittest.TestCase):
+	def setUp(self):
+		self.port = free_port()
+		self.server = AsyncServer()
+		self.server.run(port = self.port)
+		self.clients = []
+
+	def tearDown(self):
+		for client in self.clients:
+			client.close()
+		self.server.stop()
+
+	def connect(self):
+		client = RawClient(self.port)
+		self.clients.append(client)
+		return client
+
+	def test_join_keeps_lobby_partner(self):
+		stranger, joiner = self.connect(), self.connect()
+		self.assertEqual(stranger.expect(Command.CONN).resl, Response.OKAY)
+		self.assertEqual(joiner.expect(Command.CONN).resl, Response.OKAY)
+		joiner.send(Command.JOIN, b"general")
+		self.assertEqual(joiner.expect(Command.JOIN).resl, Response.OKAY)
+		other = self.connect()
+		self.assertEqual(other.expect(Command.CONN).resl, Response.OKAY)
+		self.assertEqual(stranger.expect(Command.CONN).resl, Response.OKAY)
+		stranger.send(Command.ECHO, b"still here")
+		self.assertEqual(stranger.expect(Command.ECHO).mesg, b"still here")
+		self.assertNotIn(Command.DSCN, stranger.seen)
+
+	def test_first_flight_join_skips_lobby(self):
+		stranger, joiner = self.connect(), self.connect()
+		joiner.send(Command.JOIN, b"general")
+		self.assertEqual(joiner.expect(Command.JOIN).resl, Response.OKAY)
+		other = self.connect()
+		self.assertEqual(other.expect(Command.CONN).resl, Response.OKAY)
+		self.assertEqual(stranger.expect(Command.CONN).resl, Response.OKAY)
+		joiner.send(Command.ECHO, b"joined")
+		self.assertEqual(joiner.expect(Command.ECHO).mesg, b"joined")
+		self.assertEqual(stranger.seen.count(Command.CONN), 1)
+		self.assertEqual(joiner.seen.count(Command.CONN), 1)
+
+if __name__ == "__main__":
+	unittest.main()
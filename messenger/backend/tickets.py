@@ -0,0 +1,41 @@
+import struct
+from time import time
+
+from messenger.secure import Aes
+from messenger.secure import AesCtr
+
+class SessionTickets:
+	LIFETIME = 3600
+	MODES = (Aes, AesCtr)
+
+	payload = struct.Struct("!dB%ds" % Aes.KEY_SIZE)
+
+	def __init__(self, lifetime = LIFETIME):
+		self._lifetime = lifetime
+		self.rotate()
+
+	def rotate(self):
+		self._cipher = AesCtr()
+
+	def issue(self, aes_handler, now = None):
+		mode = SessionTickets.MODES.index(type(aes_handler))
+		message = SessionTickets.payload.pack(time() if now is None else now,
+			mode, aes_handler.export_key())
+		return bytes(self._cipher.encode(message))
+
+	def redeem(self, ticket, now = None):
+		try:
+			message = self._cipher.decode(ticket)
+		except ValueError:
+			return None
+		if len(message) != SessionTickets.payload.size:
+			return None
+		issued, mode, key = SessionTickets.payload.unpack(message)
+		age = (time() if now is None else now) - issued
+		if mode >= len(SessionTickets.MODES) or not 0 <= age <= self._lifetime:
+			return None
+		aes_handler = SessionTickets.MODES[mode]()
+		aes_handler.import_key(key)
+		return aes_handler
+
+tickets = SessionTickets()
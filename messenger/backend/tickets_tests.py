@@ -0,0 +1,41 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from tickets import SessionTickets
+from messenger.secure import Aes
+from messenger.secure import AesCtr
+
+class SessionTicketsTests(unittest.TestCase):
+	def setUp(self):
+		self.tickets = SessionTickets(lifetime = 60)
+
+	def test_redeem_restores_context(self):
+		for aes_type in (Aes, AesCtr):
+			aes = aes_type()
+			restored = self.tickets.redeem(self.tickets.issue(aes, now = 0), now = 30)
+			self.assertIs(type(restored), aes_type)
+			self.assertEqual(restored.export_key(), aes.export_key())
+
+	def test_opaque(self):
+		aes = Aes()
+		self.assertNotIn(aes.export_key(), self.tickets.issue(aes))
+
+	def test_expired(self):
+		ticket = self.tickets.issue(Aes(), now = 0)
+		self.assertIsNone(self.tickets.redeem(ticket, now = 61))
+		self.assertIsNone(self.tickets.redeem(ticket, now = -1))
+
+	def test_tampered(self):
+		ticket = bytearray(self.tickets.issue(Aes()))
+		ticket[AesCtr.NONCE_SIZE] ^= 1
+		self.assertIsNone(self.tickets.redeem(bytes(ticket)))
+		self.assertIsNone(self.tickets.redeem(b""))
+
+	def test_rotate(self):
+		ticket = self.tickets.issue(Aes())
+		self.tickets.rotate()
+		self.assertIsNone(self.tickets.redeem(ticket))
+
+if __name__ == "__main__":
+	unittest.main()
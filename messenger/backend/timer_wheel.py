@@ -0,0 +1,45 @@
+from math import ceil
+
+class TimerWheel:
+	TICK = 0.5
+	SLOTS = 512
+
+	def __init__(self, now, tick = TICK, slots = SLOTS):
+		self._tick = tick
+		self._slots = [{} for _ in range(slots)]
+		self._timers = {}
+		self._current = int(now / tick)
+
+	def __len__(self):
+		return len(self._timers)
+
+	def __contains__(self, key):
+		return key in self._timers
+
+	def schedule(self, key, deadline):
+		self.cancel(key)
+		tick = max(ceil(deadline / self._tick), self._current + 1)
+		slot = tick % len(self._slots)
+		self._slots[slot][key] = tick
+		self._timers[key] = slot
+
+	def cancel(self, key):
+		slot = self._timers.pop(key, None)
+		if slot is not None:
+			del self._slots[slot][key]
+
+	def advance(self, now):
+		target, expired = int(now / self._tick), []
+		steps = min(target - self._current, len(self._slots))
+		for step in range(1, steps + 1):
+			slot = self._slots[(self._current + step) % len(self._slots)]
+			due = [key for key, tick in slot.items() if tick <= target]
+			for key in due:
+				del slot[key]
+				del self._timers[key]
+			expired.extend(due)
+		self._current = max(self._current, target)
+		return expired
+
+	def timeout(self, now):
+		return max((self._current + 1) * self._tick - now, 0)
\ No newline at end of file
@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from timer_wheel import TimerWheel
+
+class TimerWheelTests(unittest.TestCase):
+	def setUp(self):
+		self.wheel = TimerWheel(0, tick = 1, slots = 8)
+
+	def test_expire_in_order(self):
+		self.wheel.schedule("a", 2)
+		self.wheel.schedule("b", 4)
+		self.assertEqual(self.wheel.advance(1), [])
+		self.assertEqual(self.wheel.advance(2), ["a"])
+		self.assertEqual(self.wheel.advance(5), ["b"])
+		self.assertEqual(len(self.wheel), 0)
+
+	def test_deadline_rounds_up(self):
+		self.wheel.schedule("a", 2.5)
+		self.assertEqual(self.wheel.advance(2.9), [])
+		self.assertEqual(self.wheel.advance(3), ["a"])
+
+	def test_deadline_in_past(self):
+		self.wheel.advance(3)
+		self.wheel.schedule("a", 1)
+		self.assertEqual(self.wheel.advance(4), ["a"])
+
+	def test_cancel(self):
+		self.wheel.schedule("a", 2)
+		self.wheel.cancel("a")
+		self.wheel.cancel("b")
+		self.assertNotIn("a", self.wheel)
+		self.assertEqual(self.wheel.advance(3), [])
+
+	def test_reschedule(self):
+		self.wheel.schedule("a", 2)
+		self.wheel.schedule("a", 6)
+		self.assertEqual(self.wheel.advance(5), [])
+		self.assertEqual(self.wheel.advance(6), ["a"])
+
+	def test_deadline_beyond_one_turn(self):
+		self.wheel.schedule("a", 3)
+		self.wheel.schedule("b", 19)
+		self.assertEqual(self.wheel.advance(11), ["a"])
+		self.assertEqual(self.wheel.advance(18), [])
+		self.assertEqual(self.wheel.advance(40), ["b"])
+
+	def test_timeout(self):
+		self.wheel.advance(2)
+		self.assertEqual(self.wheel.timeout(2.25), 0.75)
+
+	def test_timeout_when_late(self):
+		self.wheel.advance(2)
+		self.assertEqual(self.wheel.timeout(3.5), 0)
+
+if __name__ == "__main__":
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,51 @@
+class TypingTracker:
+	TIMER = "typing"
+	MIN_INTERVAL = 1
+	EXPIRY = 5
+
+	def __init__(self, min_interval = MIN_INTERVAL, expiry = EXPIRY):
+		self._min_interval = min_interval
+		self._expiry = expiry
+		self._deadlines = {}
+		self._relayed = {}
+
+	def __len__(self):
+		return len(self._deadlines)
+
+	def __contains__(self, companion):
+		return id(companion) in self._deadlines
+
+	def begin(self, companion, now):
+		key = id(companion)
+		typing = key in self._deadlines
+		relayed = self._relayed.get(key)
+		if not typing and relayed is not None and now - relayed < self._min_interval:
+			return False
+		self._deadlines[key] = (companion, now + self._expiry)
+		if typing:
+			return False
+		self._relayed[key] = now
+		return True
+
+	def end(self, companion):
+		return self._deadlines.pop(id(companion), None) is not None
+
+	def forget(self, companion):
+		self._deadlines.pop(id(companion), None)
+		self._relayed.pop(id(companion), None)
+
+	def deadline(self, companion):
+		entry = self._deadlines.get(id(companion))
+		return entry[1] if entry else None
+
+	def timeout(self, now):
+		if not self._deadlines:
+			return None
+		deadline = min(deadline for _, deadline in self._deadlines.values())
+		return max(deadline - now, 0)
+
+	def expire(self, now):
+		expired = [companion for companion, deadline in self._deadlines.values() if deadline <= now]
+		for companion in expired:
+			del self._deadlines[id(companion)]
+		return expired
@@ -0,0 +1,49 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from typing_state import TypingTracker
+
+class TypingTrackerTests(unittest.TestCase):
+	def setUp(self):
+		self.tracker = TypingTracker(min_interval = 1, expiry = 5)
+		self.companion = object()
+
+	def test_begin_deduplicated(self):
+		self.assertTrue(self.tracker.begin(self.companion, 0))
+		self.assertFalse(self.tracker.begin(self.companion, 0.5))
+		self.assertFalse(self.tracker.begin(self.companion, 3))
+		self.assertEqual(self.tracker.deadline(self.companion), 8)
+
+	def test_end_only_when_typing(self):
+		self.assertFalse(self.tracker.end(self.companion))
+		self.tracker.begin(self.companion, 0)
+		self.assertTrue(self.tracker.end(self.companion))
+		self.assertFalse(self.tracker.end(self.companion))
+
+	def test_min_interval(self):
+		self.tracker.begin(self.companion, 0)
+		self.tracker.end(self.companion)
+		self.assertFalse(self.tracker.begin(self.companion, 0.5))
+		self.assertFalse(self.tracker.end(self.companion))
+		self.assertTrue(self.tracker.begin(self.companion, 1))
+
+	def test_expire(self):
+		other = object()
+		self.tracker.begin(self.companion, 0)
+		self.tracker.begin(other, 2)
+		self.assertEqual(self.tracker.timeout(1), 4)
+		self.assertEqual(self.tracker.expire(4), [])
+		self.assertEqual(self.tracker.expire(5), [self.companion])
+		self.assertEqual(self.tracker.timeout(5), 2)
+		self.assertEqual(self.tracker.expire(10), [other])
+		self.assertIsNone(self.tracker.timeout(10))
+
+	def test_forget(self):
+		self.tracker.begin(self.companion, 0)
+		self.tracker.forget(self.companion)
+		self.assertNotIn(self.companion, self.tracker)
+		self.assertTrue(self.tracker.begin(self.companion, 0.5))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,282 @@
+import os
+import signal
+from time import monotonic
+from ipaddress import ip_address
+from threading import Thread
+from socket import socket
+from socket import socketpair
+from socket import send_fds
+from socket import recv_fds
+from socket import AF_UNIX
+from socket import SOCK_SEQPACKET
+from socket import SOL_SOCKET
+from socket import SO_REUSEADDR
+from socket import SO_REUSEPORT
+
+from messenger.backend.server import Server
+from messenger.backend.server import select_recv
+from messenger.backend.server import expire_companion
+from messenger.backend.server import reject_companion
+from messenger.backend.companion import Companion
+from messenger.backend.companion import peer_address
+from messenger.backend.admission import admission
+from messenger.backend.lobby import Lobby
+from messenger.backend.timer_wheel import TimerWheel
+from messenger.backend.heartbeat import Heartbeat
+from messenger.backend.metrics import metrics
+from messenger.backend.metrics import MetricsWriter
+from messenger.backend.exceptions import *
+
+BROKER_WAIT = b"WAIT"
+BROKER_PAIR = b"PAIR"
+BROKER_EXPR = b"EXPR"
+BROKER_REJT = b"REJT"
+BROKER_DONE = b"DONE"
+BROKER_MESG_SIZE = 4
+
+class WorkerServer(Server):
+	def __init__(self, broker, idle_timeout = Heartbeat.IDLE_TIMEOUT,
+		dead_timeout = Heartbeat.DEAD_TIMEOUT, drain_timeout = Server.DRAIN_TIMEOUT):
+		super().__init__(idle_timeout, dead_timeout, drain_timeout)
+		self._broker = broker
+
+	def _configure(self, addr, port):
+		try:
+			self._sock = socket()
+			self._sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+			self._sock.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+			self._sock.bind((addr, port))
+			self._sock.listen(Server.MAX_CLIENTS)
+		except OSError as e:
+			self._sock.close()
+			raise ServerException(str(e))
+		self._wakeup_r, self._wakeup_w = socketpair()
+		metrics.gauge("connections", self._connections)
+
+	def lobby_stats(self):
+		return None
+
+	def _connections(self):
+		return 2 * sum(session.is_alive() for session in list(self._sessions))
+
+	def _loop(self):
+		while self._thread_running:
+			for sock in select_recv(self._sock, self._broker, self._wakeup_r,
+				timeout = Server.ACCEPT_TIMEOUT):
+				if sock is self._sock:
+					sock, addr = self._sock.accept()
+					metrics.incr("accepted")
+					self._forward(sock)
+				elif sock is self._broker:
+					self._process_broker()
+
+	def _forward(self, sock):
+		send_fds(self._broker, [BROKER_WAIT], [sock.fileno()])
+		sock.close()
+
+	def _process_broker(self):
+		mesg, fds, *_ = recv_fds(self._broker, BROKER_MESG_SIZE, 2)
+		if not mesg:
+			self._thread_running = False
+			return
+
+		companions = [Companion(socket(fileno = fd)) for fd in fds]
+		if mesg == BROKER_PAIR:
+			self._begin_session(*companions)
+		elif mesg == BROKER_REJT:
+			for companion in companions:
+				reject_companion(companion)
+		else:
+			for companion in companions:
+				expire_companion(companion)
+
+	def _session_loop(self, companion_a, companion_b):
+		fds = [os.dup(companion.fileno()) for companion in (companion_a, companion_b)]
+		try:
+			super()._session_loop(companion_a, companion_b)
+		finally:
+			try:
+				send_fds(self._broker, [BROKER_DONE], fds)
+			except OSError:
+				pass
+			for fd in fds:
+				os.close(fd)
+
+class Waiting:
+	def __init__(self, conn, fd):
+		self.conn = conn
+		self.fd = fd
+		self.room = None
+		self.inode = os.fstat(fd).st_ino
+		self.address = fd_address(fd)
+
+	@property
+	def is_local(self):
+		return bool(self.address) and ip_address(self.address).is_loopback
+
+class Broker:
+	def __init__(self, conns, wait_timeout = Server.ACCEPT_TIMEOUT):
+		self._conns = list(conns)
+		self._wheel = TimerWheel(monotonic())
+		self._lobby = Lobby(self._wheel, wait_timeout)
+		self._sessions = {}
+		self._thread = None
+		self._thread_running = False
+
+	def run(self):
+		self._thread_running = True
+		self._thread = Thread(target = self._loop)
+		self._thread.start()
+
+	def stop(self):
+		self._thread_running = False
+		self._thread.join()
+		for waiting in self._lobby.clear():
+			admission.release(waiting)
+			os.close(waiting.fd)
+		for waiting in self._sessions.values():
+			admission.release(waiting)
+		self._sessions.clear()
+		for conn in self._conns:
+			conn.close()
+
+	def stats(self):
+		return self._lobby.stats(monotonic())
+
+	def _loop(self):
+		while self._thread_running and self._conns:
+			for conn in select_recv(*self._conns,
+				timeout = self._wheel.timeout(monotonic())):
+				mesg, fds, *_ = recv_fds(conn, BROKER_MESG_SIZE, 2)
+				if not mesg:
+					self._conns.remove(conn)
+				elif mesg == BROKER_DONE:
+					for fd in fds:
+						self._release(fd)
+				else:
+					for fd in fds:
+						self._admit(Waiting(conn, fd))
+			self._expire_timers(monotonic())
+
+	def _admit(self, waiting):
+		if not admission.admit(waiting):
+			self._send(waiting.conn, BROKER_REJT, waiting.fd)
+			return
+		partner = self._lobby.pair(waiting, monotonic())
+		if partner:
+			self._sessions[partner.inode] = partner
+			self._sessions[waiting.inode] = waiting
+			self._send(waiting.conn, BROKER_PAIR, partner.fd, waiting.fd)
+
+	def _release(self, fd):
+		waiting = self._sessions.pop(os.fstat(fd).st_ino, None)
+		if waiting:
+			admission.release(waiting)
+		os.close(fd)
+
+	def _expire_timers(self, now):
+		for _, waiting in self._wheel.advance(now):
+			if self._lobby.expire(waiting, now):
+				admission.release(waiting)
+				self._send(waiting.conn, BROKER_EXPR, waiting.fd)
+
+	def _send(self, conn, mesg, *fds):
+		try:
+			send_fds(conn, [mesg], fds)
+		except OSError:
+			pass
+		for fd in fds:
+			os.close(fd)
+
+class WorkerPool:
+	DEFAULT_PORT = Server.DEFAULT_PORT
+	DEFAULT_ADDRESS = Server.DEFAULT_ADDRESS
+	DEFAULT_WORKERS = os.cpu_count() or 1
+
+	def __init__(self, workers = DEFAULT_WORKERS, stats_path = None,
+		stats_interval = MetricsWriter.INTERVAL, idle_timeout = Heartbeat.IDLE_TIMEOUT,
+		dead_timeout = Heartbeat.DEAD_TIMEOUT, drain_timeout = Server.DRAIN_TIMEOUT):
+		self._workers = workers
+		self._stats_path = stats_path
+		self._stats_interval = stats_interval
+		self._idle_timeout = idle_timeout
+		self._dead_timeout = dead_timeout
+		self._drain_timeout = drain_timeout
+		self._pids = []
+		self._broker = None
+
+	def run(self, addr = DEFAULT_ADDRESS, port = DEFAULT_PORT):
+		if self._pids:
+			raise ServerAlreadyRunning
+
+		conns = []
+		for _ in range(self._workers):
+			conn, worker_conn = socketpair(AF_UNIX, SOCK_SEQPACKET)
+			pid = os.fork()
+			if not pid:
+				conn.close()
+				for other in conns:
+					other.close()
+				run_worker(worker_conn, addr, port, self._stats_path,
+					self._stats_interval, self._idle_timeout, self._dead_timeout,
+					self._drain_timeout)
+			worker_conn.close()
+			conns.append(conn)
+			self._pids.append(pid)
+
+		self._broker = Broker(conns)
+		self._broker.run()
+
+	def stop(self):
+		if not self._pids:
+			raise ServerAlreadyStopped
+
+		started, failures = monotonic(), 0
+		for pid in self._pids:
+			os.kill(pid, signal.SIGTERM)
+		for pid in self._pids:
+			_, status = os.waitpid(pid, 0)
+			failures += bool(os.waitstatus_to_exitcode(status))
+		workers = len(self._pids)
+		self._pids.clear()
+		self._broker.stop()
+		if failures:
+			message = "{0} of {1} workers exited with an error.".format(failures, workers)
+			raise ServerException(message)
+		return monotonic() - started
+
+	def is_running(self):
+		return bool(self._pids)
+
+	def lobby_stats(self):
+		return self._broker.stats()
+
+def fd_address(fd):
+	try:
+		sock = socket(fileno = fd)
+	except OSError:
+		return None
+	address = peer_address(sock.getpeername)
+	sock.detach()
+	return address
+
+def run_worker(broker, addr, port, stats_path = None,
+	stats_interval = MetricsWriter.INTERVAL, idle_timeout = Heartbeat.IDLE_TIMEOUT,
+	dead_timeout = Heartbeat.DEAD_TIMEOUT, drain_timeout = Server.DRAIN_TIMEOUT):
+	status = 0
+	try:
+		signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTERM})
+		metrics.reset()
+		server = WorkerServer(broker, idle_timeout, dead_timeout, drain_timeout)
+		server.run(addr, port)
+		writer = MetricsWriter(stats_path, stats_interval) if stats_path else None
+		if writer:
+			writer.start()
+		signal.sigwait({signal.SIGTERM})
+		server.stop()
+		if writer:
+			writer.stop()
+	except ServerException:
+		status = 1
+	finally:
+		os._exit(status)
\ No newline at end of file
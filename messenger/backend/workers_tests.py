@@ -0,0 +1,155 @@
+#! /usr/bin/env python3
+
+import os
+import socket
+import unittest
+from socket import socketpair
+from socket import create_connection
+from socket import send_fds
+from socket import recv_fds
+from socket import AF_UNIX
+from socket import SOCK_SEQPACKET
+
+from workers import Broker
+from workers import WorkerServer
+from workers import BROKER_WAIT
+from workers import BROKER_PAIR
+from workers import BROKER_EXPR
+from workers import BROKER_REJT
+from workers import BROKER_DONE
+from workers import BROKER_MESG_SIZE
+from messenger.backend.admission import admission
+from messenger.framing import FrameReader
+from messenger.protocol import Command
+from messenger.protocol import Response
+
+def free_port():
+	with socket.socket() as sock:
+		sock.bind(("localhost", 0))
+		return sock.getsockname()[1]
+
+class BrokerTests(unittest.TestCase):
+	def setUp(self):
+		self.workers = []
+		conns = []
+		for _ in range(2):
+			conn, worker = socketpair(AF_UNIX, SOCK_SEQPACKET)
+			worker.settimeout(5)
+			conns.append(conn)
+			self.workers.append(worker)
+		self.broker = Broker(conns, wait_timeout = 0.5)
+		self.broker.run()
+		self.clients = []
+
+	def tearDown(self):
+		self.broker.stop()
+		for worker in self.workers:
+			worker.close()
+		for client in self.clients:
+			client.close()
+
+	def wait(self, worker):
+		fd_r, fd_w = os.pipe()
+		send_fds(worker, [BROKER_WAIT], [fd_r])
+		os.close(fd_r)
+		return fd_w
+
+	def connect(self, worker, listener):
+		self.clients.append(create_connection(listener.getsockname(), timeout = 5))
+		sock, _ = listener.accept()
+		send_fds(worker, [BROKER_WAIT], [sock.fileno()])
+		sock.close()
+
+	def receive(self, worker):
+		mesg, fds, *_ = recv_fds(worker, BROKER_MESG_SIZE, 2)
+		for fd in fds:
+			os.close(fd)
+		return mesg, len(fds)
+
+	def test_pair_across_workers(self):
+		fds = [self.wait(self.workers[0]), self.wait(self.workers[1])]
+		self.assertEqual(self.receive(self.workers[1]), (BROKER_PAIR, 2))
+		self.assertEqual(self.broker.stats()["paired"], 1)
+		for fd in fds:
+			os.close(fd)
+
+	def test_expire_waiting(self):
+		fd = self.wait(self.workers[0])
+		self.assertEqual(self.receive(self.workers[0]), (BROKER_EXPR, 1))
+		stats = self.broker.stats()
+		self.assertEqual((stats["depth"], stats["expired"]), (0, 1))
+		os.close(fd)
+
+	def test_admission_until_done(self):
+		limits = admission.max_connections, admission.exempt_local
+		admission.max_connections, admission.exempt_local = 2, False
+		try:
+			with socket.socket() as listener:
+				listener.bind(("localhost", 0))
+				listener.listen()
+				self.connect(self.workers[0], listener)
+				self.connect(self.workers[1], listener)
+				mesg, fds, *_ = recv_fds(self.workers[1], BROKER_MESG_SIZE, 2)
+				self.assertEqual(mesg, BROKER_PAIR)
+				self.connect(self.workers[0], listener)
+				self.assertEqual(self.receive(self.workers[0]), (BROKER_REJT, 1))
+				send_fds(self.workers[1], [BROKER_DONE], fds)
+				for fd in fds:
+					os.close(fd)
+				self.connect(self.workers[1], listener)
+				self.connect(self.workers[1], listener)
+				self.assertEqual(self.receive(self.workers[1]), (BROKER_PAIR, 2))
+		finally:
+			admission.max_connections, admission.exempt_local = limits
+
+class WorkerServerTests(unittest.TestCase):
+	def setUp(self):
+		self.broker, self.conn = socketpair(AF_UNIX, SOCK_SEQPACKET)
+		self.broker.settimeout(5)
+		self.port = free_port()
+		self.server = WorkerServer(self.conn)
+		self.server.run(port = self.port)
+		self.clients = []
+
+	def tearDown(self):
+		for client in self.clients:
+			client.close()
+		self.server.stop()
+		self.broker.close()
+		self.conn.close()
+
+	def connect(self):
+		client = create_connection(("localhost", self.port), timeout = 5)
+		self.clients.append(client)
+		mesg, fds, *_ = recv_fds(self.broker, BROKER_MESG_SIZE, 1)
+		self.assertEqual(mesg, BROKER_WAIT)
+		return client, fds[0]
+
+	def test_without_lobby(self):
+		self.assertIsNone(self.server.lobby_stats())
+		self.assertEqual(self.server._connections(), 0)
+
+	def test_begin_paired_session(self):
+		(client_a, fd_a), (client_b, fd_b) = self.connect(), self.connect()
+		send_fds(self.broker, [BROKER_PAIR], [fd_a, fd_b])
+		for fd in (fd_a, fd_b):
+			os.close(fd)
+		for client in (client_a, client_b):
+			response, *_ = FrameReader(client, Response).read_frames()
+			self.assertEqual((response.iden, response.resl), (Command.CONN, Response.OKAY))
+		for client in (client_a, client_b):
+			client.close()
+		mesg, fds, *_ = recv_fds(self.broker, BROKER_MESG_SIZE, 2)
+		for fd in fds:
+			os.close(fd)
+		self.assertEqual((mesg, len(fds)), (BROKER_DONE, 2))
+
+	def test_reject_connection(self):
+		client, fd = self.connect()
+		send_fds(self.broker, [BROKER_REJT], [fd])
+		os.close(fd)
+		response, *_ = FrameReader(client, Response).read_frames()
+		self.assertEqual((response.resl, response.mesg), (Response.FAIL, b"TOO_MANY_CONNECTIONS"))
+
+if __name__ == "__main__":
+	unittest.main()
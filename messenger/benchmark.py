@@ -0,0 +1,258 @@
+import os
+import struct
+from time import perf_counter
+from select import select
+from socket import create_connection
+from multiprocessing import Event
+from multiprocessing import Process
+
+from messenger.secure import *
+from messenger.framing import FrameReader
+from messenger.protocol import Command
+from messenger.protocol import Response
+from messenger.protocol import PROTOCOLS
+from messenger.backend.server import Server
+from messenger.backend.async_server import AsyncServer
+
+ENGINES = {
+	"thread": Server,
+	"async": AsyncServer
+}
+
+stamp = struct.Struct("!d")
+
+def percentile(samples, fraction):
+	if not samples:
+		return None
+	return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+def read_proc_status(pid, field):
+	try:
+		with open("/proc/{0}/status".format(pid)) as status:
+			for line in status:
+				if line.startswith(field + ":"):
+					return int(line.split()[1]) * 1024
+	except OSError:
+		pass
+	return None
+
+def read_proc_cpu(pid):
+	try:
+		with open("/proc/{0}/stat".format(pid)) as stat:
+			fields = stat.read().rsplit(")", 1)[1].split()
+		return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+	except OSError:
+		return None
+
+class ServerProcess:
+	READY_TIMEOUT = 5
+
+	def __init__(self, engine, addr, port):
+		self._engine = ENGINES[engine]
+		self._addr = addr
+		self._port = port
+		self._ready = Event()
+		self._stop = Event()
+		self._process = None
+
+	@property
+	def pid(self):
+		return self._process.pid
+
+	def start(self):
+		self._process = Process(target = self._run)
+		self._process.start()
+		if not self._ready.wait(ServerProcess.READY_TIMEOUT):
+			self.stop()
+			raise RuntimeError("Server did not start listening.")
+
+	def usage(self):
+		return {
+			"cpu_seconds": read_proc_cpu(self.pid),
+			"rss_bytes": read_proc_status(self.pid, "VmRSS"),
+			"rss_peak_bytes": read_proc_status(self.pid, "VmHWM")
+		}
+
+	def stop(self):
+		self._stop.set()
+		self._process.join()
+
+	def _run(self):
+		server = self._engine()
+		server.run(self._addr, self._port)
+		self._ready.set()
+		self._stop.wait()
+		server.stop()
+
+class SimulatedClient:
+	def __init__(self, addr, port, version):
+		self._sock = create_connection((addr, port))
+		self._reader = FrameReader(self._sock, Response)
+		self._command_type = Command
+		self._version = version
+		self._aes = None
+		self._pending = []
+
+	@property
+	def sock(self):
+		return self._sock
+
+	@property
+	def aes(self):
+		return self._aes
+
+	def close(self):
+		self._sock.close()
+
+	def send(self, command):
+		sign = self._command_type.pack_sign(command)
+		self._sock.sendall(b"".join((sign, command.mesg)))
+
+	def receive(self):
+		responses = []
+		for response in self._reader.read_frames():
+			if response.iden == Command.VERS:
+				version = int(response.mesg)
+				self._command_type, self._reader.frame_type = PROTOCOLS[version]
+			responses.append(response)
+		return responses
+
+	def expect(self, iden):
+		while True:
+			for response in self._pending:
+				if response.iden == iden:
+					self._pending.remove(response)
+					return response
+			self._pending.extend(self.receive())
+
+	def handshake(self, rsa):
+		if self._version > 1:
+			self.send(Command(Command.VERS, str(self._version).encode()))
+		response = self.expect(Command.CONN)
+		if response.resl != Response.OKAY:
+			raise RuntimeError(response.mesg.decode())
+		if self._version > 1:
+			self.expect(Command.VERS)
+		self.send(Command(Command.AESK, rsa.export_pub_key()))
+		self._aes = Aes()
+		self._aes.import_key(rsa.decode(self.expect(Command.AESK).mesg))
+
+class LoadGenerator:
+	def __init__(self, addr, port, pairs, rate, duration,
+		size = 64, version = 1, echo_ratio = 0.1):
+		self._addr = addr
+		self._port = port
+		self._pairs = pairs
+		self._interval = 1 / rate
+		self._duration = duration
+		self._size = max(size, stamp.size)
+		self._version = version
+		self._echo_every = int(1 / echo_ratio) if echo_ratio else 0
+
+	def run(self):
+		rsa = Rsa()
+		clients = []
+		connect_began = perf_counter()
+		for _ in range(self._pairs):
+			pair = [SimulatedClient(self._addr, self._port, self._version)
+				for _ in range(2)]
+			for client in pair:
+				client.handshake(rsa)
+			clients.extend(pair)
+		connect_time = perf_counter() - connect_began
+
+		try:
+			result = self._drive(clients)
+		finally:
+			for client in clients:
+				client.close()
+		result["connect_seconds"] = connect_time
+		return result
+
+	def _drive(self, clients):
+		by_sock = {client.sock: client for client in clients}
+		padding = b"\x20" * (self._size - stamp.size)
+		send_latency, echo_latency = [], []
+		sent = received = 0
+
+		began = perf_counter()
+		deadline = began + self._duration
+		next_send = [began + self._interval * index / len(clients)
+			for index in range(len(clients))]
+		while True:
+			now = perf_counter()
+			if now >= deadline:
+				break
+			for index, client in enumerate(clients):
+				if next_send[index] > now:
+					continue
+				next_send[index] += self._interval
+				message = stamp.pack(perf_counter()) + padding
+				if self._echo_every and not sent % self._echo_every:
+					client.send(Command(Command.ECHO, message))
+				else:
+					client.send(Command(Command.SEND, client.aes.encode(message)))
+				sent += 1
+
+			timeout = max(0, min(min(next_send), deadline) - perf_counter())
+			readable, _, _ = select(list(by_sock), [], [], timeout)
+			for sock in readable:
+				client = by_sock[sock]
+				for response in client.receive():
+					if response.iden == Command.MESG:
+						message = client.aes.decode(response.mesg)
+						send_latency.append(perf_counter() - stamp.unpack_from(message)[0])
+						received += 1
+					elif response.iden == Command.ECHO:
+						echo_latency.append(perf_counter() - stamp.unpack_from(response.mesg)[0])
+						received += 1
+		elapsed = perf_counter() - began
+
+		return {
+			"sent": sent,
+			"received": received,
+			"seconds": elapsed,
+			"messages_per_second": received / elapsed,
+			"send_latency_ms": latency_summary(send_latency),
+			"echo_latency_ms": latency_summary(echo_latency)
+		}
+
+def latency_summary(samples):
+	samples = sorted(sample * 1000 for sample in samples)
+	return {
+		"count": len(samples),
+		"p50": percentile(samples, 0.5),
+		"p99": percentile(samples, 0.99),
+		"p999": percentile(samples, 0.999),
+		"max": samples[-1] if samples else None
+	}
+
+def run_benchmark(engine, addr, port, pairs, rate, duration,
+	size = 64, version = 1, echo_ratio = 0.1):
+	server = ServerProcess(engine, addr, port) if engine else None
+	if server:
+		server.start()
+	try:
+		generator = LoadGenerator(addr, port, pairs, rate, duration,
+			size, version, echo_ratio)
+		cpu_began = read_proc_cpu(server.pid) if server else None
+		result = generator.run()
+		if server:
+			result["server"] = server.usage()
+			if cpu_began is not None:
+				cpu = result["server"]["cpu_seconds"] - cpu_began
+				result["server"]["cpu_percent"] = 100 * cpu / result["seconds"]
+	finally:
+		if server:
+			server.stop()
+
+	result["config"] = {
+		"engine": engine,
+		"pairs": pairs,
+		"rate": rate,
+		"duration": duration,
+		"size": size,
+		"version": version,
+		"echo_ratio": echo_ratio
+	}
+	return result
\ No newline at end of file
@@ -0,0 +1,55 @@
+import zlib
+
+DICTIONARY = b" ".join((
+	b"file photo link call meeting tomorrow today tonight morning evening",
+	b"please sorry thank you thanks welcome great good nice cool sure fine",
+	b"would could should will can not don't didn't isn't it's i'm you're",
+	b"what when where which who why how about with from this that there",
+	b"see you later talk soon bye good night good morning how are you",
+	b"ok okay yes yeah no lol haha hi hey hello the and you to is"
+))
+
+class PayloadTooLarge(ValueError): pass
+
+class Deflate:
+	NAME = b"deflate"
+	THRESHOLD = 32
+	LEVEL = 6
+	MAX_SIZE = 0x10000
+	OVERHEAD = 1
+
+	RAW = b"\x00"
+	DEFLATED = b"\x01"
+
+	def __init__(self, dictionary = DICTIONARY, threshold = THRESHOLD, level = LEVEL):
+		self._dictionary = dictionary
+		self._threshold = threshold
+		self._level = level
+
+	def pack(self, buf):
+		if len(buf) >= self._threshold:
+			compressor = zlib.compressobj(self._level, zlib.DEFLATED,
+				-zlib.MAX_WBITS, zdict = self._dictionary)
+			packed = compressor.compress(buf) + compressor.flush()
+			if len(packed) < len(buf):
+				return Deflate.DEFLATED + packed
+		return Deflate.RAW + buf
+
+	def unpack(self, buf, max_size = MAX_SIZE):
+		flag, buf = bytes(buf[:1]), buf[1:]
+		if flag == Deflate.RAW:
+			return bytes(buf)
+		if flag != Deflate.DEFLATED:
+			raise ValueError("Unknown payload encoding.")
+		decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict = self._dictionary)
+		try:
+			message = decompressor.decompress(buf, max_size)
+		except zlib.error:
+			raise ValueError("Corrupted compressed payload.")
+		if len(message) == max_size and not decompressor.eof:
+			raise PayloadTooLarge("Decompressed payload is too large.")
+		if decompressor.unconsumed_tail or not decompressor.eof:
+			raise ValueError("Corrupted compressed payload.")
+		return message
+
+CODECS = {Deflate.NAME: Deflate}
@@ -0,0 +1,58 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from compression import Deflate
+from compression import PayloadTooLarge
+
+class DeflateTests(unittest.TestCase):
+	def setUp(self):
+		self.codec = Deflate(threshold = 16)
+
+	def test_short_messages_stay_raw(self):
+		packed = self.codec.pack(b"hi there")
+		self.assertEqual(packed, Deflate.RAW + b"hi there")
+		self.assertEqual(self.codec.unpack(packed), b"hi there")
+
+	def test_chat_text_shrinks(self):
+		message = b"hello, how are you? see you later at the meeting tomorrow"
+		packed = self.codec.pack(message)
+		self.assertEqual(packed[:1], Deflate.DEFLATED)
+		self.assertLess(len(packed), len(message) // 2)
+		self.assertEqual(self.codec.unpack(packed), message)
+
+	def test_incompressible_stays_raw(self):
+		message = bytes(range(256))
+		self.assertEqual(self.codec.pack(message), Deflate.RAW + message)
+
+	def test_block_padding_ignored(self):
+		message = b"thanks, good night and talk to you soon"
+		packed = self.codec.pack(message) + b"\x00" * 9
+		self.assertEqual(self.codec.unpack(packed), message)
+
+	def test_dictionary_must_match(self):
+		packed = self.codec.pack(b"good morning, how are you today?")
+		with self.assertRaises(ValueError):
+			Deflate(dictionary = b"unrelated").unpack(packed)
+
+	def test_corrupted(self):
+		with self.assertRaises(ValueError):
+			self.codec.unpack(b"\x07payload")
+		with self.assertRaises(ValueError):
+			self.codec.unpack(Deflate.DEFLATED + b"\xff\xff\xff")
+
+	def test_size_limit(self):
+		packed = self.codec.pack(b"a" * (Deflate.MAX_SIZE + 1))
+		with self.assertRaises(PayloadTooLarge):
+			self.codec.unpack(packed)
+
+	def test_custom_size_limit(self):
+		packed = self.codec.pack(b"a" * 100)
+		self.assertEqual(self.codec.unpack(packed, 100), b"a" * 100)
+		with self.assertRaises(PayloadTooLarge):
+			self.codec.unpack(packed, 99)
+		packed = self.codec.pack(b"a" * 100) + b"\x00" * 9
+		self.assertEqual(self.codec.unpack(packed, 100), b"a" * 100)
+
+if __name__ == "__main__":
+	unittest.main()
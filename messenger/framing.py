@@ -0,0 +1,97 @@
+class FrameReader:
+	BUFFER_SIZE = 0x10000
+
+	def __init__(self, sock, frame_type, buffer_size = BUFFER_SIZE):
+		self._sock = sock
+		self._frame_type = frame_type
+		self._buf = bytearray(buffer_size)
+		self._view = memoryview(self._buf)
+		self._head = 0
+		self._tail = 0
+		self._frame = None
+
+	@property
+	def frame_type(self):
+		return self._frame_type
+
+	@frame_type.setter
+	def frame_type(self, value):
+		self._frame_type = value
+
+	@property
+	def buffered(self):
+		return self._tail - self._head
+
+	@property
+	def free(self):
+		return len(self._buf) - self.buffered
+
+	def fill(self):
+		if self._tail == len(self._buf):
+			self._compact()
+		recv_len = self._sock.recv_into(self._view[self._tail:])
+		if not recv_len:
+			raise EOFError
+		self._tail += recv_len
+		return recv_len
+
+	def feed(self, data):
+		if len(data) > len(self._buf) - self._tail:
+			self._compact()
+		tail = self._tail + len(data)
+		if tail > len(self._buf):
+			self.reset()
+			message = "Frame does not fit in the read buffer."
+			raise ValueError(message)
+		self._view[self._tail:tail] = data
+		self._tail = tail
+
+	def frames(self):
+		while True:
+			frame = self._next_frame()
+			if not frame:
+				break
+			yield frame
+		self._compact()
+
+	def read_frames(self):
+		self.fill()
+		return self.frames()
+
+	def reset(self):
+		self._head = self._tail = 0
+		self._frame = None
+
+	def _next_frame(self):
+		sign_size = self._frame_type.SIGN_SIZE
+		if not self._frame:
+			if self.buffered < sign_size:
+				return None
+			try:
+				self._frame = self._frame_type.unpack_sign_from(self._view, self._head)
+			except ValueError:
+				self.reset()
+				raise
+
+		frame_len = sign_size + self._frame.mesg_len
+		if frame_len > len(self._buf):
+			self.reset()
+			message = "Frame does not fit in the read buffer."
+			raise ValueError(message)
+		if self.buffered < frame_len:
+			return None
+
+		frame, self._frame = self._frame, None
+		if frame.mesg_len:
+			mesg_head = self._head + sign_size
+			frame.mesg = bytes(self._view[mesg_head:mesg_head + frame.mesg_len])
+		self._head += frame_len
+		return frame
+
+	def _compact(self):
+		if self._head == self._tail:
+			self._head = self._tail = 0
+		elif self._head:
+			buffered = self.buffered
+			self._view[:buffered] = self._view[self._head:self._tail]
+			self._head, self._tail = 0, buffered
\ No newline at end of file
@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+
+import unittest
+from socket import socketpair
+
+from framing import FrameReader
+from protocol import Command
+from protocol import Response
+
+class FrameReaderTests(unittest.TestCase):
+	def setUp(self):
+		self.sock_r, self.sock_w = socketpair()
+
+	def tearDown(self):
+		self.sock_r.close()
+		self.sock_w.close()
+
+	def test_with_several_frames_per_recv(self):
+		reader = FrameReader(self.sock_r, Command)
+		self.sock_w.sendall(b"".join((
+			Command(Command.SEND, b"DEBUG").in_raw(),
+			Command(Command.TYBE).in_raw(),
+			Command(Command.ECHO, b"PING").in_raw()
+		)))
+		commands = list(reader.read_frames())
+		self.assertEqual([command.iden for command in commands], ["SEND", "TYBE", "ECHO"])
+		self.assertEqual([command.mesg for command in commands], [b"DEBUG", b"", b"PING"])
+
+	def test_with_partial_frame(self):
+		reader = FrameReader(self.sock_r, Response)
+		response_in_raw = Response(Command.MESG, mesg = b"DEBUG").in_raw()
+		self.sock_w.sendall(response_in_raw[:Response.SIGN_SIZE - 1])
+		self.assertEqual(list(reader.read_frames()), [])
+		self.sock_w.sendall(response_in_raw[Response.SIGN_SIZE - 1:-1])
+		self.assertEqual(list(reader.read_frames()), [])
+		self.sock_w.sendall(response_in_raw[-1:])
+		response, = reader.read_frames()
+		self.assertTrue(all((
+			response.iden == "MESG",
+			response.resl == "OKAY",
+			response.mesg == b"DEBUG"
+		)))
+
+	def test_with_buffer_wrap(self):
+		command_in_raw = Command(Command.SEND, b"A" * 10).in_raw()
+		reader = FrameReader(self.sock_r, Command, len(command_in_raw) + 6)
+		stream, commands = command_in_raw * 8, []
+		for head in range(0, len(stream), 7):
+			self.sock_w.sendall(stream[head:head + 7])
+			commands.extend(reader.read_frames())
+		self.assertEqual([command.mesg for command in commands], [b"A" * 10] * 8)
+
+	def test_with_overlapping_compaction(self):
+		command_in_raw = Command(Command.SEND, b"0123456789").in_raw()
+		reader = FrameReader(self.sock_r, Command, len(command_in_raw) + 4)
+		self.sock_w.sendall(Command(Command.TYBE).in_raw() + command_in_raw[:-5])
+		command, = reader.read_frames()
+		self.assertEqual(reader.buffered, len(command_in_raw) - 5)
+		self.sock_w.sendall(command_in_raw[-5:])
+		command, = reader.read_frames()
+		self.assertEqual(command.mesg, b"0123456789")
+
+	def test_with_frame_larger_than_buffer(self):
+		command_in_raw = Command(Command.SEND, b"A" * 32).in_raw()
+		reader = FrameReader(self.sock_r, Command, 16)
+		self.sock_w.sendall(command_in_raw)
+		self.assertRaises(ValueError, list, reader.read_frames())
+		self.assertEqual(reader.buffered, 0)
+
+	def test_with_wrong_sign(self):
+		reader = FrameReader(self.sock_r, Command)
+		self.sock_w.sendall(b"G" * Command.SIGN_SIZE)
+		self.assertRaises(ValueError, list, reader.read_frames())
+		self.assertEqual(reader.buffered, 0)
+
+	def test_feed(self):
+		command_in_raw = Command(Command.SEND, b"A" * 10).in_raw()
+		reader = FrameReader(None, Command, len(command_in_raw) + 6)
+		reader.feed(command_in_raw[:-3])
+		self.assertEqual(list(reader.frames()), [])
+		self.assertEqual(reader.free, 9)
+		reader.feed(command_in_raw[-3:] + command_in_raw[:6])
+		command, = reader.frames()
+		self.assertEqual(command.mesg, b"A" * 10)
+		reader.feed(command_in_raw[6:])
+		command, = reader.frames()
+		self.assertEqual(reader.buffered, 0)
+		self.assertRaises(ValueError, reader.feed, b"A" * (len(command_in_raw) + 7))
+
+	def test_with_closed_socket(self):
+		reader = FrameReader(self.sock_r, Command)
+		self.sock_w.close()
+		self.assertRaises(EOFError, reader.read_frames)
+
+if __name__ == "__main__":
+	unittest.main()
\ No newline at end of file
@@ -1,29 +1,74 @@
-from time import time
+import os
+from time import monotonic
 from socket import socket
 from select import select
+from threading import Lock
 from threading import Thread
 
 from messenger.secure import *
+from messenger.framing import FrameReader
+from messenger.compression import Deflate
+from messenger.transfer import FileSender
+from messenger.transfer import FileReceiver
+from messenger.transfer import unique_path
 from messenger.protocol import Command
 from messenger.protocol import Response
+from messenger.protocol import PROTOCOLS
+from messenger.protocol import Registry
+from messenger.protocol import PROTOCOL_VERSION
+from messenger.frontend.scheduler import Scheduler
 from messenger.frontend.exceptions import *
 
 class Client:
 	DEFAULT_PORT = 3848
 	DEFAULT_ADDRESS = "127.0.0.1"
-	ACCEPT_TIMEOUT = 2
+	TYPING_IDLE = 1
+	TYPING_REFRESH = 2
+	TYPING_TIMER = "typing"
+	HEARTBEAT_TIMER = "heartbeat"
+	DOWNLOADS_PATH = os.path.expanduser("~/Downloads")
 
-	def __init__(self, controller):
+	def __init__(self, controller, end_to_end = False, version = PROTOCOL_VERSION,
+		room = None, identity_path = None, authenticated = True, compression = True):
+		if end_to_end and room:
+			raise InvalidClientConfiguration
 		self._sock = None
+		self._room = room
+		self._joined = False
+		self._reader = None
+		self._version = version
+		self._deferred = None
+		self._send_lock = Lock()
+		self._command_type = Command
 		self._session = None
 		self._session_running = False
+		self._scheduler = Scheduler()
 		self._controller = controller
 
 		self._message_writing = False
-		self._message_writing_time = self._epoch_time()
+		self._message_writing_sent = monotonic()
 
-		self._rsa = Rsa()
-		self._aes = Aes()
+		self._rsa = None
+		self._identity_path = identity_path
+		self._aes = AesCtr() if authenticated else Aes()
+		self._aes_command = Command.AESC if authenticated else Command.AESK
+		self._compression = compression
+		self._codec = None
+		self._heartbeat_timeout = None
+		self._ticket = None
+		self._resuming = False
+		self._secured = False
+		self._connected = False
+		self._peer_aes = None
+		self._end_to_end = end_to_end
+		self._file_receiver = None
+		self._history_page = []
+		self._rejected = 0
+		self._responses = self._register_responses()
+
+	@property
+	def rejected(self):
+		return self._rejected
 
 	def connect(self, addr = DEFAULT_ADDRESS, port = DEFAULT_PORT):
 		if self._session_running:
@@ -31,8 +76,19 @@ class Client:
 		try:
 			self._sock = socket()
 			self._sock.connect((addr, port))
+			self._reader = FrameReader(self._sock, Response)
 		except ConnectionRefusedError:
 			raise InvalidServerAddress
+		first_flight = [Command(Command.JOIN, self._room.encode())] if self._room else []
+		self._negotiate_version(*first_flight)
+		self._secured = self._connected = self._joined = False
+		self._codec = self._heartbeat_timeout = None
+		self._resuming = self._ticket is not None
+		if self._resuming:
+			command = Command(Command.RSUM, self._ticket)
+			self._send_command(command)
+		if not self._rsa and not self._identity_path:
+			rsa_pool.start()
 
 	def disconnect(self):
 		self._sock.close()
@@ -40,6 +96,8 @@ class Client:
 	def begin_session(self):
 		if self._session_running:
 			raise SessionRunning
+		self._scheduler.close()
+		self._scheduler = Scheduler()
 		self._session_running = True
 		self._session = Thread(target = self._session_loop)
 		self._session.start()
@@ -48,87 +106,185 @@ class Client:
 		if not self._session_running:
 			raise SessionAlreadyStopped
 		self._session_running = False
+		self._scheduler.wake()
 		self._session.join()
 
 	def _session_loop(self):
 		try:
-			while True:
-				if select_recv(self._sock, timeout = Client.ACCEPT_TIMEOUT):
-					self._process_response()
-				self._send_message_writing_end()
+			while self._session_running:
+				timeout = self._scheduler.timeout(monotonic())
+				readable = select_recv(self._sock, self._scheduler, timeout = timeout)
+				if self._scheduler in readable:
+					self._scheduler.drain()
+				if self._sock in readable:
+					self._process_responses()
+					self._watch_server()
+				self._scheduler.run_due(monotonic())
 		except SuspendConnection:
 			self._session_running = False
-			self.disconnect()
+		self._scheduler.close()
+		self._message_writing = False
+		self._close_file_receiver()
+		self.disconnect()
+
+	def _watch_server(self):
+		if self._heartbeat_timeout:
+			self._scheduler.call_at(Client.HEARTBEAT_TIMER,
+				monotonic() + self._heartbeat_timeout, self._server_silent)
 
-	def _epoch_time(self):
-		return int(time())
-			
-	def _recv(self, recv_len):
+	def _server_silent(self):
+		raise SuspendConnection
+
+	def _recv(self):
 		try:
-			buf = self._sock.recv(recv_len)
-			if buf:
-				return buf
-			raise ServerDisconnected
-		except BrokenPipeError:
+			return self._reader.read_frames()
+		except (EOFError, ConnectionError):
 			raise ServerDisconnected
 
-	def _send(self, buf):
+	def _send(self, *bufs):
 		try:
-			return self._sock.send(buf)
-		except BrokenPipeError:
+			return self._sock.sendmsg(bufs)
+		except ConnectionError:
 			raise ServerDisconnected
 
 	def _send_command(self, command):
-		self._send(command.in_raw())
+		with self._send_lock:
+			if self._deferred is not None:
+				self._deferred.append(command)
+				return
+			sign = self._command_type.pack_sign(command)
+			if command.mesg:
+				self._send(sign, command.mesg)
+			else:
+				self._send(sign)
+
+	def _negotiate_version(self, *first_flight):
+		self._command_type = Command
+		self._reader.frame_type = Response
+		self._deferred = None
+		for command in first_flight:
+			self._send_command(command)
+		if self._version > 1:
+			command = Command(Command.VERS, str(self._version).encode())
+			self._send_command(command)
+			self._deferred = []
+
+	def _switch_version(self, version):
+		with self._send_lock:
+			self._command_type, self._reader.frame_type = PROTOCOLS[version]
+			deferred, self._deferred = self._deferred, None
+		if version > 1 and self._compression:
+			command = Command(Command.COMP, Deflate.NAME)
+			self._send_command(command)
+		for command in deferred:
+			self._send_command(command)
 
-	def _receive_response(self):
-		sign, response = self._recv(Response.SIGN_SIZE), None
+	def _receive_responses(self):
+		frames = self._recv()
 		try:
-			response = Response.unpack_sign(sign)
-			if response.mesg_len:
-				response.mesg = self._recv(response.mesg_len)
+			yield from frames
 		except ValueError:
-			response = Response(Command.UNKN, Response.FAIL)
-		
-		return response
+			self._rejected += 1
+			yield Response(Command.UNKN, Response.FAIL)
 
-	def _process_response(self):
+	def _process_responses(self):
 		try:
-			response = self._receive_response()
+			for response in self._receive_responses():
+				self._process_response(response)
 		except ServerDisconnected:
 			raise SuspendConnection
-		response_processor = {
-			Command.CONN: self._process_conn_response,
-			Command.DSCN: self._process_dscn_response,
-			Command.SEND: self._ignore_response,
-			Command.MESG: self._process_mesg_response,
-			Command.UNKN: self._process_unkn_response,
-			Command.ECHO: self._ignore_response,
-			Command.TYBE: self._process_tybe_response,
-			Command.TYEN: self._process_tyen_response,
-			Command.AESK: self._process_aesk_response
-		}.get(response.iden, self._process_unkn_response)
-		response_processor(response)
+
+	def _register_responses(self):
+		responses = Registry(self._process_unkn_response)
+		responses.register(Command.CONN, self._process_conn_response)
+		responses.register(Command.DSCN, self._process_dscn_response)
+		responses.register(Command.SEND, self._process_send_response)
+		responses.register(Command.MESG, self._process_mesg_response)
+		responses.register(Command.UNKN, self._process_unkn_response)
+		responses.register(Command.ECHO, self._ignore_response)
+		responses.register(Command.TYBE, self._process_tybe_response)
+		responses.register(Command.TYEN, self._process_tyen_response)
+		responses.register(Command.AESK, self._process_aesk_response)
+		responses.register(Command.AESC, self._process_aesk_response)
+		responses.register(Command.PUBK, self._process_pubk_response)
+		responses.register(Command.SKEY, self._process_skey_response)
+		responses.register(Command.RELY, self._process_rely_response)
+		responses.register(Command.VERS, self._process_vers_response)
+		responses.register(Command.FILE, self._process_file_response)
+		responses.register(Command.CHNK, self._process_chnk_response)
+		responses.register(Command.FEND, self._process_fend_response)
+		responses.register(Command.JOIN, self._process_join_response)
+		responses.register(Command.HIST, self._process_hist_response)
+		responses.register(Command.RSUM, self._process_rsum_response)
+		responses.register(Command.COMP, self._process_comp_response)
+		responses.register(Command.PING, self._process_ping_response)
+		responses.register(Command.PONG, self._ignore_response)
+		responses.compile()
+		return responses
+
+	def _process_response(self, response):
+		try:
+			self._responses.lookup(response.iden)(response)
+		except ValueError:
+			self._rejected += 1
+
+	def _load_rsa(self):
+		if not self._rsa:
+			if self._identity_path:
+				self._rsa = Rsa.load_or_create(self._identity_path)
+			else:
+				self._rsa = rsa_pool.acquire()
+		return self._rsa
 
 	def _process_conn_response(self, response):
 		self._controller.process_conn_response(response)
-		if response.resl == Response.OKAY:
-			message = self._rsa.export_pub_key()
-			command = Command(Command.AESK, message)
-			self._send_command(command)
-		else:
+		if response.resl != Response.OKAY:
 			raise SuspendConnection
+		self._connected = True
+		if not self._secured and not self._resuming:
+			self._exchange_keys()
+		if self._end_to_end:
+			command = Command(Command.PUBK, self._load_rsa().export_pub_key())
+			self._send_command(command)
+
+	def _exchange_keys(self):
+		command = Command(self._aes_command, self._load_rsa().export_pub_key())
+		self._send_command(command)
+
+	def _secure_session(self):
+		self._secured = True
+		if self._ticket is None:
+			command = Command(Command.RSUM)
+			self._send_command(command)
+		if self._joined:
+			self.request_history()
 
 	def _process_dscn_response(self, response):
 		self._controller.process_dscn_response(response)
 		raise SuspendConnection
 
+	def _process_send_response(self, response):
+		offset = None
+		if response.resl == Response.OKAY and response.mesg:
+			offset = int(response.mesg)
+		self._controller.process_send_response(response, offset)
+
 	def _process_mesg_response(self, response):
-		response.mesg = self._aes.decode(response.mesg)
-		self._controller.process_mesg_response(response)
+		response.mesg, offset = self._aes.decode(response.mesg), None
+		if self._codec:
+			response.mesg = self._codec.unpack(response.mesg)
+		if self._joined:
+			offset, _, response.mesg = response.mesg.partition(b":")
+			offset = int(offset) if offset else None
+		self._controller.process_mesg_response(response, offset)
+
+	def _process_join_response(self, response):
+		self._joined = response.resl == Response.OKAY
 
 	def _process_unkn_response(self, response):
-		raise SuspendConnection
+		if self._deferred is None:
+			raise SuspendConnection
+		self._switch_version(1)
 
 	def _process_tybe_response(self, response):
 		self._controller.process_tybe_response(response)
@@ -140,33 +296,179 @@ class Client:
 		if response.resl == Response.OKAY:
 			message = self._rsa.decode(response.mesg)
 			self._aes.import_key(message)
+			self._secure_session()
+
+	def _process_rsum_response(self, response):
+		resuming, self._resuming = self._resuming, False
+		if response.resl != Response.OKAY:
+			self._ticket = None
+			if resuming and self._connected:
+				self._exchange_keys()
+			return
+		self._ticket = bytes(response.mesg)
+		if resuming:
+			self._secure_session()
+
+	def _process_ping_response(self, response):
+		try:
+			self._heartbeat_timeout = float(response.mesg)
+		except ValueError:
+			pass
+		command = Command(Command.PONG, response.mesg)
+		self._send_command(command)
+
+	def _process_comp_response(self, response):
+		if response.resl == Response.OKAY and response.mesg == Deflate.NAME:
+			self._codec = Deflate()
+
+	def _process_pubk_response(self, response):
+		if self._rsa.export_pub_key() < response.mesg:
+			self._peer_aes = Aes()
+			message = Rsa.quick_encode(response.mesg, self._peer_aes.export_key())
+			command = Command(Command.SKEY, Rsa.fingerprint(response.mesg) + message)
+			self._send_command(command)
+
+	def _process_skey_response(self, response):
+		fingerprint = response.mesg[:Rsa.FINGERPRINT_SIZE]
+		if fingerprint != Rsa.fingerprint(self._rsa.export_pub_key()):
+			return
+		peer_aes = Aes()
+		peer_aes.import_key(self._rsa.decode(response.mesg[Rsa.FINGERPRINT_SIZE:]))
+		self._peer_aes = peer_aes
+
+	def _process_rely_response(self, response):
+		if response.resl != Response.OKAY or not response.mesg:
+			self._controller.process_send_response(response, None)
+			return
+		if not self._peer_aes:
+			raise ValueError("End-to-end key is not negotiated.")
+		response.mesg = self._peer_aes.decode(response.mesg)
+		self._controller.process_mesg_response(response)
+
+	def _process_vers_response(self, response):
+		if self._deferred is None:
+			return
+		try:
+			version = int(response.mesg)
+		except ValueError:
+			version = 1
+		if response.resl != Response.OKAY or version not in PROTOCOLS:
+			version = 1
+		self._switch_version(version)
+
+	def _process_file_response(self, response):
+		self._close_file_receiver()
+		if response.resl != Response.OKAY:
+			self._controller.process_mesg_response(response)
+			return
+		message = self._aes.decode(response.mesg).rstrip(b"\x00").decode()
+		size, name = message.split(":", 1)
+		size, name = int(size), os.path.basename(name)
+		if size < 0 or name in ("", os.curdir, os.pardir):
+			self._reject_file(b"INVALID_FILE_NAME")
+			return
+		os.makedirs(Client.DOWNLOADS_PATH, exist_ok = True)
+		try:
+			path = unique_path(Client.DOWNLOADS_PATH, name)
+			self._file_receiver = FileReceiver(path, size)
+		except OSError:
+			self._reject_file(b"FILE_NOT_WRITABLE")
+
+	def _process_chnk_response(self, response):
+		if self._file_receiver and response.resl == Response.OKAY:
+			self._file_receiver.write(self._aes.decode(response.mesg))
+
+	def _process_fend_response(self, response):
+		self._close_file_receiver()
+
+	def _reject_file(self, message):
+		response = Response(Command.FILE, Response.FAIL, message)
+		self._controller.process_mesg_response(response)
+
+	def _close_file_receiver(self):
+		if self._file_receiver:
+			complete = self._file_receiver.close()
+			self._controller.process_fend_response(self._file_receiver.path, complete)
+			self._file_receiver = None
+
+	def _process_hist_response(self, response):
+		if response.resl != Response.OKAY:
+			return
+		if not response.mesg:
+			page, self._history_page = self._history_page, []
+			self._controller.process_hist_response(page)
+			return
+		message = self._aes.decode(response.mesg).rstrip(b"\x00")
+		offset, moment, message = message.split(b":", 2)
+		self._history_page.append((int(offset), float(moment),
+			message.decode(errors = "replace")))
 
 	def _ignore_response(self, response):
 		pass
 
 	def _send_message_writing_end(self):
-		delta = self._epoch_time() - self._message_writing_time
-		if delta > 1 and self._message_writing:
+		if self._message_writing:
 			self._message_writing = False
 			command = Command(Command.TYEN)
-			self._send_command(command)
+			try:
+				self._send_command(command)
+			except ServerDisconnected:
+				raise SuspendConnection
 
 	def echo(self, message):
 		command = Command(Command.ECHO, message.encode())
 		self._send_command(command)
 
 	def send_message(self, message):
-		message = self._aes.encode(message.encode())
-		command = Command(Command.SEND, message)
+		if not self._secured:
+			raise SessionNotSecured
+		if self._peer_aes:
+			message = self._peer_aes.encode(message.encode())
+			command = Command(Command.RELY, message)
+		else:
+			message = message.encode()
+			if self._codec:
+				message = self._codec.pack(message)
+			message = self._aes.encode(message)
+			command = Command(Command.SEND, message)
+		if len(message) > Command.MESG_SIZE:
+			raise MessageTooLong
 		self._send_command(command)
 
+	def send_file(self, path):
+		if not self._secured:
+			raise SessionNotSecured
+		sender = Thread(target = self._send_file, args = (path,))
+		sender.start()
+
+	def _send_file(self, path):
+		file_sender = FileSender(path, self._aes)
+		message = "{0}:{1}".format(file_sender.size, file_sender.name)
+		try:
+			command = Command(Command.FILE, self._aes.encode(message.encode()))
+			self._send_command(command)
+			for chunk in file_sender.chunks():
+				command = Command(Command.CHNK, chunk)
+				self._send_command(command)
+			command = Command(Command.FEND)
+			self._send_command(command)
+		except ServerDisconnected:
+			pass
+
 	def send_message_writing_begin(self):
-		delta = self._epoch_time() - self._message_writing_time
-		if delta > 2:
+		now = monotonic()
+		if not self._message_writing or now - self._message_writing_sent >= Client.TYPING_REFRESH:
 			self._message_writing = True
+			self._message_writing_sent = now
 			command = Command(Command.TYBE)
 			self._send_command(command)
-		self._message_writing_time = self._epoch_time()
+		self._scheduler.call_at(Client.TYPING_TIMER, now + Client.TYPING_IDLE,
+			self._send_message_writing_end)
+
+	def request_history(self, before = None):
+		message = str(before).encode() if before is not None else b""
+		command = Command(Command.HIST, message)
+		self._send_command(command)
 
 	def suspend_session(self):
 		command = Command(Command.DSCN)
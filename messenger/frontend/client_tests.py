@@ -0,0 +1,241 @@
+#! /usr/bin/env python3
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from socket import socket
+from socket import socketpair
+
+from Crypto.PublicKey import RSA
+
+from client import Client
+from messenger.secure import Rsa
+from messenger.framing import FrameReader
+from messenger.protocol import Command
+from messenger.protocol import Response
+from messenger.protocol import CommandV2
+from messenger.frontend.exceptions import *
+
+class FakeController:
+	def __init__(self):
+		self.messages = []
+		self.offsets = []
+		self.failures = []
+		self.files = []
+		self.sent = []
+		self.pages = []
+
+	def process_mesg_response(self, response, offset = None):
+		if response.resl == Response.OKAY:
+			self.messages.append(response.mesg.rstrip(b"\x00"))
+			self.offsets.append(offset)
+		else:
+			self.failures.append(response.mesg)
+
+	def process_send_response(self, response, offset):
+		self.sent.append((response.resl, offset))
+
+	def process_hist_response(self, page):
+		self.pages.append(page)
+
+	def process_fend_response(self, path, complete):
+		self.files.append((os.path.basename(path), complete))
+
+def make_client():
+	client = Client(FakeController(), end_to_end = True)
+	client._rsa = Rsa(RSA.generate(1024))
+	client.sent = []
+	client._send_command = client.sent.append
+	return client
+
+def relay(command):
+	return Response(command.iden, mesg = command.mesg)
+
+class EndToEndTests(unittest.TestCase):
+	def setUp(self):
+		self.alice, self.bob = make_client(), make_client()
+
+	def exchange_keys(self):
+		self.alice._secured = self.bob._secured = True
+		alice_pubk = Command(Command.PUBK, self.alice._rsa.export_pub_key())
+		bob_pubk = Command(Command.PUBK, self.bob._rsa.export_pub_key())
+		self.alice._process_response(relay(bob_pubk))
+		self.bob._process_response(relay(alice_pubk))
+		skeys = [(client, command) for client in (self.alice, self.bob)
+			for command in client.sent if command.iden == Command.SKEY]
+		self.assertEqual(len(skeys), 1)
+		sender, skey = skeys[0]
+		receiver = self.bob if sender is self.alice else self.alice
+		receiver._process_response(relay(skey))
+
+	def test_one_side_picks_the_key(self):
+		self.exchange_keys()
+		self.assertIsNotNone(self.alice._peer_aes)
+		self.assertEqual(self.alice._peer_aes.export_key(), self.bob._peer_aes.export_key())
+
+	def test_skey_for_someone_else_ignored(self):
+		carol = make_client()
+		sender, receiver = sorted((self.alice, carol), key = lambda client: client._rsa.export_pub_key())
+		sender._process_response(relay(Command(Command.PUBK, receiver._rsa.export_pub_key())))
+		skey, = sender.sent
+		self.bob._process_response(relay(skey))
+		self.assertIsNone(self.bob._peer_aes)
+		receiver._process_response(relay(skey))
+		self.assertEqual(receiver._peer_aes.export_key(), sender._peer_aes.export_key())
+
+	def test_end_to_end_refused_in_rooms(self):
+		self.assertRaises(InvalidClientConfiguration,
+			Client, FakeController(), end_to_end = True, room = "general")
+
+	def test_rely_round_trip(self):
+		self.exchange_keys()
+		self.alice.send_message("hello")
+		command, = self.alice.sent[-1:]
+		self.assertEqual(command.iden, Command.RELY)
+		self.assertNotIn(b"hello", command.mesg)
+		self.bob._process_response(relay(command))
+		self.assertEqual(self.bob._controller.messages, [b"hello"])
+
+	def test_rely_ack_confirms_send(self):
+		self.bob._process_response(Response(Command.RELY))
+		self.assertEqual(self.bob._controller.messages, [])
+		self.assertEqual(self.bob._controller.sent, [(Response.OKAY, None)])
+
+	def test_rely_before_skey_dropped(self):
+		self.bob._process_response(Response(Command.RELY, mesg = b"\x00" * 16))
+		self.assertEqual(self.bob._controller.messages, [])
+		self.assertEqual(self.bob.rejected, 1)
+
+	def test_message_too_long(self):
+		self.exchange_keys()
+		sent = len(self.alice.sent)
+		self.assertRaises(MessageTooLong, self.alice.send_message, "A" * Command.MESG_SIZE)
+		self.assertEqual(len(self.alice.sent), sent)
+
+	def test_send_before_secured(self):
+		self.assertRaises(SessionNotSecured, self.alice.send_message, "hello")
+		self.assertRaises(SessionNotSecured, self.alice.send_file, "file")
+		self.assertEqual(self.alice.sent, [])
+
+	def test_rely_failure_reported(self):
+		self.bob._process_response(Response(Command.RELY, Response.FAIL, b"NO_COMPANION"))
+		self.assertEqual(self.bob._controller.sent, [(Response.FAIL, None)])
+
+class RoomTests(unittest.TestCase):
+	def setUp(self):
+		self.client = make_client()
+		self.client._room = "general"
+		self.client._process_response(Response(Command.JOIN))
+
+	def test_join_failed(self):
+		client = make_client()
+		client._room = "general"
+		client._process_response(Response(Command.JOIN, Response.FAIL, b"ROOMS_NOT_SUPPORTED"))
+		response = Response(Command.MESG, mesg = client._aes.encode(b"12:hello"))
+		client._process_response(response)
+		self.assertEqual(client._controller.messages, [b"12:hello"])
+		self.assertEqual(client.rejected, 0)
+
+	def test_message_offsets(self):
+		for message in (b"12:hello", b":no history"):
+			response = Response(Command.MESG, mesg = self.client._aes.encode(message))
+			self.client._process_response(response)
+		self.assertEqual(self.client._controller.messages, [b"hello", b"no history"])
+		self.assertEqual(self.client._controller.offsets, [12, None])
+
+	def test_send_ack_offset(self):
+		self.client._process_response(Response(Command.SEND, mesg = b"12"))
+		self.client._process_response(Response(Command.SEND))
+		self.assertEqual(self.client._controller.sent, [(Response.OKAY, 12), (Response.OKAY, None)])
+
+	def test_send_failure_has_no_offset(self):
+		self.client._process_response(Response(Command.SEND, Response.FAIL, b"MESSAGE_TOO_LARGE"))
+		self.assertEqual(self.client._controller.sent, [(Response.FAIL, None)])
+
+	def test_history_page_offsets(self):
+		for message in (b"3:1.5:first", b"4:2.5:second"):
+			response = Response(Command.HIST, mesg = self.client._aes.encode(message))
+			self.client._process_response(response)
+		self.client._process_response(Response(Command.HIST))
+		self.assertEqual(self.client._controller.pages, [[(3, 1.5, "first"), (4, 2.5, "second")]])
+
+class FileReceiveTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = TemporaryDirectory()
+		Client.DOWNLOADS_PATH, self.downloads = self.directory.name, Client.DOWNLOADS_PATH
+		self.client = make_client()
+
+	def tearDown(self):
+		Client.DOWNLOADS_PATH = self.downloads
+		self.directory.cleanup()
+
+	def receive_file(self, name, data):
+		header = "{0}:{1}".format(len(data), name).encode()
+		for iden, mesg in ((Command.FILE, header), (Command.CHNK, data)):
+			self.client._process_response(Response(iden, mesg = self.client._aes.encode(mesg)))
+		self.client._process_response(Response(Command.FEND))
+
+	def test_invalid_names_rejected(self):
+		for name in ("", "..", "dir/..", "dir/"):
+			self.receive_file(name, b"data")
+		self.assertEqual(self.client._controller.failures, [b"INVALID_FILE_NAME"] * 4)
+		self.assertEqual(os.listdir(self.directory.name), [])
+
+	def test_existing_file_kept(self):
+		self.receive_file("../notes.txt", b"first")
+		self.receive_file("notes.txt", b"second")
+		self.assertEqual(self.client._controller.files,
+			[("notes.txt", True), ("notes (1).txt", True)])
+		with open(os.path.join(self.directory.name, "notes.txt"), "rb") as file:
+			self.assertEqual(file.read(), b"first")
+
+	def test_new_file_closes_previous(self):
+		header = self.client._aes.encode(b"8:first")
+		self.client._process_response(Response(Command.FILE, mesg = header))
+		self.receive_file("second", b"data")
+		self.assertEqual(self.client._controller.files, [("first", False), ("second", True)])
+
+class NegotiationTests(unittest.TestCase):
+	def setUp(self):
+		self.listener = socket()
+		self.listener.bind(("localhost", 0))
+		self.listener.listen()
+		self.client = Client(FakeController(), authenticated = False)
+		self.client._rsa = Rsa(RSA.generate(1024))
+		self.client.connect(port = self.listener.getsockname()[1])
+		self.server_sock, _ = self.listener.accept()
+		self.server_sock.settimeout(5)
+
+	def tearDown(self):
+		self.client.disconnect()
+		self.server_sock.close()
+		self.listener.close()
+
+	def receive(self, frame_type):
+		return [command.iden for command in FrameReader(self.server_sock, frame_type).read_frames()]
+
+	def test_comp_waits_for_version(self):
+		self.assertEqual(self.receive(Command), [Command.VERS])
+		self.client._process_response(Response(Command.VERS, mesg = b"2"))
+		self.assertEqual(self.receive(CommandV2), [Command.COMP])
+
+	def test_no_comp_for_baseline_server(self):
+		self.assertEqual(self.receive(Command), [Command.VERS])
+		self.client._process_response(Response(Command.UNKN, Response.FAIL))
+		self.client.echo("ping")
+		self.assertEqual(self.receive(Command), [Command.ECHO])
+
+class SessionTests(unittest.TestCase):
+	def test_scheduler_closed_on_disconnect(self):
+		client = Client(FakeController())
+		client._sock, server_sock = socketpair()
+		client._reader = FrameReader(client._sock, Response)
+		client.begin_session()
+		scheduler = client._scheduler
+		server_sock.close()
+		client._session.join(5)
+		self.assertFalse(client._session.is_alive())
+		self.assertEqual(scheduler.fileno(), -1)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -2,6 +2,9 @@ class SuspendConnection(Exception): pass
 class ClientAlreadyConnected(Exception): pass
 class ClientAlreadyDisconnected(Exception): pass
 class InvalidServerAddress(Exception): pass
+class InvalidClientConfiguration(Exception): pass
+class MessageTooLong(Exception): pass
+class SessionNotSecured(Exception): pass
 class ServerDisconnected(Exception): pass
 class SessionRunning(Exception): pass
 class SessionAlreadyStopped(Exception): pass
\ No newline at end of file
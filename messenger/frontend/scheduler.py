@@ -0,0 +1,81 @@
+from heapq import heappop
+from heapq import heappush
+from itertools import count
+from socket import socketpair
+from threading import Lock
+
+class Scheduler:
+	def __init__(self):
+		self._heap = []
+		self._timers = {}
+		self._lock = Lock()
+		self._sequence = count()
+		self._wakeup_r, self._wakeup_w = socketpair()
+		self._wakeup_r.setblocking(False)
+		self._wakeup_w.setblocking(False)
+
+	def __len__(self):
+		return len(self._timers)
+
+	def __contains__(self, key):
+		return key in self._timers
+
+	def fileno(self):
+		return self._wakeup_r.fileno()
+
+	def call_at(self, key, deadline, callback):
+		with self._lock:
+			timer = self._timers.get(key)
+			self._timers[key] = (deadline, callback)
+			if timer and timer[0] <= deadline:
+				return
+			earliest = not self._heap or deadline < self._heap[0][0]
+			heappush(self._heap, (deadline, next(self._sequence), key))
+		if earliest:
+			self.wake()
+
+	def cancel(self, key):
+		with self._lock:
+			self._timers.pop(key, None)
+
+	def timeout(self, now):
+		with self._lock:
+			if not self._heap:
+				return None
+			return max(self._heap[0][0] - now, 0)
+
+	def run_due(self, now):
+		for callback in self._pop_due(now):
+			callback()
+
+	def _pop_due(self, now):
+		due = []
+		with self._lock:
+			while self._heap and self._heap[0][0] <= now:
+				deadline, _, key = heappop(self._heap)
+				timer = self._timers.get(key)
+				if not timer:
+					continue
+				if timer[0] > deadline:
+					heappush(self._heap, (timer[0], next(self._sequence), key))
+					continue
+				del self._timers[key]
+				due.append(timer[1])
+		return due
+
+	def wake(self):
+		try:
+			self._wakeup_w.send(b"\x00")
+		except OSError:
+			pass
+
+	def drain(self):
+		try:
+			while self._wakeup_r.recv(0x100):
+				pass
+		except BlockingIOError:
+			pass
+
+	def close(self):
+		self._wakeup_r.close()
+		self._wakeup_w.close()
@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+
+import unittest
+from select import select
+
+from scheduler import Scheduler
+
+class SchedulerTests(unittest.TestCase):
+	def setUp(self):
+		self.scheduler = Scheduler()
+		self.fired = []
+
+	def tearDown(self):
+		self.scheduler.close()
+
+	def callback(self, name):
+		return lambda: self.fired.append(name)
+
+	def test_fire_in_order(self):
+		self.scheduler.call_at("b", 2, self.callback("b"))
+		self.scheduler.call_at("a", 1, self.callback("a"))
+		self.assertEqual(self.scheduler.timeout(0), 1)
+		self.scheduler.run_due(0.5)
+		self.assertEqual(self.fired, [])
+		self.scheduler.run_due(2)
+		self.assertEqual(self.fired, ["a", "b"])
+		self.assertIsNone(self.scheduler.timeout(2))
+
+	def test_postpone(self):
+		self.scheduler.call_at("a", 1, self.callback("a"))
+		self.scheduler.call_at("a", 3, self.callback("a"))
+		self.scheduler.run_due(1)
+		self.assertEqual(self.fired, [])
+		self.assertEqual(self.scheduler.timeout(1), 2)
+		self.scheduler.run_due(3)
+		self.assertEqual(self.fired, ["a"])
+
+	def test_advance(self):
+		self.scheduler.call_at("a", 3, self.callback("a"))
+		self.scheduler.call_at("a", 1, self.callback("a"))
+		self.scheduler.run_due(1)
+		self.scheduler.run_due(3)
+		self.assertEqual(self.fired, ["a"])
+
+	def test_cancel(self):
+		self.scheduler.call_at("a", 1, self.callback("a"))
+		self.scheduler.cancel("a")
+		self.scheduler.run_due(1)
+		self.assertEqual(self.fired, [])
+		self.assertNotIn("a", self.scheduler)
+
+	def test_wake_on_earlier_deadline(self):
+		self.scheduler.call_at("a", 1, self.callback("a"))
+		self.scheduler.drain()
+		self.scheduler.call_at("a", 2, self.callback("a"))
+		self.assertEqual(select([self.scheduler], [], [], 0)[0], [])
+		self.scheduler.call_at("b", 0.5, self.callback("b"))
+		self.assertEqual(select([self.scheduler], [], [], 0)[0], [self.scheduler])
+
+	def test_wake_after_close(self):
+		self.scheduler.close()
+		self.scheduler.call_at("a", 1, self.callback("a"))
+		self.scheduler.wake()
+
+if __name__ == "__main__":
+	unittest.main()
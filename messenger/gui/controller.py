@@ -4,40 +4,58 @@ from messenger.frontend.client import Client
 from messenger.frontend.exceptions import *
 
 class Controller:
-	def __init__(self):
+	def __init__(self, end_to_end = False):
 		self._view = View(self)
-		self._client = Client(self)
+		self._client = Client(self, end_to_end)
 
 	def process_conn_response(self, response):
 		if response.resl == Response.OKAY:
-			self._view.lock(self._view.clear_messages_window)
-			self._view.lock(self._view.enable_connected_mode)
+			self._view.post(self._view.clear_messages_window)
+			self._view.post(self._view.enable_connected_mode)
 		else:
 			message_fmt = "Error: Unable to find companion.\n({0})"
 			message = message_fmt.format(response.mesg.decode())
-			self._view.lock(self._view.run_message_dialog, message)
-			self._view.lock(self._view.enable_disconnected_mode)
+			self._view.post(self._view.run_message_dialog, message)
+			self._view.post(self._view.enable_disconnected_mode)
 
 	def process_dscn_response(self, response):
 		message_fmt = "Error: Session suspended by companion.\n({0})"
 		message = message_fmt.format(response.mesg.decode())
-		self._view.lock(self._view.run_message_dialog, message)
-		self._view.lock(self._view.enable_disconnected_mode)
+		self._view.post(self._view.run_message_dialog, message)
+		self._view.post(self._view.enable_disconnected_mode)
 
-	def process_mesg_response(self, response):
+	def process_mesg_response(self, response, offset = None):
 		message = response.mesg.decode()
 		if response.resl == Response.OKAY:
 			message = message.rstrip("\x00")
-			self._view.lock(self._view.push_new_message, message)
+			self._view.post(self._view.push_new_message, message, offset)
 		else:
-			self._view.lock(self._view.run_message_dialog, message)
+			self._view.post(self._view.run_message_dialog, message)
+
+	def process_send_response(self, response, offset):
+		if response.resl == Response.OKAY:
+			self._view.post(self._view.confirm_own_message, offset)
+		else:
+			self._view.post(self._view.confirm_own_message, None)
+			self._view.post(self._view.run_message_dialog, response.mesg.decode())
+
+	def process_hist_response(self, page):
+		self._view.post(self._view.push_history_page, page)
 
 	def process_tybe_response(self, response):
 		message = "Companion is typing message..."
-		self._view.lock(self._view.push_statusbar_message, message)
+		self._view.post(self._view.push_statusbar_message, message)
 
 	def process_tyen_response(self, response):
-		self._view.lock(self._view.enable_connected_mode)
+		self._view.post(self._view.enable_connected_mode)
+
+	def process_fend_response(self, path, complete):
+		if complete:
+			message = "File received: {0}".format(path)
+			self._view.post(self._view.push_new_message, message)
+		else:
+			message = "Error: File transfer interrupted.\n({0})".format(path)
+			self._view.post(self._view.run_message_dialog, message)
 
 	def connect(self, addr, port):
 		try:
@@ -55,7 +73,24 @@ class Controller:
 		self._client.echo(message)
 
 	def send_message(self, message):
-		self._client.send_message(message)
+		try:
+			self._client.send_message(message)
+		except MessageTooLong:
+			self._view.run_message_dialog("Error: Message is too long.")
+			return False
+		except SessionNotSecured:
+			self._view.run_message_dialog("Error: Chat is not secured yet.")
+			return False
+		return True
+
+	def send_file(self, path):
+		try:
+			self._client.send_file(path)
+		except SessionNotSecured:
+			self._view.run_message_dialog("Error: Chat is not secured yet.")
+
+	def request_history(self, before):
+		self._client.request_history(before)
 
 	def send_message_writing_begin(self):
 		self._client.send_message_writing_begin()
@@ -0,0 +1,140 @@
+from itertools import islice
+from collections import deque
+
+class MessageList:
+	WINDOW_SIZE = 200
+	PAGE_SIZE = 50
+	CACHE_SIZE = 2000
+
+	def __init__(self, renderer, window_size = WINDOW_SIZE,
+		page_size = PAGE_SIZE, cache_size = CACHE_SIZE):
+		self._renderer = renderer
+		self._window_size = window_size
+		self._page_size = page_size
+		self._cache_size = cache_size
+		self._cache = deque()
+		self._offsets = deque()
+		self._unconfirmed = deque()
+		self.clear()
+
+	def __len__(self):
+		return self._hi - self._lo
+
+	@property
+	def following(self):
+		return self._hi == self._end
+
+	@property
+	def history_before(self):
+		head = max(self._lo - self._offsets_base, 0)
+		for offset in islice(self._offsets, head, None):
+			if offset is not None:
+				return offset
+		return None if self._evicted is None else self._evicted + 1
+
+	@property
+	def _end(self):
+		return self._base + len(self._cache)
+
+	def clear(self):
+		self._cache.clear()
+		self._offsets.clear()
+		self._unconfirmed.clear()
+		self._evicted = None
+		self._base = self._lo = self._hi = self._offsets_base = 0
+		self._history_pending = False
+		self._history_done = False
+		self._renderer.clear_rows()
+
+	def push(self, message, offset = None):
+		following = self.following
+		self._cache.append(message)
+		self._offsets.append(offset)
+		if following:
+			self._renderer.append_rows([message])
+			self._hi += 1
+			self._trim_top()
+		self._trim_cache()
+
+	def push_own(self, message):
+		self._unconfirmed.append(self._end)
+		self.push(message)
+
+	def confirm(self, offset):
+		if not self._unconfirmed:
+			return
+		index = self._unconfirmed.popleft() - self._offsets_base
+		if index >= 0:
+			self._offsets[index] = offset
+		elif offset is not None:
+			self._evict_offset(offset)
+
+	def push_history(self, messages, offsets = None):
+		self._history_pending = False
+		if not messages:
+			self._history_done = True
+			return
+		if self._lo > self._base:
+			return
+		if self._lo == self._base:
+			self._cache.extendleft(reversed(messages))
+			self._base -= len(messages)
+		self._offsets.extendleft(reversed(offsets or [None] * len(messages)))
+		self._offsets_base -= len(messages)
+		self._renderer.prepend_rows(messages)
+		self._lo -= len(messages)
+		self._trim_bottom()
+		self._trim_cache()
+
+	def scroll_top(self):
+		if self._lo > self._base:
+			count = min(self._page_size, self._lo - self._base)
+			head = self._lo - count - self._base
+			self._renderer.prepend_rows(list(islice(self._cache, head, head + count)))
+			self._lo -= count
+			self._trim_bottom()
+		elif not self._history_pending and not self._history_done:
+			self._history_pending = True
+			self._renderer.request_history(self.history_before)
+
+	def scroll_bottom(self):
+		if self._hi < self._base:
+			self._renderer.clear_rows()
+			self._lo = self._hi = self._base
+			self._trim_offsets()
+		if self._hi < self._end:
+			stop = min(self._hi + self._page_size, self._end)
+			self._renderer.append_rows(
+				list(islice(self._cache, self._hi - self._base, stop - self._base)))
+			self._hi = stop
+			self._trim_top()
+
+	def _trim_top(self):
+		excess = len(self) - self._window_size
+		if excess > 0:
+			self._renderer.remove_top_rows(excess)
+			self._lo += excess
+			self._trim_offsets()
+
+	def _trim_bottom(self):
+		excess = len(self) - self._window_size
+		if excess > 0:
+			self._renderer.remove_bottom_rows(excess)
+			self._hi -= excess
+
+	def _trim_cache(self):
+		while len(self._cache) > self._cache_size:
+			self._cache.popleft()
+			self._base += 1
+		self._trim_offsets()
+
+	def _trim_offsets(self):
+		while self._offsets_base < min(self._lo, self._base):
+			offset = self._offsets.popleft()
+			if offset is not None:
+				self._evict_offset(offset)
+			self._offsets_base += 1
+
+	def _evict_offset(self, offset):
+		if self._evicted is None or offset > self._evicted:
+			self._evicted = offset
@@ -0,0 +1,135 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from message_list import MessageList
+
+class RowsRenderer:
+	def __init__(self):
+		self.rows = []
+		self.history_requests = 0
+		self.before = None
+
+	def clear_rows(self):
+		self.rows = []
+
+	def append_rows(self, rows):
+		self.rows.extend(rows)
+
+	def prepend_rows(self, rows):
+		self.rows[:0] = rows
+
+	def remove_top_rows(self, count):
+		del self.rows[:count]
+
+	def remove_bottom_rows(self, count):
+		del self.rows[-count:]
+
+	def request_history(self, before):
+		self.history_requests += 1
+		self.before = before
+
+class MessageListTests(unittest.TestCase):
+	def setUp(self):
+		self.renderer = RowsRenderer()
+		self.messages = MessageList(self.renderer, window_size = 4,
+			page_size = 2, cache_size = 8)
+
+	def push(self, *messages):
+		for message in messages:
+			self.messages.push(message)
+
+	def test_window_bounded(self):
+		self.push(*range(10))
+		self.assertEqual(self.renderer.rows, [6, 7, 8, 9])
+		self.assertTrue(self.messages.following)
+
+	def test_scroll_back_from_cache(self):
+		self.push(*range(10))
+		self.messages.scroll_top()
+		self.assertEqual(self.renderer.rows, [4, 5, 6, 7])
+		self.assertFalse(self.messages.following)
+		self.messages.scroll_top()
+		self.assertEqual(self.renderer.rows, [2, 3, 4, 5])
+
+	def test_push_while_scrolled_back(self):
+		self.push(*range(6))
+		self.messages.scroll_top()
+		self.push(6)
+		self.assertEqual(self.renderer.rows, [0, 1, 2, 3])
+		self.messages.scroll_bottom()
+		self.messages.scroll_bottom()
+		self.assertEqual(self.renderer.rows, [3, 4, 5, 6])
+		self.assertTrue(self.messages.following)
+
+	def test_history_requested_once(self):
+		self.push(0, 1)
+		self.messages.scroll_top()
+		self.messages.scroll_top()
+		self.assertEqual(self.renderer.history_requests, 1)
+		self.messages.push_history(["a", "b"])
+		self.assertEqual(self.renderer.rows, ["a", "b", 0, 1])
+		self.messages.scroll_top()
+		self.messages.push_history([])
+		self.messages.scroll_top()
+		self.assertEqual(self.renderer.history_requests, 2)
+
+	def test_cache_bounded(self):
+		self.push(*range(20))
+		for _ in range(5):
+			self.messages.scroll_top()
+		self.assertEqual(self.renderer.rows, [12, 13, 14, 15])
+		self.assertEqual(self.renderer.history_requests, 1)
+
+	def test_history_before_first_page(self):
+		self.messages.scroll_top()
+		self.assertIsNone(self.renderer.before)
+		self.messages.push_history(["a", "b"], [3, 4])
+		self.messages.scroll_top()
+		self.assertEqual(self.renderer.before, 3)
+
+	def test_history_before_evicted_live_messages(self):
+		self.messages.push_history(["a", "b"], [0, 1])
+		for offset in range(2, 12):
+			self.messages.push(offset, offset)
+		for _ in range(3):
+			self.messages.scroll_top()
+		self.assertEqual(self.renderer.rows, [4, 5, 6, 7])
+		self.assertEqual(self.renderer.before, 4)
+
+	def test_history_before_rows_evicted_while_shown(self):
+		for offset in range(8):
+			self.messages.push(offset, offset)
+		for _ in range(2):
+			self.messages.scroll_top()
+		self.assertEqual(self.renderer.rows, [0, 1, 2, 3])
+		for offset in range(8, 12):
+			self.messages.push(offset, offset)
+		self.messages.scroll_top()
+		self.assertEqual(self.renderer.before, 0)
+		self.messages.push_history(["a", "b"], [None, None])
+		self.messages.push_history([])
+		self.assertEqual(self.renderer.rows, ["a", "b", 0, 1])
+
+	def test_confirm_own_messages(self):
+		self.messages.push_own("mine")
+		self.messages.push("theirs", 7)
+		self.messages.confirm(6)
+		self.messages.scroll_top()
+		self.assertEqual(self.renderer.before, 6)
+
+	def test_confirm_evicted_own_message(self):
+		self.messages.push_own("mine")
+		for index in range(8):
+			self.messages.push(index)
+		self.messages.confirm(6)
+		self.assertEqual(self.messages.history_before, 7)
+
+	def test_clear(self):
+		self.push(*range(3))
+		self.messages.clear()
+		self.assertEqual(self.renderer.rows, [])
+		self.assertEqual(len(self.messages), 0)
+
+if __name__ == "__main__":
+	unittest.main()
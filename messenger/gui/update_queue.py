@@ -0,0 +1,27 @@
+from threading import Lock
+
+class UpdateQueue:
+	def __init__(self, schedule):
+		self._schedule = schedule
+		self._lock = Lock()
+		self._updates = []
+		self._scheduled = False
+
+	def __len__(self):
+		return len(self._updates)
+
+	def post(self, method, *args):
+		with self._lock:
+			self._updates.append((method, args))
+			if self._scheduled:
+				return
+			self._scheduled = True
+		self._schedule(self.apply)
+
+	def apply(self):
+		with self._lock:
+			updates, self._updates = self._updates, []
+			self._scheduled = False
+		for method, args in updates:
+			method(*args)
+		return False
@@ -0,0 +1,37 @@
+#! /usr/bin/env python3
+
+import unittest
+
+from update_queue import UpdateQueue
+
+class UpdateQueueTests(unittest.TestCase):
+	def setUp(self):
+		self.scheduled = []
+		self.applied = []
+		self.queue = UpdateQueue(self.scheduled.append)
+
+	def test_single_schedule_per_batch(self):
+		for i in range(5):
+			self.queue.post(self.applied.append, i)
+		self.assertEqual(len(self.scheduled), 1)
+		self.assertEqual(len(self.queue), 5)
+		self.assertFalse(self.scheduled[0]())
+		self.assertEqual(self.applied, [0, 1, 2, 3, 4])
+		self.assertEqual(len(self.queue), 0)
+
+	def test_reschedule_after_apply(self):
+		self.queue.post(self.applied.append, 0)
+		self.queue.apply()
+		self.queue.post(self.applied.append, 1)
+		self.assertEqual(len(self.scheduled), 2)
+
+	def test_post_during_apply(self):
+		self.queue.post(lambda: self.queue.post(self.applied.append, 1))
+		self.queue.apply()
+		self.assertEqual(self.applied, [])
+		self.assertEqual(len(self.scheduled), 2)
+		self.queue.apply()
+		self.assertEqual(self.applied, [1])
+
+if __name__ == "__main__":
+	unittest.main()
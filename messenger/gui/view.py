@@ -2,10 +2,13 @@ import gi
 gi.require_version("Gtk", "3.0")
 
 from gi.repository import Gtk
-from gi.repository import Gdk
+from gi.repository import GLib
 from gi.repository import Pango
 from datetime import datetime
 
+from messenger.gui.message_list import MessageList
+from messenger.gui.update_queue import UpdateQueue
+
 class View(Gtk.Window):
 	def __init__(self, controller):
 		title = "Simple Messenger"
@@ -16,11 +19,11 @@ class View(Gtk.Window):
 		self.connect("delete-event", Gtk.main_quit)
 
 		self._controller = controller
+		self._updates = UpdateQueue(GLib.idle_add)
 		self._init_childs()
 
 	def run_view(self):
 		self.enable_disconnected_mode()
-		Gdk.threads_init()
 		self.show_all()
 		Gtk.main()
 
@@ -41,17 +44,18 @@ class View(Gtk.Window):
 		change_margins(self._main_container, 10)
 
 	def _make_messages_view(self):
-		self._messages_view = Gtk.TextView()
-		self._messages_view_buf = self._messages_view.get_buffer()
+		self._messages_view = Gtk.ListBox()
+		self._messages_view.set_selection_mode(Gtk.SelectionMode.NONE)
 		self._messages_view.connect("size-allocate", self._messages_view_changed)
 
 		self._messages_scroll = make_scrollable(self._messages_view)
 		messages_view = place_in_frame(self._messages_scroll)
 		self._main_container.pack_start(messages_view, True, True, 0)
 
-		self._messages_view.set_wrap_mode(Gtk.WrapMode.WORD)
-		self._messages_view.set_cursor_visible(False)
-		self._messages_view.set_editable(False)
+		scroll = self._messages_scroll.get_vadjustment()
+		scroll.connect("value-changed", self._messages_scrolled)
+		self._messages_anchor = None
+		self._messages = MessageList(self)
 
 	def _make_controls_container(self):
 		self._controls_container = Gtk.Box(
@@ -76,6 +80,10 @@ class View(Gtk.Window):
 		self._send.connect("clicked", self._send_clicked)
 		controls_box.add(self._send)
 
+		self._send_file = Gtk.Button.new_with_label("File")
+		self._send_file.connect("clicked", self._send_file_clicked)
+		controls_box.add(self._send_file)
+
 		self._change_connection = Gtk.Button.new_with_label("Connect")
 		self._change_connection.connect("clicked", self._change_connection_clicked)
 		controls_box.add(self._change_connection)
@@ -118,17 +126,40 @@ class View(Gtk.Window):
 
 	def _messages_view_changed(self, *args):
 		scroll = self._messages_scroll.get_vadjustment()
-		scroll.set_value(scroll.get_upper() - scroll.get_page_size())
+		if self._messages_anchor is not None:
+			scroll.set_value(scroll.get_upper() - self._messages_anchor)
+			self._messages_anchor = None
+		elif self._messages.following:
+			scroll.set_value(scroll.get_upper() - scroll.get_page_size())
+
+	def _messages_scrolled(self, scroll):
+		if scroll.get_value() <= scroll.get_lower():
+			self._messages.scroll_top()
+		elif scroll.get_value() + scroll.get_page_size() >= scroll.get_upper():
+			self._messages.scroll_bottom()
 
 	def _send_clicked(self, sender):
 		message = self._message_entry.get_text()
 		if message:
-			self._controller.send_message(message)
-			self._push_own_message(message)
+			if not self._controller.send_message(message):
+				return
+			self._messages.push_own(format_message("You", datetime.now(), message))
 			self._message_entry.set_text("")
 		else:
 			self.run_message_dialog("Unable to send blank message.")
 
+	def _send_file_clicked(self, sender):
+		file_dialog = Gtk.FileChooserDialog(
+			"Send file", self, Gtk.FileChooserAction.OPEN,
+			(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+			Gtk.STOCK_OPEN, Gtk.ResponseType.OK)
+		)
+		if file_dialog.run() == Gtk.ResponseType.OK:
+			path = file_dialog.get_filename()
+			self._controller.send_file(path)
+			self._push_own_message("File sent: {0}".format(path))
+		file_dialog.destroy()
+
 	def _change_connection_clicked(self, sender):
 		try:
 			server_addr = str(self._server_addr_entry.get_text())
@@ -144,11 +175,8 @@ class View(Gtk.Window):
 		if self._message_entry.get_text_length():
 			self._controller.send_message_writing_begin()
 
-	def _push_message(self, author, message):
-		message_time = datetime.strftime(datetime.now(), "%H:%M:%S")
-		message_fmt = "{0} ({1}):\n{2}\n\n".format(author, message_time, message)
-		end_iter = self._messages_view_buf.get_end_iter()
-		self._messages_view_buf.insert(end_iter, message_fmt)
+	def _push_message(self, author, message, offset = None):
+		self._messages.push(format_message(author, datetime.now(), message), offset)
 
 	def _push_own_message(self, message):
 		self._push_message("You", message)
@@ -161,8 +189,42 @@ class View(Gtk.Window):
 		message_dialog.run()
 		message_dialog.destroy()
 
-	def push_new_message(self, message):
-		self._push_message("Companion", message)
+	def push_new_message(self, message, offset = None):
+		self._push_message("Companion", message, offset)
+
+	def confirm_own_message(self, offset):
+		self._messages.confirm(offset)
+
+	def push_history_page(self, page):
+		self._messages.push_history([
+			format_message("History", datetime.fromtimestamp(moment), message)
+			for _, moment, message in page
+		], [offset for offset, _, _ in page])
+
+	def clear_rows(self):
+		for row in self._messages_view.get_children():
+			self._messages_view.remove(row)
+
+	def append_rows(self, rows):
+		for row in rows:
+			self._messages_view.add(make_message_row(row))
+
+	def prepend_rows(self, rows):
+		scroll = self._messages_scroll.get_vadjustment()
+		self._messages_anchor = scroll.get_upper() - scroll.get_value()
+		for index, row in enumerate(rows):
+			self._messages_view.insert(make_message_row(row), index)
+
+	def remove_top_rows(self, count):
+		for row in self._messages_view.get_children()[:count]:
+			self._messages_view.remove(row)
+
+	def remove_bottom_rows(self, count):
+		for row in self._messages_view.get_children()[-count:]:
+			self._messages_view.remove(row)
+
+	def request_history(self, before):
+		self._controller.request_history(before)
 
 	def enable_connected_mode(self):
 		self.push_statusbar_message("Click \"Send\" to send message.")
@@ -171,6 +233,7 @@ class View(Gtk.Window):
 		self._change_connection.set_sensitive(True)
 		self._message_entry.set_sensitive(True)
 		self._send.set_sensitive(True)
+		self._send_file.set_sensitive(True)
 
 	def enable_disconnected_mode(self):
 		self.push_statusbar_message("Click \"Connect\" to find companion.")
@@ -179,6 +242,7 @@ class View(Gtk.Window):
 		self._change_connection.set_sensitive(True)
 		self._message_entry.set_sensitive(False)
 		self._send.set_sensitive(False)
+		self._send_file.set_sensitive(False)
 
 	def enable_connecting_mode(self):
 		self.push_statusbar_message("Looking for companion.")
@@ -186,17 +250,29 @@ class View(Gtk.Window):
 		self._connection_config.set_sensitive(False)
 		self._message_entry.set_sensitive(False)
 		self._send.set_sensitive(False)
+		self._send_file.set_sensitive(False)
 
 	def push_statusbar_message(self, message):
 		self._statusbar.set_label(message)
 
 	def clear_messages_window(self):
-		self._messages_view_buf.set_text("")
-
-	def lock(self, method, *args):
-		Gdk.threads_enter()
-		method(*args)
-		Gdk.threads_leave()
+		self._messages.clear()
+
+	def post(self, method, *args):
+		self._updates.post(method, *args)
+
+def format_message(author, message_time, message):
+	message_time = datetime.strftime(message_time, "%H:%M:%S")
+	return "{0} ({1}):\n{2}".format(author, message_time, message)
+
+def make_message_row(message):
+	label = Gtk.Label(message)
+	label.set_line_wrap(True)
+	label.set_xalign(0)
+	label.set_selectable(True)
+	change_margins(label, 5)
+	label.show()
+	return label
 
 def change_margins(widget, margin):
 	widget.set_margin_top(margin)
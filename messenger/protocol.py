@@ -1,4 +1,5 @@
 import re
+import struct
 
 class Command:
 	DSCN = "DSCN"
@@ -10,6 +11,21 @@ class Command:
 	TYBE = "TYBE"
 	TYEN = "TYEN"
 	AESK = "AESK"
+	PUBK = "PUBK"
+	SKEY = "SKEY"
+	RELY = "RELY"
+	VERS = "VERS"
+	FILE = "FILE"
+	CHNK = "CHNK"
+	FEND = "FEND"
+	JOIN = "JOIN"
+	STAT = "STAT"
+	HIST = "HIST"
+	AESC = "AESC"
+	RSUM = "RSUM"
+	COMP = "COMP"
+	PING = "PING"
+	PONG = "PONG"
 
 	HEAD_SIZE = 3
 	IDEN_SIZE = 4
@@ -24,22 +40,41 @@ class Command:
 		IDEN_SIZE
 	)
 	regex = re.compile(regex_raw)
+	sign = struct.Struct("%ds%ds" % (HEAD_SIZE, IDEN_SIZE))
 
 	@staticmethod
 	def unpack_sign(sign):
-		sign = sign.decode()
 		if len(sign) != Command.SIGN_SIZE:
 			message = "Invalid command signature length."
 			raise ValueError(message)
+		return Command.unpack_sign_from(sign)
 
-		regex_res = Command.regex.match(sign)
+	@staticmethod
+	def unpack_sign_from(buf, offset = 0):
+		head, iden = Command.sign.unpack_from(buf, offset)
+		mesg_len, iden = HEADS.get(head), IDEN_NAMES.get(iden)
+		if mesg_len is None or iden is None:
+			return Command.parse_sign(bytes(buf[offset:offset + Command.SIGN_SIZE]))
+		return Command.frame(iden, mesg_len)
+
+	@staticmethod
+	def parse_sign(sign):
+		regex_res = Command.regex.fullmatch(sign.decode())
 		if not regex_res:
 			message = "Unable to recognize command."
 			raise ValueError(message)
-		
+
 		head, iden = regex_res.groups()
 		return Command(iden, mesg_len = int(head, 16))
 
+	@classmethod
+	def frame(cls, iden, mesg_len):
+		frame = cls.__new__(cls)
+		frame._iden = iden
+		frame._mesg = b""
+		frame._mesg_len = mesg_len
+		return frame
+
 	def __init__(self, iden, mesg = b"", mesg_len = 0):
 		self._iden = iden
 		self._mesg = mesg[:Command.MESG_SIZE]
@@ -61,12 +96,19 @@ class Command:
 	def mesg(self, mesg):
 		self._mesg = mesg
 
+	@staticmethod
+	def pack_sign(command):
+		if command.mesg_len > Command.MESG_SIZE:
+			message = "Message is too long."
+			raise ValueError(message)
+
+		return HEAD_BYTES[command.mesg_len] + iden_bytes(command.iden)
+
+	def in_sign(self):
+		return self.pack_sign(self)
+
 	def in_raw(self):
-		command_fmt = "{0:0%dX}{1}" % Command.HEAD_SIZE
-		return b"".join((
-			command_fmt.format(self._mesg_len, self._iden).encode(), 
-			self._mesg
-		))
+		return self.pack_sign(self) + self._mesg
 
 class Response(Command):
 	OKAY = "OKAY"
@@ -84,19 +126,32 @@ class Response(Command):
 
 	regex_raw = Command.regex_raw + r"({0}|{1})".format(OKAY, FAIL)
 	regex = re.compile(regex_raw)
+	sign = struct.Struct("%ds%ds%ds" % (HEAD_SIZE, IDEN_SIZE, RESL_SIZE))
 
 	@staticmethod
 	def unpack_sign(sign):
-		sign = sign.decode()
 		if len(sign) != Response.SIGN_SIZE:
 			message = "Invalid response signature length."
 			raise ValueError(message)
+		return Response.unpack_sign_from(sign)
+
+	@staticmethod
+	def unpack_sign_from(buf, offset = 0):
+		head, iden, resl = Response.sign.unpack_from(buf, offset)
+		mesg_len, iden, resl = HEADS.get(head), IDEN_NAMES.get(iden), RESL_NAMES.get(resl)
+		if mesg_len is None or iden is None or resl is None:
+			return Response.parse_sign(bytes(buf[offset:offset + Response.SIGN_SIZE]))
+		response = Response.frame(iden, mesg_len)
+		response._resl = resl
+		return response
 
-		regex_res = Response.regex.match(sign)
+	@staticmethod
+	def parse_sign(sign):
+		regex_res = Response.regex.fullmatch(sign.decode())
 		if not regex_res:
 			message = "Unable to recognize response."
 			raise ValueError(message)
-		
+
 		head, iden, resl = regex_res.groups()
 		return Response(iden, resl, mesg_len = int(head, 16))
 
@@ -108,9 +163,150 @@ class Response(Command):
 	def resl(self):
 		return self._resl
 
-	def in_raw(self):
-		response_fmt = "{0:0%dX}{1}{2}" % Response.HEAD_SIZE
-		return b"".join((
-			response_fmt.format(self._mesg_len, self._iden, self._resl).encode(), 
-			self._mesg
-		))
\ No newline at end of file
+	@staticmethod
+	def pack_sign(response):
+		if response.mesg_len > Response.MESG_SIZE:
+			message = "Message is too long."
+			raise ValueError(message)
+
+		return b"".join((HEAD_BYTES[response.mesg_len],
+			iden_bytes(response.iden), RESL_BYTES[response.resl]))
+
+IDENS = (
+	Command.DSCN,
+	Command.ECHO,
+	Command.UNKN,
+	Command.CONN,
+	Command.SEND,
+	Command.MESG,
+	Command.TYBE,
+	Command.TYEN,
+	Command.AESK,
+	Command.PUBK,
+	Command.SKEY,
+	Command.RELY,
+	Command.VERS,
+	Command.FILE,
+	Command.CHNK,
+	Command.FEND,
+	Command.JOIN,
+	Command.STAT,
+	Command.HIST,
+	Command.AESC,
+	Command.RSUM,
+	Command.COMP,
+	Command.PING,
+	Command.PONG
+)
+OPCODES = {iden: opcode for opcode, iden in enumerate(IDENS)}
+
+RESLS = (Response.OKAY, Response.FAIL)
+RESL_CODES = {resl: code for code, resl in enumerate(RESLS)}
+
+HEAD_BYTES = tuple(("{0:0%dX}" % Command.HEAD_SIZE).format(mesg_len).encode()
+	for mesg_len in range(Command.MESG_SIZE + 1))
+HEADS = {head: mesg_len for mesg_len, head in enumerate(HEAD_BYTES)}
+IDEN_NAMES = {iden.encode(): iden for iden in IDENS}
+RESL_BYTES = {resl: resl.encode() for resl in RESLS}
+RESL_NAMES = {resl.encode(): resl for resl in RESLS}
+
+IDEN_BYTES = {iden: iden.encode() for iden in IDENS}
+
+def iden_bytes(iden):
+	return IDEN_BYTES.get(iden) or iden.encode()
+
+class CommandV2(Command):
+	sign = struct.Struct("!HB")
+	SIGN_SIZE = sign.size
+
+	@staticmethod
+	def unpack_sign(sign):
+		if len(sign) != CommandV2.SIGN_SIZE:
+			message = "Invalid command signature length."
+			raise ValueError(message)
+
+		return CommandV2.unpack_sign_from(sign)
+
+	@staticmethod
+	def unpack_sign_from(buf, offset = 0):
+		mesg_len, opcode = CommandV2.sign.unpack_from(buf, offset)
+		if opcode >= len(IDENS) or mesg_len > CommandV2.MESG_SIZE:
+			message = "Unable to recognize command."
+			raise ValueError(message)
+
+		return CommandV2.frame(IDENS[opcode], mesg_len)
+
+	@staticmethod
+	def pack_sign(command):
+		return CommandV2.sign.pack(command.mesg_len, OPCODES[command.iden])
+
+class ResponseV2(Response):
+	sign = struct.Struct("!HBB")
+	SIGN_SIZE = sign.size
+
+	@staticmethod
+	def unpack_sign(sign):
+		if len(sign) != ResponseV2.SIGN_SIZE:
+			message = "Invalid response signature length."
+			raise ValueError(message)
+
+		return ResponseV2.unpack_sign_from(sign)
+
+	@staticmethod
+	def unpack_sign_from(buf, offset = 0):
+		mesg_len, opcode, code = ResponseV2.sign.unpack_from(buf, offset)
+		if opcode >= len(IDENS) or code >= len(RESLS) or mesg_len > ResponseV2.MESG_SIZE:
+			message = "Unable to recognize response."
+			raise ValueError(message)
+
+		response = ResponseV2.frame(IDENS[opcode], mesg_len)
+		response._resl = RESLS[code]
+		return response
+
+	@staticmethod
+	def pack_sign(response):
+		return ResponseV2.sign.pack(
+			response.mesg_len,
+			OPCODES[response.iden],
+			RESL_CODES[response.resl]
+		)
+
+PROTOCOLS = {
+	1: (Command, Response),
+	2: (CommandV2, ResponseV2)
+}
+PROTOCOL_VERSION = max(PROTOCOLS)
+
+class Registry:
+	def __init__(self, default):
+		self._default = default
+		self._handlers = {}
+		self._middleware = []
+		self._chain = None
+
+	def __contains__(self, iden):
+		return iden in self._handlers
+
+	def register(self, iden, handler):
+		self._handlers[iden] = handler
+		self._chain = None
+
+	def use(self, middleware):
+		self._middleware.append(middleware)
+		self._chain = None
+
+	def compile(self):
+		chain = {iden: self._wrap(iden, handler) for iden, handler in self._handlers.items()}
+		chain[None] = self._wrap(None, self._default)
+		self._chain = chain
+
+	def lookup(self, iden):
+		if self._chain is None:
+			self.compile()
+		chain = self._chain
+		return chain.get(iden) or chain[None]
+
+	def _wrap(self, iden, handler):
+		for middleware in reversed(self._middleware):
+			handler = middleware(iden, handler)
+		return handler
@@ -0,0 +1,48 @@
+from timeit import Timer
+
+from messenger.protocol import Command
+from messenger.protocol import Response
+from messenger.protocol import CommandV2
+from messenger.protocol import ResponseV2
+
+def measure(func, count, rounds):
+	best = min(Timer(func).repeat(rounds, count))
+	return {
+		"frames_per_second": count / best,
+		"ns_per_frame": best / count * 1e9
+	}
+
+def parse_paths(frame_type, frame):
+	sign = frame_type.pack_sign(frame)
+	view = memoryview(bytearray(sign))
+	paths = {
+		"unpack_sign": lambda: frame_type.unpack_sign(sign),
+		"unpack_sign_from": lambda: frame_type.unpack_sign_from(view)
+	}
+	if "parse_sign" in vars(frame_type):
+		paths["parse_sign"] = lambda: frame_type.parse_sign(sign)
+	return paths
+
+def build_paths(frame_type, frame):
+	return {
+		"pack_sign": lambda: frame_type.pack_sign(frame),
+		"in_raw": frame.in_raw
+	}
+
+def run_protocol_bench(size, count, rounds):
+	mesg = b"x" * size
+	frames = {
+		"command": (Command, Command(Command.SEND, mesg)),
+		"response": (Response, Response(Command.MESG, mesg = mesg)),
+		"command_v2": (CommandV2, CommandV2(Command.SEND, mesg)),
+		"response_v2": (ResponseV2, ResponseV2(Command.MESG, mesg = mesg))
+	}
+	result = {}
+	for name, (frame_type, frame) in frames.items():
+		result[name] = {
+			"parse": {path: measure(func, count, rounds)
+				for path, func in parse_paths(frame_type, frame).items()},
+			"build": {path: measure(func, count, rounds)
+				for path, func in build_paths(frame_type, frame).items()}
+		}
+	return result
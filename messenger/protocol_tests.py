@@ -4,6 +4,9 @@ import unittest
 
 from protocol import Command
 from protocol import Response
+from protocol import CommandV2
+from protocol import ResponseV2
+from protocol import Registry
 
 class CommandUnpackSignTests(unittest.TestCase):
 	def test_empty_sign(self):
@@ -101,6 +104,11 @@ class CommandInstanceTests(unittest.TestCase):
 		).encode()
 		self.assertEqual(command.in_raw(), command_in_raw)
 
+	def test_sign_with_norm_mesg(self):
+		command = Command(Command.RELY, b"DEBUG")
+		command_sign = ("{0:0%dX}RELY" % Command.HEAD_SIZE).format(5).encode()
+		self.assertEqual(command.in_sign(), command_sign)
+
 class ResponseInstanceTests(unittest.TestCase):
 	def test_with_blank_mesg(self):
 		response = Response(Command.SEND)
@@ -121,5 +129,121 @@ class ResponseInstanceTests(unittest.TestCase):
 		).encode()
 		self.assertEqual(response.in_raw(), response_in_raw)
 
+	def test_sign_with_norm_mesg(self):
+		response = Response(Command.RELY, mesg = b"DEBUG")
+		response_sign = ("{0:0%dX}RELYOKAY" % Response.HEAD_SIZE).format(5).encode()
+		self.assertEqual(response.in_sign(), response_sign)
+
+class CommandV2Tests(unittest.TestCase):
+	def test_with_wrong_sign_size(self):
+		command_sign = b"\x00" * (CommandV2.SIGN_SIZE + 1)
+		self.assertRaises(ValueError, CommandV2.unpack_sign, command_sign)
+
+	def test_with_wrong_opcode(self):
+		command_sign = b"\x00\x00\xFF"
+		self.assertRaises(ValueError, CommandV2.unpack_sign, command_sign)
+
+	def test_with_too_long_mesg(self):
+		command_sign = b"\x10\x00\x04"
+		self.assertRaises(ValueError, CommandV2.unpack_sign, command_sign)
+
+	def test_with_correct_sign(self):
+		command = CommandV2.unpack_sign(b"\x0F\xFF\x04")
+		self.assertTrue(command.mesg_len == 0xFFF and command.iden == "SEND")
+
+	def test_pack_ascii_command(self):
+		command = Command(Command.SEND, b"DEBUG")
+		self.assertEqual(CommandV2.pack_sign(command), b"\x00\x05\x04")
+
+	def test_round_trip(self):
+		for iden in ("CONN", "AESK", "RELY", "VERS"):
+			command = CommandV2(iden, b"DEBUG")
+			unpacked = CommandV2.unpack_sign(command.in_sign())
+			self.assertTrue(unpacked.iden == iden and unpacked.mesg_len == 5)
+
+class ResponseV2Tests(unittest.TestCase):
+	def test_with_wrong_sign_size(self):
+		response_sign = b"\x00" * (ResponseV2.SIGN_SIZE - 1)
+		self.assertRaises(ValueError, ResponseV2.unpack_sign, response_sign)
+
+	def test_with_wrong_resl(self):
+		response_sign = b"\x00\x00\x04\x02"
+		self.assertRaises(ValueError, ResponseV2.unpack_sign, response_sign)
+
+	def test_with_correct_sign(self):
+		response = ResponseV2.unpack_sign(b"\x00\x05\x05\x01")
+		self.assertTrue(all((
+			response.iden == "MESG",
+			response.mesg_len == 5,
+			response.resl == "FAIL"
+		)))
+
+	def test_in_raw(self):
+		response = ResponseV2(Command.MESG, Response.FAIL, b"DEBUG")
+		self.assertEqual(response.in_raw(), b"\x00\x05\x05\x01DEBUG")
+
+class RegistryTests(unittest.TestCase):
+	def setUp(self):
+		self.calls = []
+		self.registry = Registry(lambda frame: self.calls.append(("unkn", frame)))
+		self.registry.register(Command.SEND, lambda frame: self.calls.append(("send", frame)))
+
+	def tracing(self, iden, handler):
+		def traced(frame):
+			self.calls.append(("trace", iden))
+			handler(frame)
+		return traced
+
+	def test_lookup(self):
+		self.registry.lookup(Command.SEND)(1)
+		self.registry.lookup(Command.ECHO)(2)
+		self.assertEqual(self.calls, [("send", 1), ("unkn", 2)])
+
+	def test_middleware_order(self):
+		self.registry.use(lambda iden, handler: lambda frame: handler(frame + 1))
+		self.registry.use(self.tracing)
+		self.registry.lookup(Command.SEND)(1)
+		self.assertEqual(self.calls, [("trace", Command.SEND), ("send", 2)])
+
+	def test_register_after_compile(self):
+		self.registry.compile()
+		self.registry.register(Command.ECHO, lambda frame: self.calls.append(("echo", frame)))
+		self.registry.lookup(Command.ECHO)(1)
+		self.assertEqual(self.calls, [("echo", 1)])
+
+class FastPathTests(unittest.TestCase):
+	def test_unpack_from_view(self):
+		buf = memoryview(b"xx1F0SEND" + b"05DMESGFAIL")
+		command = Command.unpack_sign_from(buf, 2)
+		self.assertEqual((command.iden, command.mesg_len, command.mesg), (Command.SEND, 0x1F0, b""))
+		response = Response.unpack_sign_from(buf, 9)
+		self.assertEqual((response.iden, response.resl, response.mesg_len),
+			(Command.MESG, Response.FAIL, 0x5D))
+
+	def test_slow_path_fallback(self):
+		command = Command.unpack_sign(b"0afSEND")
+		self.assertEqual((command.iden, command.mesg_len), (Command.SEND, 0xAF))
+		command = Command.unpack_sign(b"000ABCD")
+		self.assertEqual(command.iden, "ABCD")
+		self.assertRaises(ValueError, Command.unpack_sign, b"+1FSEND")
+
+	def test_unpack_sign_from_offset(self):
+		for frame_type, frame in (
+			(Command, Command(Command.SEND, b"DEBUG")),
+			(Response, Response(Command.MESG, Response.FAIL, b"DEBUG")),
+			(CommandV2, CommandV2(Command.SEND, b"DEBUG")),
+			(ResponseV2, ResponseV2(Command.MESG, Response.FAIL, b"DEBUG"))
+		):
+			buf = memoryview(b"#" + frame.in_raw())
+			unpacked = frame_type.unpack_sign_from(buf, 1)
+			self.assertEqual((unpacked.iden, unpacked.mesg_len), (frame.iden, frame.mesg_len))
+
+	def test_pack_sign_rejects_long_mesg(self):
+		command = Command(Command.SEND, mesg_len = Command.MESG_SIZE + 1)
+		self.assertRaises(ValueError, Command.pack_sign, command)
+		response = Response(Command.MESG, mesg_len = Response.MESG_SIZE + 1)
+		self.assertRaises(ValueError, Response.pack_sign, response)
+		self.assertEqual(Command.pack_sign(Command(Command.SEND, mesg_len = 0xFFF)), b"FFFSEND")
+
 if __name__ == "__main__":
 	unittest.main()
\ No newline at end of file
@@ -1,19 +1,83 @@
+import os
+import hmac
+from queue import Queue
+from hashlib import sha256
+from threading import Lock
+from threading import Thread
+from collections import OrderedDict
+
 from Crypto import Random
 from Crypto.Cipher import AES
 from Crypto.PublicKey import RSA
+from Crypto.Util import Counter
+
+class KeyCache:
+	SIZE = 1024
+
+	def __init__(self, size = SIZE):
+		self._size = size
+		self._keys = OrderedDict()
+		self._lock = Lock()
+
+	def __len__(self):
+		return len(self._keys)
+
+	def get(self, pub_key):
+		digest = sha256(pub_key).digest()
+		with self._lock:
+			key = self._keys.get(digest)
+			if key:
+				self._keys.move_to_end(digest)
+				return key
+
+		key = RSA.importKey(pub_key)
+		with self._lock:
+			self._keys[digest] = key
+			if len(self._keys) > self._size:
+				self._keys.popitem(last = False)
+		return key
 
 class Rsa:
 	KEY_SIZE = 2048
+	FINGERPRINT_SIZE = 8
+	pub_keys = KeyCache()
 
-	def __init__(self):
-		self.gen_key()
+	def __init__(self, prv_key = None):
+		if prv_key:
+			self._prv_key = prv_key
+			self._pub_key = prv_key.publickey()
+		else:
+			self.gen_key()
+
+	@staticmethod
+	def fingerprint(pub_key):
+		return sha256(pub_key).digest()[:Rsa.FINGERPRINT_SIZE]
 
 	@staticmethod
 	def quick_encode(pub_key, buf):
-		pub_key = RSA.importKey(pub_key)
+		pub_key = Rsa.pub_keys.get(pub_key)
 		buf, *_ = pub_key.encrypt(buf, None)
 		return buf
 
+	@staticmethod
+	def load(path):
+		with open(path, "rb") as key_file:
+			return Rsa(RSA.importKey(key_file.read()))
+
+	@staticmethod
+	def load_or_create(path):
+		try:
+			return Rsa.load(path)
+		except FileNotFoundError:
+			rsa = Rsa()
+			rsa.save(path)
+			return rsa
+
+	def save(self, path):
+		key_fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+		with open(key_fd, "wb") as key_file:
+			key_file.write(self._prv_key.exportKey("PEM"))
+
 	def gen_key(self):
 		self._prv_key = RSA.generate(Rsa.KEY_SIZE)
 		self._pub_key = self._prv_key.publickey()
@@ -31,8 +95,33 @@ class Rsa:
 	def export_pub_key(self):
 		return self._pub_key.exportKey("PEM")
 
+class RsaPool:
+	SIZE = 2
+
+	def __init__(self, size = SIZE):
+		self._keys = Queue(size)
+		self._lock = Lock()
+		self._thread = None
+
+	def start(self):
+		with self._lock:
+			if not self._thread:
+				self._thread = Thread(target = self._loop, daemon = True)
+				self._thread.start()
+
+	def acquire(self):
+		self.start()
+		return self._keys.get()
+
+	def _loop(self):
+		while True:
+			self._keys.put(Rsa())
+
+rsa_pool = RsaPool()
+
 class Aes:
 	KEY_SIZE = 16
+	OVERHEAD = 16
 
 	def __init__(self):
 		self.gen_key()
@@ -49,9 +138,65 @@ class Aes:
 	def decode(self, buf):
 		return self._handler.decrypt(buf)
 
+	def encode_batch(self, bufs):
+		return [self.encode(buf) for buf in bufs]
+
 	def import_key(self, key):
 		self._key = key
 		self._handler = AES.new(key)
 
 	def export_key(self):
-		return self._key
\ No newline at end of file
+		return self._key
+
+class AesCtr(Aes):
+	NONCE_SIZE = 12
+	TAG_SIZE = 16
+	OVERHEAD = NONCE_SIZE + TAG_SIZE
+
+	def gen_key(self):
+		self.import_key(Random.new().read(Aes.KEY_SIZE))
+
+	def import_key(self, key):
+		self._key = key
+		self._mac_key = sha256(b"mac" + key).digest()
+
+	def _handler(self, nonce):
+		counter = Counter.new(32, prefix = nonce, initial_value = 1)
+		return AES.new(self._key, AES.MODE_CTR, counter = counter)
+
+	def _tag(self, view):
+		return hmac.new(self._mac_key, view, sha256).digest()[:AesCtr.TAG_SIZE]
+
+	def encode(self, buf):
+		out = bytearray(len(buf) + AesCtr.OVERHEAD)
+		self.encode_into(out, 0, buf)
+		return out
+
+	def encode_into(self, out, offset, buf):
+		view = memoryview(out)
+		nonce = os.urandom(AesCtr.NONCE_SIZE)
+		body = offset + AesCtr.NONCE_SIZE
+		tail = body + len(buf)
+		view[offset:body] = nonce
+		view[body:tail] = self._handler(nonce).encrypt(buf)
+		view[tail:tail + AesCtr.TAG_SIZE] = self._tag(view[offset:tail])
+		return tail + AesCtr.TAG_SIZE
+
+	def encode_batch(self, bufs):
+		out = bytearray(sum(len(buf) for buf in bufs) + AesCtr.OVERHEAD * len(bufs))
+		view, offset, encoded = memoryview(out), 0, []
+		for buf in bufs:
+			end = self.encode_into(out, offset, buf)
+			encoded.append(view[offset:end])
+			offset = end
+		return encoded
+
+	def decode(self, buf):
+		if len(buf) < AesCtr.OVERHEAD:
+			raise ValueError("Encrypted message is too short.")
+		view = memoryview(buf)
+		tail = len(buf) - AesCtr.TAG_SIZE
+		if not hmac.compare_digest(self._tag(view[:tail]), view[tail:]):
+			raise ValueError("Message authentication failed.")
+		nonce = bytes(view[:AesCtr.NONCE_SIZE])
+		return self._handler(nonce).decrypt(bytes(view[AesCtr.NONCE_SIZE:tail]))
\ No newline at end of file
@@ -0,0 +1,32 @@
+import os
+from time import perf_counter
+
+from messenger.secure import Aes
+from messenger.secure import AesCtr
+
+def measure(encode, messages, rounds):
+	best = None
+	for _ in range(rounds):
+		began = perf_counter()
+		encode(messages)
+		elapsed = perf_counter() - began
+		best = elapsed if best is None else min(best, elapsed)
+	size = sum(len(message) for message in messages)
+	return {
+		"mb_per_second": size / best / 0x100000,
+		"us_per_message": best / len(messages) * 1e6
+	}
+
+def run_secure_bench(sizes, count, rounds):
+	ecb, ctr = Aes(), AesCtr()
+	paths = {
+		"ecb": lambda messages: [ecb.encode(message) for message in messages],
+		"ctr": lambda messages: [ctr.encode(message) for message in messages],
+		"ctr_batch": ctr.encode_batch
+	}
+	result = {}
+	for size in sizes:
+		messages = [os.urandom(size) for _ in range(count)]
+		result[size] = {name: measure(encode, messages, rounds)
+			for name, encode in paths.items()}
+	return result
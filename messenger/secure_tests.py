@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from Crypto.PublicKey import RSA
+
+from secure import Aes
+from secure import AesCtr
+from secure import Rsa
+from secure import RsaPool
+from secure import KeyCache
+from secure import rsa_pool
+
+def export_pub_key():
+	return RSA.generate(1024).publickey().exportKey("PEM")
+
+class KeyCacheTests(unittest.TestCase):
+	def test_get_reuses_key(self):
+		cache, pub_key = KeyCache(), export_pub_key()
+		self.assertIs(cache.get(pub_key), cache.get(pub_key))
+		self.assertEqual(len(cache), 1)
+
+	def test_evicts_least_recently_used(self):
+		cache = KeyCache(size = 2)
+		first, second, third = export_pub_key(), export_pub_key(), export_pub_key()
+		first_key, second_key = cache.get(first), cache.get(second)
+		cache.get(first)
+		cache.get(third)
+		self.assertEqual(len(cache), 2)
+		self.assertIs(cache.get(first), first_key)
+		self.assertIsNot(cache.get(second), second_key)
+
+class RsaTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = TemporaryDirectory()
+		self.path = os.path.join(self.directory.name, "id.pem")
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_load_or_create(self):
+		rsa = Rsa.load_or_create(self.path)
+		self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+		self.assertEqual(Rsa.load_or_create(self.path).export_pub_key(), rsa.export_pub_key())
+
+	def test_load_or_create_without_pool(self):
+		Rsa.load_or_create(self.path)
+		self.assertIsNone(rsa_pool._thread)
+
+class RsaPoolTests(unittest.TestCase):
+	def test_acquire(self):
+		pool = RsaPool(size = 1)
+		first, second = pool.acquire(), pool.acquire()
+		self.assertIsInstance(first, Rsa)
+		self.assertNotEqual(first.export_pub_key(), second.export_pub_key())
+		thread = pool._thread
+		pool.start()
+		self.assertIs(pool._thread, thread)
+
+class AesTests(unittest.TestCase):
+	def test_overhead(self):
+		aes = Aes()
+		for size in (0, 15, 16, 100):
+			self.assertLessEqual(len(aes.encode(b"A" * size)), size + Aes.OVERHEAD)
+
+class AesCtrTests(unittest.TestCase):
+	def setUp(self):
+		self.aes = AesCtr()
+
+	def test_round_trip(self):
+		encoded = self.aes.encode(b"hello")
+		self.assertEqual(len(encoded), 5 + AesCtr.OVERHEAD)
+		self.assertEqual(self.aes.decode(encoded), b"hello")
+		peer = AesCtr()
+		peer.import_key(self.aes.export_key())
+		self.assertEqual(peer.decode(encoded), b"hello")
+
+	def test_fresh_nonce(self):
+		self.assertNotEqual(self.aes.encode(b"hello"), self.aes.encode(b"hello"))
+
+	def test_rejects_tampering(self):
+		encoded = self.aes.encode(b"hello")
+		for index in (0, AesCtr.NONCE_SIZE, len(encoded) - 1):
+			tampered = bytearray(encoded)
+			tampered[index] ^= 1
+			self.assertRaises(ValueError, self.aes.decode, tampered)
+		self.assertRaises(ValueError, AesCtr().decode, encoded)
+
+	def test_rejects_short(self):
+		self.assertRaises(ValueError, self.aes.decode, b"A" * (AesCtr.OVERHEAD - 1))
+		self.assertEqual(self.aes.decode(self.aes.encode(b"")), b"")
+
+	def test_encode_batch(self):
+		bufs = [b"first", b"", b"third" * 10]
+		encoded = self.aes.encode_batch(bufs)
+		self.assertEqual([self.aes.decode(buf) for buf in encoded], bufs)
+		self.assertEqual([len(buf) for buf in encoded],
+			[len(buf) + AesCtr.OVERHEAD for buf in bufs])
+
+if __name__ == "__main__":
+	unittest.main()
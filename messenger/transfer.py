@@ -0,0 +1,62 @@
+import os
+from mmap import mmap
+from mmap import ACCESS_READ
+
+class FileSender:
+	CHUNK_SIZE = 0xFC0
+	BATCH_SIZE = 16
+
+	def __init__(self, path, cipher = None):
+		self._path = path
+		self._cipher = cipher
+		self._size = os.path.getsize(path)
+
+	@property
+	def name(self):
+		return os.path.basename(self._path)
+
+	@property
+	def size(self):
+		return self._size
+
+	def chunks(self):
+		if not self._size:
+			return
+		batch_size = FileSender.CHUNK_SIZE * FileSender.BATCH_SIZE
+		with open(self._path, "rb") as file, \
+			mmap(file.fileno(), 0, access = ACCESS_READ) as view:
+			for batch in range(0, self._size, batch_size):
+				chunks = [view[offset:offset + FileSender.CHUNK_SIZE] for offset in
+					range(batch, min(batch + batch_size, self._size), FileSender.CHUNK_SIZE)]
+				yield from self._cipher.encode_batch(chunks) if self._cipher else chunks
+
+class FileReceiver:
+	def __init__(self, path, size):
+		self._path = path
+		self._remaining = size
+		self._file = open(path, "xb")
+
+	@property
+	def path(self):
+		return self._path
+
+	@property
+	def complete(self):
+		return not self._remaining
+
+	def write(self, chunk):
+		chunk_len = min(len(chunk), FileSender.CHUNK_SIZE, self._remaining)
+		self._file.write(chunk[:chunk_len])
+		self._remaining -= chunk_len
+
+	def close(self):
+		self._file.close()
+		return self.complete
+
+def unique_path(directory, name):
+	root, ext = os.path.splitext(name)
+	path, index = os.path.join(directory, name), 0
+	while os.path.lexists(path):
+		index += 1
+		path = os.path.join(directory, "{0} ({1}){2}".format(root, index, ext))
+	return path
@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from transfer import FileSender
+from transfer import FileReceiver
+from transfer import unique_path
+
+class FileTransferTests(unittest.TestCase):
+	def setUp(self):
+		self.directory = TemporaryDirectory()
+		self.source = os.path.join(self.directory.name, "source")
+		self.target = os.path.join(self.directory.name, "target")
+		self.data = os.urandom(FileSender.CHUNK_SIZE * 3 + 17)
+		with open(self.source, "wb") as file:
+			file.write(self.data)
+
+	def tearDown(self):
+		self.directory.cleanup()
+
+	def test_chunks(self):
+		file_sender = FileSender(self.source)
+		chunks = list(file_sender.chunks())
+		self.assertEqual(len(chunks), 4)
+		self.assertTrue(all(len(chunk) <= FileSender.CHUNK_SIZE for chunk in chunks))
+		self.assertEqual(b"".join(chunks), self.data)
+
+	def test_chunks_encoded_in_batches(self):
+		class Cipher:
+			batches = []
+			def encode_batch(self, chunks):
+				self.batches.append(len(chunks))
+				return [chunk[::-1] for chunk in chunks]
+		FileSender.BATCH_SIZE, batch_size = 3, FileSender.BATCH_SIZE
+		try:
+			chunks = list(FileSender(self.source, Cipher()).chunks())
+		finally:
+			FileSender.BATCH_SIZE = batch_size
+		self.assertEqual(Cipher.batches, [3, 1])
+		self.assertEqual(b"".join(chunk[::-1] for chunk in chunks), self.data)
+
+	def test_empty_file(self):
+		open(self.source, "wb").close()
+		self.assertEqual(list(FileSender(self.source).chunks()), [])
+
+	def test_receiver_strips_padding(self):
+		file_receiver = FileReceiver(self.target, len(self.data))
+		for chunk in FileSender(self.source).chunks():
+			self.assertFalse(file_receiver.complete)
+			file_receiver.write(chunk + b"\x00" * 16)
+		self.assertTrue(file_receiver.close())
+		with open(self.target, "rb") as file:
+			self.assertEqual(file.read(), self.data)
+
+	def test_receiver_keeps_existing_file(self):
+		self.assertRaises(FileExistsError, FileReceiver, self.source, len(self.data))
+		with open(self.source, "rb") as file:
+			self.assertEqual(file.read(), self.data)
+
+	def test_unique_path(self):
+		directory = self.directory.name
+		self.assertEqual(unique_path(directory, "target"), self.target)
+		self.assertEqual(unique_path(directory, "source"),
+			os.path.join(directory, "source (1)"))
+		open(os.path.join(directory, "notes.txt"), "wb").close()
+		open(os.path.join(directory, "notes (1).txt"), "wb").close()
+		self.assertEqual(unique_path(directory, "notes.txt"),
+			os.path.join(directory, "notes (2).txt"))
+
+if __name__ == "__main__":
+	unittest.main()
\ No newline at end of file
@@ -0,0 +1,18 @@
+#! /usr/bin/env python3
+
+import json
+from argparse import ArgumentParser
+
+from messenger.protocol_bench import run_protocol_bench
+
+def main():
+	parser = ArgumentParser()
+	parser.add_argument("--size", type = int, default = 64)
+	parser.add_argument("--count", type = int, default = 100000)
+	parser.add_argument("--rounds", type = int, default = 5)
+	args = parser.parse_args()
+	result = run_protocol_bench(args.size, args.count, args.rounds)
+	print(json.dumps(result, indent = 4))
+
+if __name__ == "__main__":
+	main()
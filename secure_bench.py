@@ -0,0 +1,18 @@
+#! /usr/bin/env python3
+
+import json
+from argparse import ArgumentParser
+
+from messenger.secure_bench import run_secure_bench
+
+def main():
+	parser = ArgumentParser()
+	parser.add_argument("--sizes", type = int, nargs = "+", default = [64, 1024, 4000])
+	parser.add_argument("--count", type = int, default = 1000)
+	parser.add_argument("--rounds", type = int, default = 5)
+	args = parser.parse_args()
+	result = run_secure_bench(args.sizes, args.count, args.rounds)
+	print(json.dumps(result, indent = 4))
+
+if __name__ == "__main__":
+	main()
@@ -1,16 +1,65 @@
 #! /usr/bin/env python3
 
+from argparse import ArgumentParser
+
 from messenger.backend.server import Server
+from messenger.backend.async_server import AsyncServer
+from messenger.backend.workers import WorkerPool
+from messenger.backend.metrics import MetricsWriter
+from messenger.backend.history import HistoryStore
+from messenger.backend.heartbeat import Heartbeat
+from messenger.backend.admission import admission
 from messenger.backend.exceptions import *
 
 def main():
+	parser = ArgumentParser()
+	parser.add_argument("--async", dest = "use_async", action = "store_true",
+		help = "run all sessions on a single asyncio event loop")
+	parser.add_argument("--workers", type = int, default = 0,
+		help = "pre-fork this many worker processes sharing the port")
+	parser.add_argument("--stats", metavar = "PATH",
+		help = "append a JSON metrics snapshot to this file periodically")
+	parser.add_argument("--stats-interval", type = float, default = MetricsWriter.INTERVAL,
+		help = "seconds between metrics snapshots")
+	parser.add_argument("--history", metavar = "DIR",
+		help = "persist room messages in this directory (with --async)")
+	parser.add_argument("--idle-timeout", type = float, default = Heartbeat.IDLE_TIMEOUT,
+		help = "seconds of client silence before the server sends PING")
+	parser.add_argument("--dead-timeout", type = float, default = Heartbeat.DEAD_TIMEOUT,
+		help = "seconds of client silence before the connection is dropped")
+	parser.add_argument("--drain-timeout", type = float, default = Server.DRAIN_TIMEOUT,
+		help = "seconds allowed for flushing sessions on shutdown")
+	parser.add_argument("--max-connections-per-ip", type = int,
+		default = admission.max_connections,
+		help = "connections allowed from one remote address, 0 for no limit")
+	args = parser.parse_args()
+	admission.max_connections = args.max_connections_per_ip
 	try:
 		print("Enter \"Y\" to suspend server.")
-		server = Server()
+		writer = None
+		history = None
+		if args.workers:
+			server = WorkerPool(args.workers, args.stats, args.stats_interval,
+				args.idle_timeout, args.dead_timeout, args.drain_timeout)
+		elif args.use_async:
+			history = HistoryStore(args.history) if args.history else None
+			server = AsyncServer(history, args.idle_timeout, args.dead_timeout,
+				args.drain_timeout)
+		else:
+			server = Server(args.idle_timeout, args.dead_timeout, args.drain_timeout)
+		if args.stats and not args.workers:
+			writer = MetricsWriter(args.stats, args.stats_interval)
 		server.run()
+		if writer:
+			writer.start()
 		while (input() != "y"):
 			pass
-		server.stop()
+		elapsed = server.stop()
+		print("Server stopped in {0:.2f} s.".format(elapsed))
+		if writer:
+			writer.stop()
+		if history is not None:
+			history.close()
 	except ServerException as e:
 		print(e)
 